@@ -0,0 +1,52 @@
+# compares per-test harness overhead of tester.py with a fresh process per
+# test versus the reusable worker pool (--pool), on a suite of no-op tests
+#
+#   python3 bench/harness_overhead.py [NUM_TESTS]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import tester
+
+NUM_TESTS = 500
+# stand-in for the large globals (ANSWERS, notebook JSON) autograders carry
+BALLAST = [str(i) * 10 for i in range(500_000)]
+
+
+def noop():
+    return None
+
+
+def register(num_tests):
+    for i in range(num_tests):
+        noop.__name__ = f"noop_{i}"
+        tester.test(points=1)(noop)
+
+
+def bench(pool, jobs=1):
+    tester.POOL = pool
+    tester.JOBS = jobs
+    tester.PASSED_TESTS.clear()
+    start = time.perf_counter()
+    results = tester.run_tests()
+    elapsed = time.perf_counter() - start
+    assert results["score"] == results["full_score"]
+    return elapsed
+
+
+def main():
+    num_tests = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_TESTS
+    register(num_tests)
+
+    print(f"{num_tests} no-op tests, {len(BALLAST)} strings of ballast")
+    for pool in (False, True):
+        elapsed = bench(pool)
+        mode = "pool" if pool else "process per test"
+        print(f"{mode:>18}: {elapsed:.2f} s total, "
+              f"{elapsed / num_tests * 1000:.2f} ms/test")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# times `autograde.py -l` (startup plus registering and listing the tests)
+# for every project, next to a bare interpreter start as the floor
+#
+#   python3 bench/list_startup.py [RUNS]
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RUNS = 20
+
+
+def bench(command, cwd):
+    # tester.py is copied next to autograde.py in practice; PYTHONPATH
+    # stands in for that here
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def main():
+    global RUNS
+    if len(sys.argv) > 1:
+        RUNS = int(sys.argv[1])
+
+    rows = [("python -c pass", [sys.executable, "-c", "pass"], ROOT)]
+    for project in sorted(os.listdir(ROOT)):
+        if os.path.exists(os.path.join(ROOT, project, "autograde.py")):
+            rows.append((f"{project}/autograde.py -l",
+                         [sys.executable, "autograde.py", "-l"],
+                         os.path.join(ROOT, project)))
+
+    print(f"{RUNS} runs each")
+    for name, command, cwd in rows:
+        best, median = bench(command, cwd)
+        print(f"{name:>24}: min {best * 1000:6.1f} ms, median {median * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# peak memory and time of reading the answers of an executed notebook with
+# json.load versus tester.notebook_answers, for notebooks of growing size
+# (most of it embedded images, as with plots)
+#
+#   python3 bench/notebook_extract.py [MAX_MB]
+
+import base64
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MAX_MB = 64
+
+LOAD = """
+import json, sys
+with open(sys.argv[1]) as f:
+    nb = json.load(f)
+"""
+
+STREAM = """
+import sys
+sys.path.insert(0, sys.argv[2])
+import tester
+tester.NOTEBOOK_CACHE_DIR = sys.argv[3]
+tester.notebook_answers(sys.argv[1])
+"""
+
+
+def write_notebook(path, size_mb):
+    image = base64.b64encode(os.urandom(256 * 1024)).decode()
+    cells = []
+    for i in range(size_mb * 3):
+        cells.append({
+            "cell_type": "code",
+            "execution_count": i + 1,
+            "id": str(i),
+            "metadata": {},
+            "outputs": [
+                {"data": {"image/png": image, "text/plain": ["<Figure>"]},
+                 "metadata": {}, "output_type": "display_data"},
+                {"data": {"text/plain": [str(i)]}, "execution_count": i + 1,
+                 "metadata": {}, "output_type": "execute_result"},
+            ],
+            "source": [f"#q{i + 1}\n", "plot()"],
+        })
+    with open(path, "w") as f:
+        json.dump({"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}, f, indent=1)
+
+
+# (peak RSS in MB, CPU seconds) of running code in a fresh interpreter
+def measure(code, *args):
+    proc = subprocess.Popen([sys.executable, "-c", code, *args])
+    _, status, usage = os.wait4(proc.pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    return usage.ru_maxrss / 1024, usage.ru_utime + usage.ru_stime
+
+
+def main():
+    max_mb = int(sys.argv[1]) if len(sys.argv) > 1 else MAX_MB
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/nb.ipynb"
+        size_mb = 4
+        while size_mb <= max_mb:
+            write_notebook(path, size_mb)
+            actual_mb = os.path.getsize(path) / 2**20
+            stream_rss, stream_s = measure(STREAM, path, ROOT, f"{tmp}/cache")
+            load_rss, load_s = measure(LOAD, path)
+            print(f"{actual_mb:6.1f} MB notebook: json.load {load_rss:6.1f} MB peak, "
+                  f"{load_s:.2f} s; notebook_answers {stream_rss:6.1f} MB peak, "
+                  f"{stream_s:.2f} s")
+            shutil.rmtree(f"{tmp}/cache")
+            size_mb *= 2
+
+
+if __name__ == "__main__":
+    main()
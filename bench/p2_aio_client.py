@@ -0,0 +1,133 @@
+# latency of p2 client rows when the partitions a row needs are queried one
+# after the other over blocking stubs (as client.py does) versus concurrently
+# with grpc.aio, with up to WINDOW rows in flight. The servers (see
+# p2_batch_rpc.py) answer after different delays, so a wildcard row costs
+# the sum of both delays sequentially and their max concurrently. Outputs,
+# cache stars included, are checked against p2/outputs first.
+#
+#   python3 bench/p2_aio_client.py [QUERIES] [WINDOW]
+
+import asyncio
+import glob
+import statistics
+import sys
+import tempfile
+import time
+
+import grpc
+
+import p2_batch_rpc
+from p2_batch_rpc import P2, plan_cache, read_keys, synthetic_keys, targets
+
+QUERIES = 2000
+WINDOW = 32
+DELAYS_MS = (1, 3)  # per RPC, of server 0 and server 1
+
+
+# one blocking GetMatchCount per needed server, one after the other;
+# returns the output lines and the seconds each uncached row took
+def client_blocking(stubs, keys):
+    pb2 = p2_batch_rpc.matchdb_pb2
+    answers = {}
+    latencies = []
+    out = []
+    for key, cached in plan_cache(keys):
+        if not cached:
+            start = time.perf_counter()
+            answers[key] = sum(stubs[i].GetMatchCount(
+                pb2.GetMatchCountReq(country=key[0], winning_team=key[1])).num_matches
+                for i in targets(key, len(stubs)))
+            latencies.append((key, time.perf_counter() - start))
+        out.append(f"{answers[key]}*" if cached else str(answers[key]))
+    return out, latencies
+
+
+# every uncached row fans out to its servers at once; up to window rows are
+# in flight, and the output is still assembled in input order
+async def client_aio(addresses, keys, window, cache=None):
+    pb2 = p2_batch_rpc.matchdb_pb2
+    pb2_grpc = p2_batch_rpc.matchdb_pb2_grpc
+    channels = [grpc.aio.insecure_channel(address) for address in addresses]
+    stubs = [pb2_grpc.MatchCountStub(channel) for channel in channels]
+    limit = asyncio.Semaphore(window)
+    latencies = []
+
+    async def count(key):
+        async with limit:
+            start = time.perf_counter()
+            counts = await asyncio.gather(*(
+                stubs[i].GetMatchCount(pb2.GetMatchCountReq(country=key[0], winning_team=key[1]))
+                for i in targets(key, len(stubs))))
+            latencies.append((key, time.perf_counter() - start))
+            return sum(c.num_matches for c in counts)
+
+    plan = plan_cache(keys, cache)
+    # a cached row repeats the answer of the last uncached row with its key
+    tasks = []
+    last = {}
+    for key, cached in plan:
+        if not cached:
+            last[key] = asyncio.ensure_future(count(key))
+        tasks.append(last[key])
+    results = await asyncio.gather(*tasks)
+    for channel in channels:
+        await channel.close()
+    return ([f"{n}*" if cached else str(n) for (_, cached), n in zip(plan, results)],
+            latencies)
+
+
+def percentiles(latencies, wildcard):
+    ms = sorted(s * 1000 for key, s in latencies if (not key[0]) == wildcard)
+    if not ms:
+        return "-"
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    return f"p50 {statistics.median(ms):5.1f} ms, p99 {p99:5.1f} ms"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else QUERIES
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else WINDOW
+
+    with tempfile.TemporaryDirectory() as tmp:
+        p2_batch_rpc.compile_proto(tmp)
+        servers = [p2_batch_rpc.start_server(f"{P2}/partitions/part_{i}.csv", delay / 1000)
+                   for i, delay in enumerate(DELAYS_MS)]
+        addresses = [address for _, address in servers]
+        channels = [grpc.insecure_channel(address) for address in addresses]
+        stubs = [p2_batch_rpc.matchdb_pb2_grpc.MatchCountStub(c) for c in channels]
+
+        checked = 0
+        for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+            expected_path = path.replace("inputs/input_", "outputs/expected_").replace(".csv", ".out")
+            with open(expected_path) as f:
+                expected = [line.strip() for line in f if line.strip()]
+            keys = read_keys(path)
+            assert client_blocking(stubs, keys)[0] == expected, f"blocking differs on {path}"
+            assert asyncio.run(client_aio(addresses, keys, window))[0] == expected, \
+                f"aio differs on {path}"
+            checked += len(keys)
+        print(f"both clients match {checked} expected outputs (stars included)")
+
+        keys = synthetic_keys(n)
+        print(f"{n} queries, server delays {DELAYS_MS[0]} and {DELAYS_MS[1]} ms per RPC")
+        runs = [("blocking", lambda: client_blocking(stubs, keys)),
+                ("aio, window 1", lambda: asyncio.run(client_aio(addresses, keys, 1))),
+                (f"aio, window {window}", lambda: asyncio.run(client_aio(addresses, keys, window)))]
+        reference = None
+        for name, run in runs:
+            start = time.perf_counter()
+            out, latencies = run()
+            seconds = time.perf_counter() - start
+            reference = reference or out
+            assert out == reference, f"{name} differs from blocking"
+            print(f"{name:>16}: {seconds * 1000:8.1f} ms total; wildcard rows "
+                  f"{percentiles(latencies, True)}; one-server rows {percentiles(latencies, False)}")
+
+        for channel in channels:
+            channel.close()
+        for server, _ in servers:
+            server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# wall time of p2's client answering an input file with one unary
+# GetMatchCount per uncached row, versus one batched GetMatchCounts call or
+# one bidirectional StreamMatchCounts stream per server. In-process servers
+# (count indexes, see p2_count_index.py) serve PARTITIONS partitions made by
+# p2/partition.py, with an optional per-RPC delay standing in for network
+# round trips. Outputs, cache stars included, are checked against
+# p2/outputs first.
+#
+#   python3 bench/p2_batch_rpc.py [QUERIES] [DELAY_MS] [PARTITIONS]
+
+import csv
+import glob
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent import futures
+
+import grpc
+
+from p2_cache import MISSING, make_cache
+from p2_count_index import IndexCounter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+P2 = os.path.join(ROOT, "p2")
+sys.path.insert(0, P2)
+import partition  # noqa: E402
+QUERIES = 5000
+DELAY_MS = 1
+PARTITIONS = 2
+
+PROTO = """
+syntax = "proto3";
+
+service MatchCount {
+    rpc GetMatchCount(GetMatchCountReq) returns (GetMatchCountResp);
+    // counts of many filters, in order
+    rpc GetMatchCounts(GetMatchCountsReq) returns (GetMatchCountsResp);
+    // one response per request, in order
+    rpc StreamMatchCounts(stream GetMatchCountReq) returns (stream GetMatchCountResp);
+}
+
+message GetMatchCountReq {
+    string country = 1;
+    string winning_team = 2;
+}
+
+message GetMatchCountResp {
+    int32 num_matches = 1;
+}
+
+message GetMatchCountsReq {
+    repeated GetMatchCountReq filters = 1;
+}
+
+message GetMatchCountsResp {
+    repeated int32 num_matches = 1;
+}
+"""
+
+
+def compile_proto(out_dir):
+    with open(f"{out_dir}/matchdb.proto", "w") as f:
+        f.write(PROTO)
+    subprocess.check_call([sys.executable, "-m", "grpc_tools.protoc", f"-I={out_dir}",
+                           f"--python_out={out_dir}", f"--grpc_python_out={out_dir}",
+                           "matchdb.proto"])
+    sys.path.insert(0, out_dir)
+    global matchdb_pb2, matchdb_pb2_grpc
+    import matchdb_pb2
+    import matchdb_pb2_grpc
+
+
+def start_server(path, delay):
+    counter = IndexCounter(path)
+
+    class MatchCount(matchdb_pb2_grpc.MatchCountServicer):
+        def GetMatchCount(self, request, context):
+            time.sleep(delay)
+            return matchdb_pb2.GetMatchCountResp(
+                num_matches=counter.count(request.country, request.winning_team))
+
+        def GetMatchCounts(self, request, context):
+            time.sleep(delay)
+            return matchdb_pb2.GetMatchCountsResp(
+                num_matches=[counter.count(f.country, f.winning_team) for f in request.filters])
+
+        def StreamMatchCounts(self, request_iterator, context):
+            time.sleep(delay)
+            for request in request_iterator:
+                yield matchdb_pb2.GetMatchCountResp(
+                    num_matches=counter.count(request.country, request.winning_team))
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    matchdb_pb2_grpc.add_MatchCountServicer_to_server(MatchCount(), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
+
+
+# [(key, cached)] of every row: whether a row hits the cache (LRU of size 10
+# unless given another, see p2_cache.py) depends only on the keys before it,
+# not on the answers, so hits can be decided up front and the misses fetched
+# together without changing the stars
+def plan_cache(keys, cache=None):
+    cache = cache or make_cache()
+    plan = []
+    for key in keys:
+        if cache.get(key) is MISSING:
+            cache.put(key, None)
+            plan.append((key, False))
+        else:
+            plan.append((key, True))
+    return plan
+
+
+# servers that may have rows matching key, per the hash partitioning
+def targets(key, n):
+    country, _ = key
+    return [partition.simple_hash(country) % n] if country else range(n)
+
+
+def format_output(plan, answers):
+    return [f"{answers[key]}*" if cached else str(answers[key]) for key, cached in plan]
+
+
+# one GetMatchCount per server per uncached row, like client.py
+def client_unary(stubs, keys, cache=None):
+    cache = cache or make_cache()
+    out = []
+    for country, team in keys:
+        key = (country, team)
+        count = cache.get(key)
+        if count is not MISSING:
+            out.append(f"{count}*")
+            continue
+        count = sum(stubs[i].GetMatchCount(
+            matchdb_pb2.GetMatchCountReq(country=country, winning_team=team)).num_matches
+            for i in targets(key, len(stubs)))
+        cache.put(key, count)
+        out.append(str(count))
+    return out
+
+
+# distinct uncached keys per server; rows that miss again after eviction
+# still print without a star, but are fetched once
+def misses_per_server(plan, n):
+    per_server = [OrderedDict() for _ in range(n)]
+    for key, cached in plan:
+        if not cached:
+            for i in targets(key, n):
+                per_server[i][key] = None
+    return [list(keys) for keys in per_server]
+
+
+def sum_answers(per_server, counts):
+    answers = {}
+    for keys, server_counts in zip(per_server, counts):
+        for key, count in zip(keys, server_counts):
+            answers[key] = answers.get(key, 0) + count
+    return answers
+
+
+# one GetMatchCounts per server, issued concurrently
+def client_batched(stubs, keys, cache=None):
+    plan = plan_cache(keys, cache)
+    per_server = misses_per_server(plan, len(stubs))
+    calls = [stubs[i].GetMatchCounts.future(matchdb_pb2.GetMatchCountsReq(filters=[
+        matchdb_pb2.GetMatchCountReq(country=c, winning_team=t) for c, t in server_keys]))
+        for i, server_keys in enumerate(per_server)]
+    counts = [call.result().num_matches for call in calls]
+    return format_output(plan, sum_answers(per_server, counts))
+
+
+# one StreamMatchCounts stream per server
+def client_streaming(stubs, keys, cache=None):
+    plan = plan_cache(keys, cache)
+    per_server = misses_per_server(plan, len(stubs))
+    streams = [stubs[i].StreamMatchCounts(iter([
+        matchdb_pb2.GetMatchCountReq(country=c, winning_team=t) for c, t in server_keys]))
+        for i, server_keys in enumerate(per_server)]
+    counts = [[resp.num_matches for resp in stream] for stream in streams]
+    return format_output(plan, sum_answers(per_server, counts))
+
+
+def read_keys(path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [(country, team) for team, country in reader]
+
+
+# QUERIES rows drawn from the inputs' rows and from pairs in the data,
+# with repeats so the cache sees hits
+def synthetic_keys(n):
+    rng = random.Random(544)
+    pool = []
+    for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+        pool += read_keys(path)
+    for i in range(2):
+        rows = read_keys(f"{P2}/partitions/part_{i}.csv")
+        pool += rng.sample(rows, 500)
+        pool += [(c, "") for c, _ in rng.sample(rows, 100)]
+        pool += [("", t) for _, t in rng.sample(rows, 100)]
+    keys = []
+    while len(keys) < n:
+        if keys and rng.random() < 0.2:
+            keys.append(rng.choice(keys[-20:]))
+        else:
+            keys.append(rng.choice(pool))
+    return keys
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else QUERIES
+    delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else DELAY_MS
+    partitions = int(sys.argv[3]) if len(sys.argv) > 3 else PARTITIONS
+    clients = [("unary", client_unary), ("batched", client_batched),
+               ("streaming", client_streaming)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        compile_proto(tmp)
+        parts_dir = f"{P2}/partitions"
+        if partitions != 2:
+            parts_dir = f"{tmp}/partitions"
+            partition.partition(f"{P2}/results.csv", parts_dir, partitions, os.cpu_count())
+        servers = [start_server(f"{parts_dir}/part_{i}.csv", delay_ms / 1000)
+                   for i in range(partitions)]
+        channels = [grpc.insecure_channel(address) for _, address in servers]
+        stubs = [matchdb_pb2_grpc.MatchCountStub(channel) for channel in channels]
+
+        checked = 0
+        for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+            expected_path = path.replace("inputs/input_", "outputs/expected_").replace(".csv", ".out")
+            with open(expected_path) as f:
+                expected = [line.strip() for line in f if line.strip()]
+            keys = read_keys(path)
+            for name, client in clients:
+                assert client(stubs, keys) == expected, f"{name} differs on {path}"
+            checked += len(keys)
+        print(f"all clients match {checked} expected outputs (stars included)")
+
+        keys = synthetic_keys(n)
+        reference = client_unary(stubs, keys)
+        print(f"{n} queries, {sum(o.endswith('*') for o in reference)} cache hits, "
+              f"{partitions} servers, {delay_ms} ms per RPC")
+        for name, client in clients:
+            start = time.perf_counter()
+            out = client(stubs, keys)
+            seconds = time.perf_counter() - start
+            assert out == reference, f"{name} differs from unary"
+            print(f"{name:>12}: {seconds * 1000:9.1f} ms")
+
+        for channel in channels:
+            channel.close()
+        for server, _ in servers:
+            server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
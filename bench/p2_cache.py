@@ -0,0 +1,270 @@
+# cache policies for the p2 client (LRU, ARC, W-TinyLFU), each O(1) per
+# operation and counting its hits and misses, and a benchmark of their hit
+# ratios on a skewed query stream with scans through it. The star pattern
+# of the default LRU of size 10 is checked against p2/outputs first.
+#
+#   python3 bench/p2_cache.py [--policy POLICY ...] [--size SIZE ...] [--queries N]
+
+import argparse
+import glob
+import os
+import random
+import time
+from collections import OrderedDict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+P2 = os.path.join(ROOT, "p2")
+MISSING = object()
+
+
+class Cache:
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    # the cached value of key, or MISSING
+    def get(self, key):
+        value = self._get(key)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def hit_ratio(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+
+class LRUCache(Cache):
+    def __init__(self, size):
+        super().__init__(size)
+        self.entries = OrderedDict()
+
+    def _get(self, key):
+        if key not in self.entries:
+            return MISSING
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+# adaptive replacement cache: recency (t1) and frequency (t2) lists of cached
+# keys, ghost lists (b1, b2) of keys recently evicted from each, and a target
+# size p for t1 that grows on b1 hits and shrinks on b2 hits
+class ARCCache(Cache):
+    def __init__(self, size):
+        super().__init__(size)
+        self.p = 0
+        self.t1, self.t2 = OrderedDict(), OrderedDict()
+        self.b1, self.b2 = OrderedDict(), OrderedDict()
+
+    def _get(self, key):
+        if key in self.t1:
+            value = self.t1.pop(key)
+            self.t2[key] = value
+            return value
+        if key in self.t2:
+            self.t2.move_to_end(key)
+            return self.t2[key]
+        return MISSING
+
+    def _replace(self, in_b2):
+        if self.t1 and (len(self.t1) > self.p or (in_b2 and len(self.t1) == self.p)):
+            key, _ = self.t1.popitem(last=False)
+            self.b1[key] = None
+        elif self.t2:
+            key, _ = self.t2.popitem(last=False)
+            self.b2[key] = None
+        else:
+            key, _ = self.t1.popitem(last=False)
+            self.b1[key] = None
+
+    def put(self, key, value):
+        if key in self.t1 or key in self.t2:
+            self.t1.pop(key, None)
+            self.t2[key] = value
+            self.t2.move_to_end(key)
+            return
+        c = self.size
+        if key in self.b1:
+            self.p = min(c, self.p + max(len(self.b2) // len(self.b1), 1))
+            self._replace(False)
+            del self.b1[key]
+            self.t2[key] = value
+        elif key in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) // len(self.b2), 1))
+            self._replace(True)
+            del self.b2[key]
+            self.t2[key] = value
+        else:
+            if len(self.t1) + len(self.b1) == c:
+                if len(self.t1) < c:
+                    self.b1.popitem(last=False)
+                    self._replace(False)
+                else:
+                    self.t1.popitem(last=False)
+            elif len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= c:
+                if len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) == 2 * c:
+                    self.b2.popitem(last=False)
+                self._replace(False)
+            self.t1[key] = value
+
+
+# frequencies in a count-min sketch of 4 rows of 4-bit counters (one byte
+# each), halved every 10 * size increments so that old popularity fades
+class FrequencySketch:
+    HALVE = bytes(count >> 1 for count in range(256))
+
+    def __init__(self, size):
+        # each row is indexed by 16 bits of one 64-bit hash
+        self.mask = min(max(16, 1 << (4 * size - 1).bit_length()), 1 << 16) - 1
+        self.rows = [bytearray(self.mask + 1) for _ in range(4)]
+        self.sample = 10 * size
+        self.additions = 0
+
+    def _slots(self, key):
+        h = (hash(key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        mask = self.mask
+        return h & mask, (h >> 16) & mask, (h >> 32) & mask, (h >> 48) & mask
+
+    def increment(self, key):
+        for row, slot in zip(self.rows, self._slots(key)):
+            if row[slot] < 15:
+                row[slot] += 1
+        self.additions += 1
+        if self.additions >= self.sample:
+            self.additions //= 2
+            for row in self.rows:
+                row[:] = row.translate(self.HALVE)
+
+    def frequency(self, key):
+        a, b, c, d = self._slots(key)
+        rows = self.rows
+        return min(rows[0][a], rows[1][b], rows[2][c], rows[3][d])
+
+
+# W-TinyLFU: new keys enter a small LRU window; a key evicted from the window
+# only enters the main segmented LRU (probation, protected) if the sketch
+# says it is more frequent than the main cache's eviction victim, so scans
+# and one-off keys don't push out popular ones
+class WTinyLFUCache(Cache):
+    def __init__(self, size):
+        super().__init__(size)
+        self.window_size = max(1, size // 100)
+        main_size = max(1, size - self.window_size)
+        self.protected_size = max(1, main_size * 8 // 10) if main_size > 1 else 0
+        self.probation_size = main_size - self.protected_size
+        self.window = OrderedDict()
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.sketch = FrequencySketch(size)
+
+    def _get(self, key):
+        self.sketch.increment(key)
+        if key in self.window:
+            self.window.move_to_end(key)
+            return self.window[key]
+        if key in self.protected:
+            self.protected.move_to_end(key)
+            return self.protected[key]
+        if key in self.probation:
+            value = self.probation.pop(key)
+            self.protected[key] = value
+            if len(self.protected) > self.protected_size:
+                demoted, demoted_value = self.protected.popitem(last=False)
+                self.probation[demoted] = demoted_value
+            return value
+        return MISSING
+
+    def put(self, key, value):
+        for segment in (self.window, self.probation, self.protected):
+            if key in segment:
+                segment[key] = value
+                return
+        self.window[key] = value
+        if len(self.window) <= self.window_size:
+            return
+        candidate, candidate_value = self.window.popitem(last=False)
+        if len(self.probation) + len(self.protected) < self.probation_size + self.protected_size:
+            self.probation[candidate] = candidate_value
+            return
+        segment = self.probation or self.protected
+        victim = next(iter(segment))
+        if self.sketch.frequency(candidate) > self.sketch.frequency(victim):
+            del segment[victim]
+            self.probation[candidate] = candidate_value
+
+
+POLICIES = {"lru": LRUCache, "arc": ARCCache, "wtinylfu": WTinyLFUCache}
+DEFAULT_POLICY = "lru"
+DEFAULT_SIZE = 10  # what p2's README asks for
+
+
+def make_cache(policy=DEFAULT_POLICY, size=DEFAULT_SIZE):
+    return POLICIES[policy](size)
+
+
+# a Zipf-skewed stream over pool, interrupted by scans of keys seen once
+def skewed_with_scans(pool, n, rng, skew=1.1, scan_every=500, scan_length=100):
+    weights = [1 / (rank + 1) ** skew for rank in range(len(pool))]
+    keys = []
+    scans = 0
+    while len(keys) < n:
+        keys += rng.choices(pool, weights, k=scan_every)
+        keys += [("scan", scans, i) for i in range(scan_length)]
+        scans += 1
+    return keys[:n]
+
+
+def check_default():
+    from p2_batch_rpc import plan_cache, read_keys
+
+    checked = 0
+    for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+        expected_path = path.replace("inputs/input_", "outputs/expected_").replace(".csv", ".out")
+        with open(expected_path) as f:
+            stars = [line.strip().endswith("*") for line in f if line.strip()]
+        assert [cached for _, cached in plan_cache(read_keys(path))] == stars, path
+        checked += len(stars)
+    print(f"default {DEFAULT_POLICY}-{DEFAULT_SIZE} stars match {checked} expected outputs")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--policy", nargs="+", choices=sorted(POLICIES), default=list(POLICIES))
+    parser.add_argument("--size", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--queries", type=int, default=200_000)
+    args = parser.parse_args()
+
+    check_default()
+    rng = random.Random(544)
+    pool = [("key", i) for i in range(20_000)]
+    rng.shuffle(pool)
+    workloads = {
+        "zipf": rng.choices(pool, [1 / (r + 1) ** 1.1 for r in range(len(pool))], k=args.queries),
+        "zipf + scans": skewed_with_scans(pool, args.queries, rng),
+    }
+    for name, keys in workloads.items():
+        print(f"{name}: {len(keys):,} queries, {len(set(keys)):,} distinct")
+        for size in args.size:
+            line = []
+            for policy in args.policy:
+                cache = make_cache(policy, size)
+                start = time.perf_counter()
+                for key in keys:
+                    if cache.get(key) is MISSING:
+                        cache.put(key, None)
+                seconds = time.perf_counter() - start
+                line.append(f"{policy} {cache.hit_ratio():6.1%} "
+                            f"({len(keys) / seconds / 1e6:4.2f}M ops/s)")
+            print(f"  size {size:>5}: " + ", ".join(line))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# startup time and queries per second of answering p2's GetMatchCount by
+# scanning the partition's rows versus from count indexes built at startup
+# (dictionary-encoded columns; counts per (winning_team, country), per
+# winning_team and per country), on partitions/part_1.csv and a copy of it
+# enlarged SCALE times. Index answers are checked against p2/outputs first.
+#
+#   python3 bench/p2_count_index.py [SCALE]
+
+import csv
+import glob
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+P2 = os.path.join(ROOT, "p2")
+SCALE = 100
+SCAN_SECONDS = 2  # scanning gets slow on large partitions; stop after this
+
+
+def read_partition(path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [(team, country) for team, country in reader]
+
+
+# how a server typically answers: filter the rows on every query
+class ScanCounter:
+    def __init__(self, path):
+        self.rows = read_partition(path)
+
+    def count(self, country, winning_team):
+        return sum(1 for team, c in self.rows
+                   if (not winning_team or team == winning_team)
+                   and (not country or c == country))
+
+
+# every (winning_team, country) query, wildcards included, is one lookup.
+# Identical lines are counted first (in C, through Counter), so parsing,
+# encoding and the single-column counts only touch the distinct rows.
+class IndexCounter:
+    def __init__(self, path):
+        with open(path, newline="") as f:
+            f.readline()
+            lines = Counter(f)
+
+        teams, countries = {}, {}
+        self.by_both = {}
+        self.by_team = Counter()
+        self.by_country = Counter()
+        pairs = Counter()
+        for line, n in lines.items():
+            team, country = next(csv.reader([line]))
+            pairs[team, country] += n
+        for (team, country), n in pairs.items():
+            key = (teams.setdefault(team, len(teams)),
+                   countries.setdefault(country, len(countries)))
+            self.by_both[key] = n
+            self.by_team[key[0]] += n
+            self.by_country[key[1]] += n
+        self.teams, self.countries = teams, countries
+        self.rows = sum(pairs.values())
+
+    def count(self, country, winning_team):
+        if winning_team:
+            team = self.teams.get(winning_team)
+            if team is None:
+                return 0
+        if country:
+            code = self.countries.get(country)
+            if code is None:
+                return 0
+        if winning_team and country:
+            return self.by_both.get((team, code), 0)
+        if winning_team:
+            return self.by_team[team]
+        if country:
+            return self.by_country[code]
+        return self.rows
+
+
+def read_queries():
+    queries = []
+    for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            queries += [(country, team) for team, country in reader]
+    return queries
+
+
+# the expected outputs are totals over both partitions
+def check_answers():
+    parts = [IndexCounter(f"{P2}/partitions/part_{i}.csv") for i in range(2)]
+    checked = 0
+    for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+        expected_path = path.replace("inputs/input_", "outputs/expected_").replace(".csv", ".out")
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            queries = [(country, team) for team, country in reader]
+        with open(expected_path) as f:
+            expected = [int(line.split("*")[0]) for line in f if line.strip()]
+        for (country, team), want in zip(queries, expected):
+            got = sum(part.count(country, team) for part in parts)
+            assert got == want, f"{path}: {team!r}, {country!r}: {got} != {want}"
+            checked += 1
+    print(f"index answers match {checked} expected outputs")
+
+
+def bench(name, counter_class, path, queries):
+    start = time.perf_counter()
+    counter = counter_class(path)
+    startup = time.perf_counter() - start
+
+    answered = 0
+    start = time.perf_counter()
+    deadline = start + SCAN_SECONDS
+    while answered < 100_000 and time.perf_counter() < deadline:
+        country, team = queries[answered % len(queries)]
+        counter.count(country, team)
+        answered += 1
+    qps = answered / (time.perf_counter() - start)
+    print(f"{name:>28}: startup {startup * 1000:8.1f} ms, {qps:12,.0f} queries/s")
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else SCALE
+    check_answers()
+    queries = read_queries()
+    part_1 = f"{P2}/partitions/part_1.csv"
+    with tempfile.TemporaryDirectory() as tmp:
+        large = f"{tmp}/part_1_x{scale}.csv"
+        with open(part_1) as src, open(large, "w") as dst:
+            header = src.readline()
+            body = src.read()
+            dst.write(header)
+            for _ in range(scale):
+                dst.write(body)
+
+        for label, path in [("part_1.csv", part_1), (f"part_1.csv x{scale}", large)]:
+            rows = sum(1 for _ in open(path)) - 1
+            print(f"{label} ({rows:,} rows, {len(queries)} queries)")
+            bench("scan", ScanCounter, path, queries)
+            bench("index", IndexCounter, path, queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# an on-disk tier below the p2 client's LRU: a memory-mapped, fixed-size
+# hash table of (country, winning_team) -> count shared by client runs and
+# processes, tagged with a version of the partition files it was filled
+# from. Checks that a second run over p2/inputs needs no RPCs and prints the
+# same (expected) output, that concurrent writers keep it consistent, and
+# that it stays bounded, then times lookups.
+#
+#   python3 bench/p2_disk_cache.py
+
+import fcntl
+import glob
+import hashlib
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import tempfile
+import time
+
+from p2_batch_rpc import P2, read_keys, targets
+from p2_cache import MISSING, make_cache
+from p2_count_index import IndexCounter
+
+MAGIC = b"P2CACHE1"
+HEADER = struct.Struct("<8s32sQ")  # magic, dataset version, slots
+HEADER_SIZE = 64
+SLOT = struct.Struct("<QqQH")  # key hash (0: empty), count, last used (ns), key length
+SLOT_SIZE = 128
+MAX_KEY = SLOT_SIZE - SLOT.size
+PROBES = 8  # slots a key may live in; the least recently used of them is evicted
+
+
+# digest of the partition files' contents: cached counts are only valid for it
+def dataset_version(paths):
+    version = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            version.update(hashlib.file_digest(f, "sha256").digest())
+    return version.digest()
+
+
+class DiskCache:
+    def __init__(self, path, version, slots=1 << 16):
+        self.slots = slots
+        self.size = HEADER_SIZE + slots * SLOT_SIZE
+        self.header = HEADER.pack(MAGIC, version, slots)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            if os.fstat(self.fd).st_size != self.size or header != self.header:
+                # new file, other geometry, or filled from other data: start over
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, self.header, 0)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+    @staticmethod
+    def _encode(key):
+        country, winning_team = key
+        data = f"{country}\0{winning_team}".encode("utf-8")
+        h = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little") or 1
+        return data, h
+
+    # with the lock held: whether the file is still tagged with our version,
+    # not reset since by a process opening it for other data
+    def _current(self):
+        return self.map[:HEADER.size] == self.header
+
+    def _offsets(self, h):
+        first = h % self.slots
+        return [HEADER_SIZE + ((first + i) % self.slots) * SLOT_SIZE for i in range(PROBES)]
+
+    # the cached count of key, or None
+    def get(self, key):
+        data, h = self._encode(key)
+        fcntl.flock(self.fd, fcntl.LOCK_SH)
+        try:
+            if not self._current():
+                return None
+            for offset in self._offsets(h):
+                slot_hash, count, _, length = SLOT.unpack_from(self.map, offset)
+                if slot_hash == h and self.map[offset + SLOT.size:offset + SLOT.size + length] == data:
+                    # last-used time only steers eviction, a lost update is harmless
+                    struct.pack_into("<Q", self.map, offset + 16, time.time_ns())
+                    return count
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return None
+
+    def put(self, key, count):
+        data, h = self._encode(key)
+        if len(data) > MAX_KEY:
+            return
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            if not self._current():
+                return  # counts of one version must not land in another's table
+            target = None
+            oldest = None
+            for offset in self._offsets(h):
+                slot_hash, _, used, length = SLOT.unpack_from(self.map, offset)
+                if slot_hash == 0 or (slot_hash == h and
+                                      self.map[offset + SLOT.size:offset + SLOT.size + length] == data):
+                    target = offset
+                    break
+                if oldest is None or used < oldest:
+                    target, oldest = offset, used
+            SLOT.pack_into(self.map, target, h, count, time.time_ns(), len(data))
+            self.map[target + SLOT.size:target + SLOT.size + len(data)] = data
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+# the p2 client with the disk tier below its LRU: stars still only mark LRU
+# hits, so the output is the same whether or not the disk cache is warm
+def run_client(counters, disk, keys):
+    lru = make_cache()
+    rpcs = 0
+    out = []
+    for key in keys:
+        count = lru.get(key)
+        if count is not MISSING:
+            out.append(f"{count}*")
+            continue
+        count = disk.get(key)
+        if count is None:
+            country, team = key
+            count = 0
+            for i in targets(key, len(counters)):
+                count += counters[i].count(country, team)
+                rpcs += 1
+            disk.put(key, count)
+        lru.put(key, count)
+        out.append(str(count))
+    return out, rpcs
+
+
+def check_runs(path, version, counters):
+    expected, inputs = {}, {}
+    for input_path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+        expected_path = input_path.replace("inputs/input_", "outputs/expected_").replace(".csv", ".out")
+        with open(expected_path) as f:
+            expected[input_path] = [line.strip() for line in f if line.strip()]
+        inputs[input_path] = read_keys(input_path)
+
+    for run in ("cold", "warm"):
+        disk = DiskCache(path, version)
+        total_rpcs = 0
+        for input_path, keys in inputs.items():
+            out, rpcs = run_client(counters, disk, keys)
+            assert out == expected[input_path], f"{run} run differs on {input_path}"
+            total_rpcs += rpcs
+        disk.close()
+        print(f"{run} run over p2/inputs: output matches p2/outputs, {total_rpcs} RPCs")
+    assert total_rpcs == 0
+
+    key = next(iter(inputs.values()))[0]
+    stale = DiskCache(path, version)
+    disk = DiskCache(path, b"\1" * 32)  # resets the file under stale
+    assert disk.get(key) is None
+    stale.put(key, 1)
+    assert disk.get(key) is None and stale.get(key) is None
+    stale.close()
+    disk.close()
+    print("a different dataset version starts from an empty cache, "
+          "and a process still on the old one neither reads nor writes it")
+
+
+def expected_count(key):
+    return int.from_bytes(hashlib.sha256(repr(key).encode()).digest()[:4], "little")
+
+
+def writer(path, version, seed, operations):
+    disk = DiskCache(path, version, slots=4096)
+    rng = random.Random(seed)
+    for _ in range(operations):
+        key = (f"country {rng.randrange(3000)}", f"team {rng.randrange(5)}")
+        count = disk.get(key)
+        if count is None:
+            disk.put(key, expected_count(key))
+        else:
+            assert count == expected_count(key), (key, count)
+    disk.close()
+
+
+def check_concurrent(path, version, processes=4, operations=20_000):
+    start = time.perf_counter()
+    workers = [multiprocessing.get_context("fork").Process(
+        target=writer, args=(path, version, seed, operations)) for seed in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    seconds = time.perf_counter() - start
+
+    disk = DiskCache(path, version, slots=4096)
+    entries = 0
+    for offset in range(HEADER_SIZE, disk.size, SLOT_SIZE):
+        slot_hash, count, _, length = SLOT.unpack_from(disk.map, offset)
+        if slot_hash:
+            country, team = disk.map[offset + SLOT.size:offset + SLOT.size + length] \
+                .decode("utf-8").split("\0")
+            assert count == expected_count((country, team))
+            entries += 1
+    disk.close()
+    print(f"{processes} processes x {operations} get/put on 15000 keys: every one of "
+          f"{entries} entries consistent, file stays {os.path.getsize(path):,} bytes "
+          f"({processes * operations / seconds:,.0f} ops/s)")
+
+
+def bench_lookups(path, version, counters, n=100_000):
+    rng = random.Random(544)
+    keys = []
+    for input_path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+        keys += read_keys(input_path)
+    keys = rng.choices(keys, k=n)
+    disk = DiskCache(path, version)
+    for key in set(keys):
+        disk.put(key, 0)
+
+    start = time.perf_counter()
+    for key in keys:
+        disk.get(key)
+    disk_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for country, team in keys:
+        sum(counters[i].count(country, team) for i in targets((country, team), len(counters)))
+    index_s = time.perf_counter() - start
+    disk.close()
+    print(f"disk cache lookups: {n / disk_s:,.0f}/s "
+          f"(in-process count index, i.e. an RPC without the network: {n / index_s:,.0f}/s)")
+
+
+def main():
+    partitions = sorted(glob.glob(f"{P2}/partitions/part_*.csv"))
+    version = dataset_version(partitions)
+    counters = [IndexCounter(path) for path in partitions]
+    with tempfile.TemporaryDirectory() as tmp:
+        check_runs(f"{tmp}/cache", version, counters)
+        check_concurrent(f"{tmp}/shared", version)
+        bench_lookups(f"{tmp}/lookups", version, counters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# per-row latency of p2 client rows when every partition has two replicas
+# that stall now and then (and one restarts): a fixed address per partition
+# (as client.py does) versus routing each request to the replica with the
+# lowest latency EWMA, versus that plus a hedged duplicate to the next
+# replica once a request is slower than the HEDGE_PERCENTILE of the
+# partition's recent latencies. Outputs, cache stars included, are checked
+# against p2/outputs first.
+#
+#   python3 bench/p2_hedged_client.py [QUERIES]
+
+import collections
+import glob
+import queue
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent import futures
+
+import grpc
+
+import p2_batch_rpc
+from p2_batch_rpc import P2, plan_cache, read_keys, synthetic_keys, targets
+from p2_count_index import IndexCounter
+
+QUERIES = 2000
+EWMA_ALPHA = 0.2
+EXPLORE = 0.05  # share of requests sent to a random replica, to notice recoveries
+HEDGE_PERCENTILE = 95
+HEDGE_HISTORY = 200  # latencies per partition the percentile is taken over
+COOLDOWN = 0.2  # seconds an unavailable replica is skipped
+
+# (partition, replica) -> (usual seconds, chance of a stall, stall seconds,
+# seconds after start during which it is restarting and unavailable)
+REPLICAS = {
+    (0, 0): (0.001, 0.05, 0.050, 0),
+    (0, 1): (0.0015, 0.05, 0.050, 0),
+    (1, 0): (0.001, 0.02, 0.050, 0.5),
+    (1, 1): (0.0015, 0.02, 0.050, 0),
+}
+
+
+def start_replica(path, usual, stall_chance, stall, down_for):
+    pb2, pb2_grpc = p2_batch_rpc.matchdb_pb2, p2_batch_rpc.matchdb_pb2_grpc
+    counter = IndexCounter(path)
+    rng = random.Random(f"{path} {usual}")
+    started = time.monotonic()
+
+    class MatchCount(pb2_grpc.MatchCountServicer):
+        def GetMatchCount(self, request, context):
+            if time.monotonic() - started < down_for:
+                context.abort(grpc.StatusCode.UNAVAILABLE, "restarting")
+            time.sleep(stall if rng.random() < stall_chance else usual)
+            return pb2.GetMatchCountResp(
+                num_matches=counter.count(request.country, request.winning_team))
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    pb2_grpc.add_MatchCountServicer_to_server(MatchCount(), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
+
+
+# replicas: one list of stubs per partition
+class FixedRouter:
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self.rpcs = 0
+
+    def count(self, partition, request):
+        while True:
+            self.rpcs += 1
+            try:
+                return self.replicas[partition][0].GetMatchCount(request).num_matches
+            except grpc.RpcError:
+                time.sleep(0.01)
+
+
+class ReplicaRouter:
+    def __init__(self, replicas, hedge=True, seed=544):
+        self.replicas = replicas
+        self.hedge = hedge
+        self.ewma = [[0.0] * len(stubs) for stubs in replicas]
+        self.down_until = [[0.0] * len(stubs) for stubs in replicas]
+        self.history = [collections.deque(maxlen=HEDGE_HISTORY) for _ in replicas]
+        self.rng = random.Random(seed)
+        self.rpcs = 0
+
+    def observe(self, partition, replica, seconds):
+        old = self.ewma[partition][replica]
+        self.ewma[partition][replica] = seconds if old == 0 else \
+            (1 - EWMA_ALPHA) * old + EWMA_ALPHA * seconds
+
+    # healthy replicas, fastest first
+    def ranked(self, partition):
+        now = time.monotonic()
+        healthy = [r for r, until in enumerate(self.down_until[partition]) if until <= now]
+        if not healthy:
+            healthy = list(range(len(self.replicas[partition])))
+        healthy.sort(key=lambda r: self.ewma[partition][r])
+        if len(healthy) > 1 and self.rng.random() < EXPLORE:
+            healthy.insert(0, healthy.pop(self.rng.randrange(1, len(healthy))))
+        return healthy
+
+    def hedge_delay(self, partition):
+        history = sorted(self.history[partition])
+        if len(history) < 20:
+            return None
+        return history[int(len(history) * HEDGE_PERCENTILE / 100)]
+
+    def count(self, partition, request):
+        start = time.monotonic()
+        done = queue.Queue()
+        pending = {}
+        candidates = self.ranked(partition)
+
+        def send(replica):
+            self.rpcs += 1
+            call = self.replicas[partition][replica].GetMatchCount.future(request)
+            pending[replica] = (call, time.monotonic())
+            call.add_done_callback(lambda call, replica=replica: done.put(replica))
+
+        send(candidates.pop(0))
+        while True:
+            delay = self.hedge_delay(partition) if self.hedge else None
+            try:
+                timeout = None if delay is None or not candidates else \
+                    max(delay - (time.monotonic() - start), 0)
+                replica = done.get(timeout=timeout)
+            except queue.Empty:
+                send(candidates.pop(0))  # hedge
+                continue
+
+            call, sent = pending.pop(replica)
+            try:
+                result = call.result()
+            except grpc.RpcError:
+                self.down_until[partition][replica] = time.monotonic() + COOLDOWN
+                if not pending:
+                    if not candidates:
+                        candidates = self.ranked(partition)
+                        time.sleep(0.01)
+                    send(candidates.pop(0))
+                continue
+
+            now = time.monotonic()
+            self.observe(partition, replica, now - sent)
+            # the losers took at least this long
+            for other, (other_call, other_sent) in pending.items():
+                other_call.cancel()
+                self.observe(partition, other, now - other_sent)
+            self.history[partition].append(now - start)
+            return result.num_matches
+
+
+# answers the rows of keys one after the other; returns the output lines
+# and the seconds every uncached row took
+def run_client(router, keys):
+    pb2 = p2_batch_rpc.matchdb_pb2
+    n = len(router.replicas)
+    answers = {}
+    latencies = []
+    out = []
+    for key, cached in plan_cache(keys):
+        if not cached:
+            start = time.perf_counter()
+            request = pb2.GetMatchCountReq(country=key[0], winning_team=key[1])
+            answers[key] = sum(router.count(i, request) for i in targets(key, n))
+            latencies.append(time.perf_counter() - start)
+        out.append(f"{answers[key]}*" if cached else str(answers[key]))
+    return out, latencies
+
+
+def start_cluster():
+    servers = {}
+    for (partition, replica), behaviour in REPLICAS.items():
+        servers[partition, replica] = start_replica(
+            f"{P2}/partitions/part_{partition}.csv", *behaviour)
+    partitions = 1 + max(p for p, _ in REPLICAS)
+    channels = []
+    replicas = []
+    for partition in range(partitions):
+        stubs = []
+        for replica in range(1 + max(r for p, r in REPLICAS if p == partition)):
+            channel = grpc.insecure_channel(servers[partition, replica][1])
+            channels.append(channel)
+            stubs.append(p2_batch_rpc.matchdb_pb2_grpc.MatchCountStub(channel))
+        replicas.append(stubs)
+    return servers, channels, replicas
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else QUERIES
+    routers = [("fixed address", lambda r: FixedRouter(r)),
+               ("EWMA", lambda r: ReplicaRouter(r, hedge=False)),
+               (f"EWMA + hedge at p{HEDGE_PERCENTILE}", lambda r: ReplicaRouter(r))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        p2_batch_rpc.compile_proto(tmp)
+
+        servers, channels, replicas = start_cluster()
+        checked = 0
+        for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+            expected_path = path.replace("inputs/input_", "outputs/expected_").replace(".csv", ".out")
+            with open(expected_path) as f:
+                expected = [line.strip() for line in f if line.strip()]
+            keys = read_keys(path)
+            for name, make in routers:
+                assert run_client(make(replicas), keys)[0] == expected, f"{name} differs on {path}"
+            checked += len(keys)
+        print(f"all clients match {checked} expected outputs (stars included)")
+        for channel in channels:
+            channel.close()
+        for server, _ in servers.values():
+            server.stop(None)
+
+        keys = synthetic_keys(n)
+        print(f"{n} queries, 2 replicas per partition")
+        reference = None
+        for name, make in routers:
+            # a fresh cluster, so each client sees the restart
+            servers, channels, replicas = start_cluster()
+            router = make(replicas)
+            start = time.perf_counter()
+            out, latencies = run_client(router, keys)
+            seconds = time.perf_counter() - start
+            reference = reference or out
+            assert out == reference, f"{name} differs from fixed address"
+            ms = sorted(s * 1000 for s in latencies)
+            print(f"{name:>22}: {seconds:5.2f} s total, {router.rpcs:5} RPCs; row p50 "
+                  f"{statistics.median(ms):5.1f} ms, p99 {ms[int(len(ms) * 0.99)]:5.1f} ms, "
+                  f"max {ms[-1]:6.1f} ms")
+            for channel in channels:
+                channel.close()
+            for server, _ in servers.values():
+                server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# startup time and memory of a p2 server loading its partition from the CSV
+# (as a list of rows, and into the count index of p2_count_index.py) versus
+# from a snapshot written by p2/snapshot.py, on partitions/part_1.csv and a
+# copy of it enlarged SCALE times; each load runs in a fresh interpreter.
+# The snapshot's mapped pages are file-backed: page cache that replicas
+# started from the same image share, so they are reported apart. Snapshot answers (with
+# and without numpy) are checked against p2/outputs, and snapshot rows
+# against the CSV rows, first.
+#
+#   python3 bench/p2_snapshot.py [SCALE]
+
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from p2_count_index import IndexCounter, ScanCounter, read_partition
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+P2 = os.path.join(ROOT, "p2")
+sys.path.insert(0, P2)
+import snapshot  # noqa: E402
+
+SCALE = 100
+
+
+def check(tmp):
+    parts = []
+    for i in range(2):
+        csv_path = f"{P2}/partitions/part_{i}.csv"
+        snapshot.convert(csv_path, f"{tmp}/part_{i}.snap")
+        snap = snapshot.Snapshot(f"{tmp}/part_{i}.snap")
+        assert list(snap) == read_partition(csv_path), csv_path
+        parts.append(f"{tmp}/part_{i}.snap")
+
+    numpy = snapshot.np
+    checked = 0
+    for np in (numpy, None):
+        snapshot.np = np
+        counters = [snapshot.Snapshot(path) for path in parts]
+        for path in sorted(glob.glob(f"{P2}/inputs/input_*.csv")):
+            expected_path = path.replace("inputs/input_", "outputs/expected_").replace(".csv", ".out")
+            with open(expected_path) as f:
+                expected = [int(line.split("*")[0]) for line in f if line.strip()]
+            for (team, country), want in zip(read_partition(path), expected):
+                got = sum(counter.count(country, team) for counter in counters)
+                assert got == want, f"{path}: {team!r}, {country!r}: {got} != {want} (numpy: {np})"
+                checked += 1
+    snapshot.np = numpy
+    print(f"snapshot rows match the CSV rows; answers match {checked} expected outputs "
+          "with and without numpy" + ("" if numpy else " (numpy not installed)"))
+
+
+# (kB) of this process's peak RSS, and its current anonymous and file-backed RSS
+def memory():
+    with open("/proc/self/status") as f:
+        status = dict(line.split(":", 1) for line in f)
+    return [int(status[field].split()[0]) for field in ("VmHWM", "RssAnon", "RssFile")]
+
+
+LOADERS = {"none": lambda path: None, "rows": ScanCounter, "index": IndexCounter,
+           "snapshot": snapshot.Snapshot}
+
+
+# in a fresh interpreter: load path, print startup seconds and memory()
+def load(kind, path):
+    start = time.perf_counter()
+    counter = LOADERS[kind](path)
+    seconds = time.perf_counter() - start
+    print(seconds, *memory())
+    return counter
+
+
+# startup seconds and MiB of peak, anonymous and file-backed RSS over an
+# interpreter that only imported this script
+def measure(kind, path):
+    results = []
+    for run_kind in ("none", kind):
+        out = subprocess.run([sys.executable, __file__, "--load", run_kind, path],
+                             capture_output=True, text=True, check=True).stdout.split()
+        results.append([float(value) for value in out])
+    (_, *baseline), (seconds, *used) = results
+    return seconds, [(u - b) / 1024 for u, b in zip(used, baseline)]
+
+
+def main():
+    if sys.argv[1:2] == ["--load"]:
+        load(sys.argv[2], sys.argv[3])
+        return
+
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else SCALE
+    part_1 = f"{P2}/partitions/part_1.csv"
+    with tempfile.TemporaryDirectory() as tmp:
+        check(tmp)
+        large = f"{tmp}/part_1_x{scale}.csv"
+        with open(part_1) as src, open(large, "w") as dst:
+            dst.write(src.readline())
+            body = src.read()
+            for _ in range(scale):
+                dst.write(body)
+
+        for label, path in [("part_1.csv", part_1), (f"part_1.csv x{scale}", large)]:
+            snap = f"{tmp}/{os.path.basename(path)}.snap"
+            start = time.perf_counter()
+            snapshot.convert(path, snap)
+            convert_s = time.perf_counter() - start
+            rows = sum(1 for _ in open(path)) - 1
+            print(f"{label} ({rows:,} rows; {os.path.getsize(path):,} bytes as CSV, "
+                  f"{os.path.getsize(snap):,} as snapshot, converted in {convert_s:.2f} s)")
+            for name, kind, load_path in [("CSV rows", "rows", path),
+                                          ("CSV + count index", "index", path),
+                                          ("snapshot", "snapshot", snap)]:
+                seconds, (peak, anon, file) = measure(kind, load_path)
+                print(f"{name:>20}: startup {seconds * 1000:7.1f} ms; RSS +{peak:5.1f} MiB "
+                      f"at peak, then +{anon:5.1f} MiB anonymous, +{file:5.1f} MiB file-backed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# generates p2 query streams from the team and country vocabulary of the
+# partitions (Zipf-skewed by how often each appears, with a share of
+# wildcard queries and of repeats of recent queries), and drives one of the
+# reference clients (p2_batch_rpc.py, p2_aio_client.py) with one of the
+# caches (p2_cache.py) against in-process servers over N partitions, or
+# against running servers. Reports queries/s, p50/p95/p99 row latency, the
+# cache hit ratio and RPCs per query; --output also writes the stream as an
+# inputs/input_N.csv style file for client.py.
+#
+#   python3 bench/p2_workload.py --queries 5000 --skew 1.2 --client batched
+#   python3 bench/p2_workload.py --servers localhost:5000 localhost:5001
+
+import argparse
+import asyncio
+import collections
+import csv
+import glob
+import os
+import random
+import tempfile
+import time
+
+import grpc
+
+import p2_aio_client
+import p2_batch_rpc
+from p2_batch_rpc import P2, partition, targets
+from p2_cache import MISSING, POLICIES, make_cache
+
+CLIENTS = ["unary", "batched", "streaming", "aio"]
+
+
+# values ranked from most to least frequent
+def ranked(values):
+    return [value for value, _ in collections.Counter(values).most_common()]
+
+
+def zipf_weights(n, skew):
+    return [1 / (rank + 1) ** skew for rank in range(n)]
+
+
+# [(country, winning_team)]; wildcards leave the country or the team empty
+# (half each), repeats re-ask one of the last repeat_window queries
+def generate(partition_paths, queries, skew, wildcard_ratio, repeat_ratio,
+             repeat_window=20, seed=544):
+    rows = []
+    for path in partition_paths:
+        rows += p2_batch_rpc.read_keys(path)
+    pairs = ranked(rows)
+    countries = ranked(country for country, _ in rows)
+    teams = ranked(team for _, team in rows)
+    pair_weights = zipf_weights(len(pairs), skew)
+    country_weights = zipf_weights(len(countries), skew)
+    team_weights = zipf_weights(len(teams), skew)
+
+    rng = random.Random(seed)
+    keys = []
+    while len(keys) < queries:
+        draw = rng.random()
+        if keys and draw < repeat_ratio:
+            keys.append(rng.choice(keys[-repeat_window:]))
+        elif draw < repeat_ratio + wildcard_ratio / 2:
+            keys.append((rng.choices(countries, country_weights)[0], ""))
+        elif draw < repeat_ratio + wildcard_ratio:
+            keys.append(("", rng.choices(teams, team_weights)[0]))
+        else:
+            keys.append(rng.choices(pairs, pair_weights)[0])
+    return keys
+
+
+def write_input(keys, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["winning_team", "country"])
+        for country, team in keys:
+            writer.writerow([team, country])
+
+
+# (output lines, seconds of every row, RPCs) of one client run. A row's
+# latency is how long its answer took to arrive: its own RPCs for unary and
+# aio, the whole batch for batched and streaming, ~0 for cache hits.
+def run_client(client, stubs, addresses, keys, cache, window):
+    n = len(addresses)
+    if client == "unary":
+        pb2 = p2_batch_rpc.matchdb_pb2
+        out, latencies, rpcs = [], [], 0
+        for key in keys:
+            start = time.perf_counter()
+            count = cache.get(key)
+            if count is MISSING:
+                request = pb2.GetMatchCountReq(country=key[0], winning_team=key[1])
+                count = 0
+                for i in targets(key, n):
+                    count += stubs[i].GetMatchCount(request).num_matches
+                    rpcs += 1
+                cache.put(key, count)
+                out.append(str(count))
+            else:
+                out.append(f"{count}*")
+            latencies.append(time.perf_counter() - start)
+        return out, latencies, rpcs
+
+    if client == "aio":
+        out, row_latencies = asyncio.run(p2_aio_client.client_aio(addresses, keys, window, cache))
+        rpcs = sum(len(targets(key, n)) for key, line in zip(keys, out) if not line.endswith("*"))
+        latencies = [s for _, s in row_latencies]
+        latencies += [0.0] * (len(keys) - len(latencies))
+        return out, latencies, rpcs
+
+    run = {"batched": p2_batch_rpc.client_batched,
+           "streaming": p2_batch_rpc.client_streaming}[client]
+    start = time.perf_counter()
+    out = run(stubs, keys, cache)
+    seconds = time.perf_counter() - start
+    latencies = [0.0 if line.endswith("*") else seconds for line in out]
+    return out, latencies, n
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="p2 workload generator and benchmark")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="Zipf exponent over values ranked by frequency (0: uniform)")
+    parser.add_argument("--wildcard-ratio", type=float, default=0.3,
+                        help="share of queries with an empty country or team")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2,
+                        help="share of queries repeating one of the last 20")
+    parser.add_argument("--seed", type=int, default=544)
+    parser.add_argument("--output", help="also write the workload as a client.py input file")
+    parser.add_argument("--client", choices=CLIENTS, default="unary")
+    parser.add_argument("--cache", choices=sorted(POLICIES), default="lru")
+    parser.add_argument("--cache-size", type=int, default=10)
+    parser.add_argument("--window", type=int, default=32, help="rows in flight (aio)")
+    parser.add_argument("--partitions", type=int, default=2)
+    parser.add_argument("--delay-ms", type=float, default=0,
+                        help="per-RPC delay of the in-process servers")
+    parser.add_argument("--servers", nargs="+", metavar="ADDRESS",
+                        help="use running servers, one per partition, instead "
+                             "(batched and streaming need the RPCs of p2_batch_rpc.py)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        parts_dir = f"{P2}/partitions"
+        partitions = len(args.servers) if args.servers else args.partitions
+        if partitions != 2:
+            parts_dir = f"{tmp}/partitions"
+            partition.partition(f"{P2}/results.csv", parts_dir, partitions, os.cpu_count())
+        paths = sorted(glob.glob(f"{parts_dir}/part_*.csv"))
+
+        keys = generate(paths, args.queries, args.skew, args.wildcard_ratio,
+                        args.repeat_ratio, seed=args.seed)
+        if args.output:
+            write_input(keys, args.output)
+            print(f"wrote {len(keys)} queries to {args.output}")
+
+        p2_batch_rpc.compile_proto(tmp)
+        servers = []
+        addresses = args.servers
+        if not addresses:
+            servers = [p2_batch_rpc.start_server(path, args.delay_ms / 1000) for path in paths]
+            addresses = [address for _, address in servers]
+        channels = [grpc.insecure_channel(address) for address in addresses]
+        stubs = [p2_batch_rpc.matchdb_pb2_grpc.MatchCountStub(c) for c in channels]
+
+        cache = make_cache(args.cache, args.cache_size)
+        start = time.perf_counter()
+        out, latencies, rpcs = run_client(args.client, stubs, addresses, keys, cache, args.window)
+        seconds = time.perf_counter() - start
+
+        ms = sorted(s * 1000 for s in latencies)
+        print(f"{len(keys)} queries ({len(set(keys))} distinct), skew {args.skew}, "
+              f"{args.wildcard_ratio:.0%} wildcards, {args.repeat_ratio:.0%} repeats; "
+              f"{args.client} client, {args.cache}-{args.cache_size} cache, "
+              f"{len(addresses)} servers")
+        print(f"  {len(keys) / seconds:,.0f} queries/s, latency p50 {percentile(ms, 50):.2f} ms, "
+              f"p95 {percentile(ms, 95):.2f} ms, p99 {percentile(ms, 99):.2f} ms")
+        print(f"  cache hit ratio {cache.hit_ratio():.1%}, {rpcs / len(keys):.3f} RPCs per query")
+
+        for channel in channels:
+            channel.close()
+        for server, _ in servers:
+            server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# ColSum latency of the reference p3 server (p3_server.py) answering from
+# its upload-time catalog of per-file column statistics versus scanning the
+# files (verify=True), after bigdata.py-style uploads of FILES files (some
+# lacking column z), for CSV and Parquet. Catalog answers are checked
+# against the scans and the expected sums, the stats of a file against
+# pyarrow, and a server restarted on the same directory against the first.
+#
+#   python3 bench/p3_catalog.py [FILES] [ROWS_PER_FILE]
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import grpc
+
+import p3_server
+
+FILES = 100
+ROWS = 50_000
+CHUNK_ROWS = 25_000
+REPEAT = 20
+
+
+def chunks(pb2, index, rows):
+    columns = "x,y" if index % 4 == 3 else "x,y,z"
+    yield pb2.UploadReq(csv_data=f"{columns}\n".encode())
+    for start in range(0, rows, CHUNK_ROWS):
+        lines = [f"1,{i}" if index % 4 == 3 else f"1,{i},{index * 1000 + i % 1000}"
+                 for i in range(start, min(start + CHUNK_ROWS, rows))]
+        yield pb2.UploadReq(csv_data=("\n".join(lines) + "\n").encode())
+
+
+def expected_sums(files, rows):
+    z = sum(index * 1000 * rows + sum(i % 1000 for i in range(rows))
+            for index in range(files) if index % 4 != 3)
+    return {"x": files * rows, "y": files * rows * (rows - 1) // 2, "z": z, "w": 0}
+
+
+# ms of the median of REPEAT calls, and the answer
+def time_sum(stub, column, format, verify, repeat=REPEAT):
+    pb2 = p3_server.table_pb2
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = stub.ColSum(pb2.ColSumReq(column=column, format=format, verify=verify))
+        times.append(time.perf_counter() - start)
+        assert not resp.error, resp.error
+    return statistics.median(times) * 1000, resp.total
+
+
+def check_stats(data_dir):
+    from pyarrow import csv
+    import pyarrow.compute as pc
+
+    with open(os.path.join(data_dir, p3_server.CATALOG)) as f:
+        entry = json.loads(f.readline())
+    table = csv.read_csv(entry["csv"])
+    for name in table.column_names:
+        stats = entry["columns"][name]
+        extremes = pc.min_max(table[name]).as_py()
+        assert stats == {"count": len(table), "nulls": 0, "sum": pc.sum(table[name]).as_py(),
+                         "min": extremes["min"], "max": extremes["max"]}, (name, stats)
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else FILES
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else ROWS
+    expected = expected_sums(files, rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        p3_server.compile_proto(tmp)
+        pb2, pb2_grpc = p3_server.table_pb2, p3_server.table_pb2_grpc
+        data_dir = f"{tmp}/data"
+        os.makedirs(data_dir)
+
+        server, address = p3_server.start_server(data_dir)
+        channel = grpc.insecure_channel(address)
+        stub = pb2_grpc.TableStub(channel)
+        start = time.perf_counter()
+        for index in range(files):
+            assert not stub.UploadStream(chunks(pb2, index, rows)).error
+        print(f"uploaded {files} files of {rows:,} rows in {time.perf_counter() - start:.1f} s")
+        check_stats(data_dir)
+
+        for column, total in expected.items():
+            for format in ("csv", "parquet"):
+                for verify in (False, True):
+                    got = time_sum(stub, column, format, verify, repeat=1)[1]
+                    assert got == total, (column, format, verify, got, total)
+        print("catalog and scans agree with the expected sums; file stats agree with pyarrow")
+
+        for format in ("csv", "parquet"):
+            catalog_ms, _ = time_sum(stub, "z", format, False)
+            scan_ms, _ = time_sum(stub, "z", format, True, repeat=3)
+            print(f"ColSum z over {format:>7}: catalog {catalog_ms:7.3f} ms, "
+                  f"scan {scan_ms:8.1f} ms")
+        channel.close()
+        server.stop(None)
+
+        start = time.perf_counter()
+        server, address = p3_server.start_server(data_dir)
+        restart_s = time.perf_counter() - start
+        channel = grpc.insecure_channel(address)
+        stub = pb2_grpc.TableStub(channel)
+        for column, total in expected.items():
+            assert time_sum(stub, column, "parquet", False, repeat=1)[1] == total
+        print(f"a restarted server loads the catalog in {restart_s * 1000:.1f} ms "
+              "and answers the same")
+        channel.close()
+        server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
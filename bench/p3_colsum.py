@@ -0,0 +1,45 @@
+# csvsum.py/parquetsum.py for the reference p3 server (p3_server.py),
+# whose ColSumReq has a verify field the student proto doesn't: with
+# --verify the server reads the files instead of answering from its catalog
+#
+#   python3 bench/p3_colsum.py [--verify] {csv,parquet} COLUMN
+
+import argparse
+import os
+import tempfile
+import time
+
+import grpc
+
+import p3_server
+
+SERVER = os.environ.get("P3_SERVER", f"localhost:{p3_server.PORT}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ColSum against the reference p3 server")
+    parser.add_argument("--verify", action="store_true",
+                        help="read the files instead of answering from the catalog")
+    parser.add_argument("format", choices=["csv", "parquet"])
+    parser.add_argument("column")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        p3_server.compile_proto(tmp)
+        pb2, pb2_grpc = p3_server.table_pb2, p3_server.table_pb2_grpc
+        with grpc.insecure_channel(SERVER) as channel:
+            stub = pb2_grpc.TableStub(channel)
+            start = time.time()
+            resp = stub.ColSum(pb2.ColSumReq(column=args.column, format=args.format,
+                                             verify=args.verify))
+            end = time.time()
+    print(f"{round((end-start)*1000, 1)} ms")
+
+    if resp.error:
+        print(resp.error)
+    else:
+        print(resp.total)
+
+
+if __name__ == "__main__":
+    main()
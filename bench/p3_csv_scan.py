@@ -0,0 +1,83 @@
+# time and peak RSS growth of summing one column of a bigdata.py-style CSV
+# (x,y,z) by parsing the whole file, by parsing only that column
+# (include_columns), and with the streaming scan of the reference p3
+# server (p3_server.csv_sum: include_columns, CSV_BLOCK bytes at a time),
+# on files of 1, 10 and BATCHES bigdata.py batches. Each run is a fresh
+# interpreter; the sums are checked against each other.
+#
+#   python3 bench/p3_csv_scan.py [BATCHES]
+
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import p3_server
+from p3_upload_stream import rss_kib
+
+BATCHES = 40
+BATCH_SIZE = 250_000
+
+
+def full_parse(path, column):
+    from pyarrow import csv
+    import pyarrow.compute as pc
+
+    return pc.sum(csv.read_csv(path)[column]).as_py()
+
+
+def projected(path, column):
+    from pyarrow import csv
+    import pyarrow.compute as pc
+
+    return pc.sum(csv.read_csv(path, convert_options=csv.ConvertOptions(
+        include_columns=[column]))[0]).as_py()
+
+
+METHODS = {"full parse": full_parse, "include_columns": projected,
+           "streaming scan": p3_server.csv_sum}
+
+
+# in a fresh interpreter: the sum, seconds and peak RSS growth (MiB)
+def run(method, path):
+    for module in ("pyarrow.csv", "pyarrow.compute"):  # loaded before the baseline
+        importlib.import_module(module)
+    idle = rss_kib(os.getpid(), "VmHWM")
+    start = time.perf_counter()
+    total = METHODS[method](path, "z")
+    seconds = time.perf_counter() - start
+    print(total, seconds, (rss_kib(os.getpid(), "VmHWM") - idle) / 1024)
+
+
+def write_batches(path, batches):
+    with open(path, "w") as f:
+        f.write("x,y,z\n")
+        for batch in range(batches):
+            f.write("".join([f"1,{i},{batch*1000+i%1000}\n" for i in range(BATCH_SIZE)]))
+
+
+def main():
+    if sys.argv[1:2] == ["--run"]:
+        run(sys.argv[2], sys.argv[3])
+        return
+
+    batches = int(sys.argv[1]) if len(sys.argv) > 1 else BATCHES
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sorted({1, 10, batches}):
+            path = f"{tmp}/batches_{n}.csv"
+            write_batches(path, n)
+            print(f"{n} batches ({n * BATCH_SIZE:,} rows, {os.path.getsize(path) / 2**20:.0f} MiB)")
+            totals = set()
+            for method in METHODS:
+                out = subprocess.run([sys.executable, __file__, "--run", method, path],
+                                     capture_output=True, text=True, check=True).stdout.split()
+                totals.add(int(out[0]))
+                print(f"{method:>18}: {float(out[1]):6.2f} s, peak RSS +{float(out[2]):6.1f} MiB")
+            assert len(totals) == 1, totals
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
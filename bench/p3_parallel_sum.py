@@ -0,0 +1,98 @@
+# ColSum(verify=True) scan time of the reference p3 server (p3_server.py)
+# with 1 to 8 files read in parallel, over FILES bigdata.py batches (250k
+# rows each), for CSV and Parquet, and the server's peak RSS growth during
+# the scan (over a server that has already loaded pyarrow); then with a
+# memory budget that admits one file at a time, which should peak like one
+# reader does. Every scan is checked against the expected sum.
+#
+#   python3 bench/p3_parallel_sum.py [FILES]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+
+import p3_server
+from p3_upload_stream import rss_kib
+
+FILES = 40
+BATCH_SIZE = 250_000
+STREAM_ROWS = 25_000
+
+
+# bigdata.py --stream
+def chunks(pb2, batch):
+    yield pb2.UploadReq(csv_data=b"x,y,z\n")
+    for start in range(0, BATCH_SIZE, STREAM_ROWS):
+        rows = "".join([f"1,{i},{batch*1000+i%1000}\n"
+                        for i in range(start, min(start + STREAM_ROWS, BATCH_SIZE))])
+        yield pb2.UploadReq(csv_data=bytes(rows, "utf-8"))
+
+
+# seconds of the scan and the server's peak RSS growth over idle, in MiB;
+# a fresh server process per scan
+def scan(data_dir, format, readers, memory_budget, expected, port=5438):
+    pb2, pb2_grpc = p3_server.table_pb2, p3_server.table_pb2_grpc
+    server = subprocess.Popen([sys.executable, p3_server.__file__, data_dir, str(port),
+                               "--readers", str(readers), "--memory-budget", str(memory_budget)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        assert server.stdout.readline().startswith("serving on")
+        with grpc.insecure_channel(f"localhost:{port}") as channel:
+            stub = pb2_grpc.TableStub(channel)
+            # a scan of a one-row file loads pyarrow; then the peak is reset,
+            # so what the measured scan holds is all that counts
+            stub.ColSum(pb2.ColSumReq(column="warm", format=format, verify=True))
+            with open(f"/proc/{server.pid}/clear_refs", "w") as f:
+                f.write("5")
+            idle = rss_kib(server.pid, "VmHWM")
+            start = time.perf_counter()
+            resp = stub.ColSum(pb2.ColSumReq(column="z", format=format, verify=True))
+            seconds = time.perf_counter() - start
+        assert (resp.error, resp.total) == ("", expected), (format, readers, resp)
+        return seconds, (rss_kib(server.pid, "VmHWM") - idle) / 1024
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else FILES
+    expected = sum(batch * 1000 * BATCH_SIZE + sum(i % 1000 for i in range(BATCH_SIZE))
+                   for batch in range(files))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        p3_server.compile_proto(tmp)
+        data_dir = f"{tmp}/data"
+        os.makedirs(data_dir)
+        server, address = p3_server.start_server(data_dir)
+        channel = grpc.insecure_channel(address)
+        stub = p3_server.table_pb2_grpc.TableStub(channel)
+        start = time.perf_counter()
+        for batch in range(files):
+            assert not stub.UploadStream(chunks(p3_server.table_pb2, batch)).error
+        assert not stub.Upload(p3_server.table_pb2.UploadReq(csv_data=b"warm\n1\n")).error
+        print(f"uploaded {files} files of {BATCH_SIZE:,} rows in "
+              f"{time.perf_counter() - start:.1f} s; {os.cpu_count()} CPUs")
+        channel.close()
+        server.stop(None)
+
+        # MiB, rounded up
+        one_file = -(-p3_server.read_cost(
+            {"columns": {"z": {"count": BATCH_SIZE, "nulls": 0}}}, "z", "parquet") >> 20)
+        runs = [(f"{n} readers", n, p3_server.MEMORY_BUDGET >> 20)
+                for n in sorted({1, 2, 4, 8, p3_server.READERS})]
+        runs.append((f"8 readers, {one_file} MiB budget", 8, one_file))
+        for name, readers, budget in runs:
+            line = []
+            for format in ("csv", "parquet"):
+                seconds, mib = scan(data_dir, format, readers, budget, expected)
+                line.append(f"{format} {seconds:5.2f} s, +{mib:4.0f} MiB")
+            print(f"{name:>24}: " + "; ".join(line))
+
+
+if __name__ == "__main__":
+    main()
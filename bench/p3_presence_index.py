@@ -0,0 +1,89 @@
+# ColSum(verify=True) of the reference p3 server (p3_server.py) over files
+# from heterogeneous sources: every file has x, and each of SOURCES sources
+# adds its own column, so a source's column is in 1/SOURCES of the files.
+# The server opens only the files its column index lists; the cost it no
+# longer pays, opening every file to find out whether it has the column
+# (the Parquet schema, the CSV header), is timed next to it. Sums are
+# checked against the expected ones first.
+#
+#   python3 bench/p3_presence_index.py [FILES] [SOURCES]
+
+import statistics
+import sys
+import tempfile
+import time
+
+import grpc
+
+import p3_server
+
+FILES = 400
+SOURCES = 40
+ROWS = 2000
+
+
+def chunks(pb2, index, sources):
+    source = index % sources
+    lines = [f"1,{i}" for i in range(ROWS)]
+    yield pb2.UploadReq(csv_data=(f"x,s{source}\n" + "\n".join(lines) + "\n").encode())
+
+
+# what finding the files that have column took without the index
+def open_every_file(server_files, column, format):
+    import pyarrow.parquet as pq
+
+    found = 0
+    for entry in server_files:
+        if format == "parquet":
+            found += column in pq.read_schema(entry["parquet"]).names
+        else:
+            with open(entry["csv"], "rb") as f:
+                found += column in f.readline().decode("utf-8").strip().split(",")
+    return found
+
+
+def median_ms(run, repeat=10):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else FILES
+    sources = int(sys.argv[2]) if len(sys.argv) > 2 else SOURCES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        p3_server.compile_proto(tmp)
+        pb2, pb2_grpc = p3_server.table_pb2, p3_server.table_pb2_grpc
+        server, address = p3_server.start_server(tmp)
+        channel = grpc.insecure_channel(address)
+        stub = pb2_grpc.TableStub(channel)
+        for index in range(files):
+            assert not stub.UploadStream(chunks(pb2, index, sources)).error
+        servicer = p3_server.make_servicer(tmp)  # reads the catalog the uploads wrote
+
+        per_source = [len(range(source, files, sources)) for source in range(sources)]
+        expected = {"x": files * ROWS, "s0": per_source[0] * ROWS * (ROWS - 1) // 2, "nope": 0}
+        for column, total in expected.items():
+            for format in ("csv", "parquet"):
+                resp = stub.ColSum(pb2.ColSumReq(column=column, format=format, verify=True))
+                assert (resp.error, resp.total) == ("", total), (column, format, resp)
+        print(f"{files} files of {ROWS} rows from {sources} sources: scans match the expected sums")
+
+        for column in ("s0", "nope", "x"):
+            for format in ("csv", "parquet"):
+                scan = median_ms(lambda: stub.ColSum(
+                    pb2.ColSumReq(column=column, format=format, verify=True)))
+                probe = median_ms(lambda: open_every_file(servicer.files, column, format))
+                print(f"ColSum {column:>4} over {format:>7} ({len(servicer.by_column.get(column, ())):3} "
+                      f"files have it): {scan:7.1f} ms; opening every file to check "
+                      f"would add {probe:6.1f} ms")
+        channel.close()
+        server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
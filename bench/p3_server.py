@@ -0,0 +1,392 @@
+# a reference server for the p3 clients' Table service, which the p3
+# benchmarks run against. Uploads (whole, or streamed in chunks split
+# anywhere) are appended to a CSV file as they arrive and converted to
+# Parquet one row group per chunk (the first holding at least the
+# INFER_BYTES that column types are inferred from), so memory stays bounded.
+# Per-column statistics of every file (count, nulls, and sum/min/max of
+# numeric columns) are taken during the upload and appended to a catalog in
+# the data directory, from which ColSum answers in O(1) and a restarted
+# server recovers its files; ColSum(verify=True) still scans the files, but
+# only those that have the column (an index kept next to the catalog), on a
+# pool of READERS threads admitted against a memory budget, and CSV files
+# one block at a time, converting only the column.
+#
+#   python3 bench/p3_server.py DATA_DIR [PORT] [--readers N] [--memory-budget MIB]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from concurrent import futures
+
+import grpc
+
+PORT = 5440
+MAX_MESSAGE = 1 << 30  # lets large whole-file Uploads through
+CATALOG = "catalog.jsonl"
+READERS = os.cpu_count()  # files a scan reads at once
+MEMORY_BUDGET = 256 << 20  # bytes all reads in flight may use; the container gets 512 MB
+READ_OVERHEAD = 8 << 20  # per Parquet read, besides the column: pages, buffers
+CSV_READ = 24 << 20  # peak of one CSV scan (block, parser buffers), as p3_parallel_sum.py measures it
+CSV_BLOCK = 1 << 20  # bytes of CSV a scan parses at a time
+INFER_BYTES = 1 << 20  # bytes of uploaded rows column types are inferred from
+
+PROTO = """
+syntax = "proto3";
+
+service Table {
+    rpc Upload(UploadReq) returns (UploadResp);
+    rpc UploadStream(stream UploadReq) returns (UploadResp);
+    rpc ColSum(ColSumReq) returns (ColSumResp);
+}
+
+message UploadReq {
+    bytes csv_data = 1;
+}
+
+message UploadResp {
+    string error = 1;
+}
+
+message ColSumReq {
+    string column = 1;
+    string format = 2;
+    // read the files instead of answering from the catalog
+    bool verify = 3;
+}
+
+message ColSumResp {
+    int64 total = 1;
+    string error = 2;
+}
+"""
+
+
+def compile_proto(out_dir):
+    with open(f"{out_dir}/table.proto", "w") as f:
+        f.write(PROTO)
+    subprocess.check_call([sys.executable, "-m", "grpc_tools.protoc", f"-I={out_dir}",
+                           f"--python_out={out_dir}", f"--grpc_python_out={out_dir}",
+                           "table.proto"])
+    sys.path.insert(0, out_dir)
+    global table_pb2, table_pb2_grpc
+    import table_pb2
+    import table_pb2_grpc
+
+
+# {column: {count, nulls[, sum, min, max]}} of a pyarrow table
+def column_stats(table):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    stats = {}
+    for name, column in zip(table.column_names, table.columns):
+        entry = {"count": len(column) - column.null_count, "nulls": column.null_count}
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            extremes = pc.min_max(column).as_py()
+            entry.update(sum=pc.sum(column).as_py() or 0,
+                         min=extremes["min"], max=extremes["max"])
+        stats[name] = entry
+    return stats
+
+
+def merge_stats(stats, more):
+    for name, entry in more.items():
+        if name not in stats:
+            stats[name] = dict(entry)
+            continue
+        old = stats[name]
+        old["count"] += entry["count"]
+        old["nulls"] += entry["nulls"]
+        if "sum" in old and "sum" in entry:
+            old["sum"] += entry["sum"]
+            old["min"] = min((v for v in (old["min"], entry["min"]) if v is not None), default=None)
+            old["max"] = max((v for v in (old["max"], entry["max"]) if v is not None), default=None)
+    return stats
+
+
+# offset just past the last (or first) newline of data that ends a row,
+# not one in a quoted field, or 0 if none does; data starts at a row. A
+# newline is quoted iff an odd number of quotes precede it ("" keeps parity)
+def row_end(data, last=True):
+    if last:
+        end = data.rfind(b"\n")
+        quotes = data.count(b'"', 0, max(end, 0))
+        while end >= 0 and quotes % 2:
+            prev = data.rfind(b"\n", 0, end)
+            quotes -= data.count(b'"', prev + 1, end)
+            end = prev
+    else:
+        end = data.find(b"\n")
+        quotes = data.count(b'"', 0, max(end, 0))
+        while end >= 0 and quotes % 2:
+            following = data.find(b"\n", end + 1)
+            quotes += data.count(b'"', end, following) if following >= 0 else 0
+            end = following
+    return end + 1
+
+
+# converts CSV bytes that arrive in pieces (split anywhere) to a Parquet
+# file, one row group per piece, and collects column_stats of the rows;
+# column types are inferred from the first INFER_BYTES of rows, like
+# pyarrow.csv infers them from its first block, and later rows must fit them
+class ParquetStream:
+    def __init__(self, path):
+        self.path = path
+        self.header = None
+        self.rest = b""  # a row that is not complete yet
+        self.sample = b""  # rows held back until there are enough to infer types from
+        self.writer = None
+        self.stats = {}
+
+    def write(self, data):
+        data = self.rest + data
+        end = row_end(data)
+        data, self.rest = data[:end], data[end:]
+        if self.header is None:
+            if not data:
+                return
+            end = row_end(data, last=False)
+            self.header, data = data[:end], data[end:]
+        if self.writer is None:
+            self.sample += data
+            if len(self.sample) < INFER_BYTES:
+                return
+            data, self.sample = self.sample, b""
+        if data:
+            self.write_rows(data)
+
+    def write_rows(self, data):
+        import re
+        import pyarrow as pa
+        from pyarrow import csv
+        import pyarrow.parquet as pq
+
+        types = None if self.writer is None else self.writer.schema
+        try:
+            table = csv.read_csv(io.BytesIO(self.header + data),
+                                 parse_options=csv.ParseOptions(newlines_in_values=True),
+                                 convert_options=csv.ConvertOptions(column_types=types))
+        except pa.ArrowInvalid as e:
+            m = re.search(r"column #(\d+)", str(e))
+            if types is None or not m:
+                raise
+            field = types.field(int(m.group(1)))
+            raise ValueError(f"column {field.name} was inferred as {field.type} from the first "
+                             f"{INFER_BYTES >> 10} KiB of rows, but later rows do not fit: {e}")
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        merge_stats(self.stats, column_stats(table))
+
+    def close(self):
+        from pyarrow import csv
+        import pyarrow.parquet as pq
+
+        if self.rest:  # no newline after the last row
+            self.write(b"\n")
+            if self.rest:
+                raise ValueError("upload ends in a quoted field that is never closed")
+        if self.sample:  # fewer than INFER_BYTES of rows in all
+            self.write_rows(self.sample)
+            self.sample = b""
+        if self.writer is None:
+            table = csv.read_csv(io.BytesIO(self.header or b""),
+                                 parse_options=csv.ParseOptions(newlines_in_values=True))
+            pq.write_table(table, self.path)
+            self.stats = column_stats(table)
+        else:
+            self.writer.close()
+
+    # after a failed upload: close the file, for the caller to remove it
+    def abort(self):
+        if self.writer is not None:
+            with contextlib.suppress(Exception):
+                self.writer.close()
+            self.writer = None
+
+
+# admits reads while their estimated memory fits the budget; a read larger
+# than the whole budget runs alone
+class MemoryBudget:
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.running = 0
+        self.changed = threading.Condition()
+
+    @contextlib.contextmanager
+    def reserve(self, size):
+        with self.changed:
+            self.changed.wait_for(lambda: not self.running or self.used + size <= self.limit)
+            self.used += size
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self.changed:
+                self.used -= size
+                self.running -= 1
+                self.changed.notify_all()
+
+
+# bytes reading column of a file takes, going by its catalog entry: CSV is
+# scanned a block at a time, Parquet columns are decoded whole (at most 8
+# bytes a value), twice over while they're assembled
+def read_cost(entry, column, format):
+    if format != "parquet":
+        return CSV_READ
+    stats = entry["columns"][column]
+    return 16 * (stats["count"] + stats["nulls"]) + READ_OVERHEAD
+
+
+# streams the CSV a block at a time, converting only column's field
+def csv_sum(path, column):
+    from pyarrow import csv
+    import pyarrow.compute as pc
+
+    total = 0
+    reader = csv.open_csv(path, read_options=csv.ReadOptions(block_size=CSV_BLOCK, use_threads=False),
+                          parse_options=csv.ParseOptions(newlines_in_values=True),
+                          convert_options=csv.ConvertOptions(include_columns=[column]))
+    for batch in reader:
+        total += pc.sum(batch.column(0)).as_py() or 0
+    return total
+
+
+def file_sum(entry, column, format):
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    if format == "parquet":
+        return pc.sum(pq.read_table(entry["parquet"], columns=[column])[0]).as_py() or 0
+    return csv_sum(entry["csv"], column)
+
+
+def make_servicer(data_dir, readers=READERS, memory_budget=MEMORY_BUDGET):
+    catalog_path = os.path.join(data_dir, CATALOG)
+
+    class Table(table_pb2_grpc.TableServicer):
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.files = []  # catalog entries: {csv, parquet, columns: {name: stats}}
+            self.by_column = {}  # column -> entries of the files that have it
+            self.readers = futures.ThreadPoolExecutor(readers)  # shared by all scans
+            self.budget = MemoryBudget(memory_budget)
+            self.totals = {}  # column -> sum over all files, None if not numeric somewhere
+            if os.path.exists(catalog_path):
+                with open(catalog_path) as f:
+                    for line in f:
+                        self.add(json.loads(line))
+
+        # call with the lock held (or before serving)
+        def add(self, entry):
+            self.files.append(entry)
+            for name, stats in entry["columns"].items():
+                self.by_column.setdefault(name, []).append(entry)
+                if not stats["count"]:
+                    continue  # only nulls: no type to go by
+                total = self.totals.get(name, 0)
+                self.totals[name] = None if total is None or "sum" not in stats \
+                    else total + stats["sum"]
+
+        def Upload(self, request, context):
+            return self.UploadStream(iter([request]), context)
+
+        def UploadStream(self, request_iterator, context):
+            name = os.path.join(data_dir, uuid.uuid4().hex)
+            parquet = ParquetStream(f"{name}.parquet")
+            try:
+                with open(f"{name}.csv", "wb") as f:
+                    for request in request_iterator:
+                        f.write(request.csv_data)
+                        parquet.write(request.csv_data)
+                parquet.close()
+            except Exception as e:
+                # nothing of a failed upload stays in the data directory
+                parquet.abort()
+                for path in (f"{name}.csv", f"{name}.parquet"):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                return table_pb2.UploadResp(error=str(e))
+
+            entry = {"csv": f"{name}.csv", "parquet": f"{name}.parquet", "columns": parquet.stats}
+            # one O_APPEND write per entry, so concurrent uploads don't interleave lines
+            fd = os.open(catalog_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(entry) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+            with self.lock:
+                self.add(entry)
+            return table_pb2.UploadResp()
+
+        def ColSum(self, request, context):
+            if not request.verify:
+                with self.lock:
+                    total = self.totals.get(request.column, 0)
+                if total is None:
+                    return table_pb2.ColSumResp(error=f"column {request.column} is not numeric")
+                return table_pb2.ColSumResp(total=int(total))
+
+            # only the files that have the column are opened at all
+            with self.lock:
+                entries = list(self.by_column.get(request.column, ()))
+
+            # pyarrow releases the GIL while it reads and sums, so files are
+            # read in parallel; the partial sums are added up in file order
+            def read(entry):
+                import pyarrow as pa
+
+                with self.budget.reserve(read_cost(entry, request.column, request.format)):
+                    try:
+                        return file_sum(entry, request.column, request.format)
+                    finally:
+                        # hand back what this thread's allocator cached, or
+                        # every reader would keep a read's worth of memory
+                        pa.default_memory_pool().release_unused()
+
+            try:
+                total = sum(self.readers.map(read, entries))
+            except Exception as e:
+                return table_pb2.ColSumResp(error=str(e))
+            return table_pb2.ColSumResp(total=int(total))
+
+    return Table()
+
+
+def start_server(data_dir, port=0, readers=READERS, memory_budget=MEMORY_BUDGET):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8),
+                         options=[("grpc.so_reuseport", 0),
+                                  ("grpc.max_receive_message_length", MAX_MESSAGE)])
+    servicer = make_servicer(data_dir, readers, memory_budget)
+    table_pb2_grpc.add_TableServicer_to_server(servicer, server)
+    port = server.add_insecure_port(f"localhost:{port}")
+    server.start()
+    return server, f"localhost:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="reference p3 Table server")
+    parser.add_argument("data_dir")
+    parser.add_argument("port", type=int, nargs="?", default=PORT)
+    parser.add_argument("--readers", type=int, default=READERS)
+    parser.add_argument("--memory-budget", type=int, default=MEMORY_BUDGET >> 20, help="MiB")
+    args = parser.parse_args()
+    os.makedirs(args.data_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        compile_proto(tmp)
+        server, address = start_server(args.data_dir, args.port, args.readers,
+                                       args.memory_budget << 20)
+        print(f"serving on {address}", flush=True)
+        server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# peak memory of a p3 server receiving a CSV as one Upload message versus
+# as an UploadStream of chunks, which it writes to the CSV file as they
+# arrive and converts to Parquet one row group per chunk (ParquetWriter),
+# so it never holds more than a chunk or the first INFER_BYTES of rows that
+# column types are inferred from. The reference server (p3_server.py)
+# runs in its own process, a fresh one per upload; p3/upload.py --stream is
+# the client. ColSum over the CSV and the Parquet file, from the catalog and
+# from the files, is checked against the expected sums after every upload.
+#
+#   python3 bench/p3_upload_stream.py [ROWS]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+
+import p3_server
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+P3 = os.path.join(ROOT, "p3")
+ROWS = 2_500_000
+
+
+def rss_kib(pid, field):
+    with open(f"/proc/{pid}/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ":"))
+
+
+def write_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("x,y,z\n")
+        for start in range(0, rows, 100_000):
+            f.write("".join(f"1,{i},{i % 1000}\n" for i in range(start, min(start + 100_000, rows))))
+    return {"x": rows, "y": rows * (rows - 1) // 2,
+            "z": sum(range(1000)) * (rows // 1000) + sum(range(rows % 1000))}
+
+
+# uploads path to a fresh server with upload.py (and its flags); returns
+# seconds and the server's peak RSS growth in MiB
+def upload(tmp, path, expected, flags, port=5439):
+    data_dir = tempfile.mkdtemp(dir=tmp)
+    env = dict(os.environ, PYTHONPATH=tmp, P3_SERVER=f"localhost:{port}")
+    server = subprocess.Popen([sys.executable, p3_server.__file__, data_dir, str(port)],
+                              env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        assert server.stdout.readline().startswith("serving on")
+        idle = rss_kib(server.pid, "VmHWM")
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, f"{P3}/upload.py", *flags, path],
+                             env=env, capture_output=True, text=True).stdout
+        seconds = time.perf_counter() - start
+        peak = rss_kib(server.pid, "VmHWM")
+        if "success" not in out:
+            return seconds, None, out.strip().splitlines()[-1][:100]
+
+        # the p3 sum clients' proto has no verify field, so ask directly
+        pb2, pb2_grpc = p3_server.table_pb2, p3_server.table_pb2_grpc
+        with grpc.insecure_channel(f"localhost:{port}") as channel:
+            stub = pb2_grpc.TableStub(channel)
+            for format in ("csv", "parquet"):
+                for column, total in expected.items():
+                    for verify in (False, True):
+                        resp = stub.ColSum(pb2.ColSumReq(column=column, format=format, verify=verify))
+                        assert (resp.error, resp.total) == ("", total), (format, column, verify, resp)
+        return seconds, (peak - idle) / 1024, None
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        p3_server.compile_proto(tmp)
+        for name, content in [("simple.csv", None), ("no newline at the end", b"x,y\n1,2\n3,4"),
+                              ("header only", b"x,y\n")]:
+            path = f"{P3}/simple.csv" if content is None else f"{tmp}/small.csv"
+            if content is not None:
+                with open(path, "wb") as f:
+                    f.write(content)
+            expected = {"x": 5, "y": 7, "z": 9} if content is None else \
+                {"x": 4 if b"3" in content else 0, "w": 0}
+            for flags in ([], ["--stream"]):
+                _, _, error = upload(tmp, path, expected, flags)
+                assert error is None, (name, flags, error)
+        print("Upload and UploadStream agree on ColSum over CSV and Parquet for small files")
+
+        path = f"{tmp}/big.csv"
+        expected = write_csv(path, rows)
+        print(f"{rows:,} rows, {os.path.getsize(path) / 2**20:.0f} MiB of CSV")
+        for name, flags in [("Upload", []), ("UploadStream", ["--stream"])]:
+            seconds, mib, error = upload(tmp, path, expected, flags)
+            if error:
+                print(f"{name:>14}: failed: {error}")
+            else:
+                print(f"{name:>14}: {seconds:5.2f} s, server peak RSS +{mib:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# checks that p2/partition.py's bounded-width simple_hash_mod and the batched
+# simple_hash_mods (numpy and pure Python) equal simple_hash(s) % n on random
+# strings and moduli, then measures their throughput against the reference
+# on the country column of results.csv and on long distinct strings
+#
+#   python3 bench/simple_hash.py [CASES]
+
+import csv
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "p2"))
+import partition  # noqa: E402
+
+CASES = 200
+ALPHABETS = [
+    "abc",
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ abcdefghijklmnopqrstuvwxyz-'.",
+    "\0a\0",  # NULs, also trailing ones, which numpy's str arrays drop
+    "çãéüØ Ĳ中文ß",
+    "\U0001F600\U0010FFFF￿",  # beyond the BMP, and the largest code point
+]
+MODULI = [1, 2, 3, 4, 5, 7, 8, 10, 16, 64, 97, 1000, 2**31 - 1, 2**32, 2**32 + 15,
+          2**61 - 1, 2**61, 2**61 + 1, 2**64, 2**89 - 1]
+
+
+def random_string(rng):
+    alphabet = rng.choice(ALPHABETS)
+    length = rng.choice([0, 1, 2, 5, 20, 100, 1000])
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, length)))
+
+
+def check(cases):
+    rng = random.Random(544)
+    numpy = partition.np
+    checked = 0
+    for _ in range(cases):
+        strings = [random_string(rng) for _ in range(rng.randint(0, 50))]
+        strings += rng.choices(strings, k=len(strings))  # repeats
+        n = rng.choice(MODULI + [rng.randint(1, 2**70)])
+        expected = [partition.simple_hash(s) % n for s in strings]
+        assert [partition.simple_hash_mod(s, n) for s in strings] == expected, n
+        for np in (numpy, None):
+            partition.np = np
+            assert partition.simple_hash_mods(strings, n) == expected, (n, np)
+        partition.np = numpy
+        checked += len(strings)
+    print(f"simple_hash_mod and simple_hash_mods agree with simple_hash % n "
+          f"on {checked} strings" + ("" if numpy else " (numpy not installed)"))
+
+
+def bench(name, strings, n):
+    runs = [
+        ("simple_hash(s) % n", lambda: [partition.simple_hash(s) % n for s in strings]),
+        ("simple_hash_mod", lambda: [partition.simple_hash_mod(s, n) for s in strings]),
+        ("simple_hash_mods", lambda: partition.simple_hash_mods(strings, n)),
+    ]
+    print(f"{name}: {len(strings):,} strings, {len(set(strings)):,} distinct, n={n}")
+    for label, run in runs:
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        print(f"{label:>22}: {len(strings) / seconds:14,.0f} strings/s")
+
+
+def main():
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else CASES
+    check(cases)
+
+    with open(os.path.join(ROOT, "p2", "results.csv"), newline="") as f:
+        countries = [row["country"] for row in csv.DictReader(f)]
+    bench("results.csv countries x20", countries * 20, 4)
+
+    rng = random.Random(544)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    long_strings = ["".join(rng.choices(letters, k=200)) for _ in range(20_000)]
+    bench("distinct 200-char strings", long_strings, 1000)
+
+
+if __name__ == "__main__":
+    main()
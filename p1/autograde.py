@@ -1,17 +1,20 @@
 from subprocess import check_output, run, DEVNULL
 import os
 
-from tester import init, test, cleanup, tester_main
+from tester import init, test, cleanup, tester_main, slot_name
+
+IMAGE = slot_name("p1")
+CONTAINER = slot_name("p1_tester")
 
 @init
 def init(existing_file=None):
-    os.system("docker rmi -f p1")
-    os.system("docker container rm p1_tester")
+    os.system(f"docker rmi -f {IMAGE}")
+    os.system(f"docker container rm {CONTAINER}")
     
 @cleanup
 def cleanup():
-    run("docker rmi -f p1", shell=True, stderr=DEVNULL)
-    run("docker container rm p1_tester", shell=True, stderr=DEVNULL)
+    run(f"docker rmi -f {IMAGE}", shell=True, stderr=DEVNULL)
+    run(f"docker container rm {CONTAINER}", shell=True, stderr=DEVNULL)
 
 @test(points = 15)
 def os_test():
@@ -59,15 +62,15 @@ def shebang_test():
 
 @test(points = 10, timeout = 300)
 def build_test():
-    os.system("docker rmi -f p1")
-    _ = check_output(["docker", "build", ".", "-t", "p1"])
+    os.system(f"docker rmi -f {IMAGE}")
+    _ = check_output(["docker", "build", ".", "-t", IMAGE])
 
 @test(points = 15, timeout = 300)
 def run_test():
-    out = check_output(["docker", "run", "--name", "p1_tester", "p1"])
+    out = check_output(["docker", "run", "--name", CONTAINER, IMAGE])
     if "2493" in str(out, "utf-8"):
         return None
     return "did not find 2493 in output of Docker container"
 
 if __name__ == "__main__":
-    tester_main()
+    tester_main(batch_cost=(1, 0.5))
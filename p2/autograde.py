@@ -1,235 +1,14 @@
-# ============= legacy code: tester.py =============
-
-import time
-from pathlib import Path
-import subprocess
-from collections import OrderedDict
-import json
-import argparse
 import os
-import traceback
-import shutil
-import multiprocessing
-
-multiprocessing.set_start_method("fork")
-
-VERBOSE = True
-
-TMP_DIR = "/tmp/_cs544_tester_directory"
-TEST_DIR = None
-
-# full list of tests
-INIT = None
-TESTS = OrderedDict()
-CLEANUP = None
-DEBUG = None
-GO_FOR_DEBUG = None
-
-# dataclass for storing test object info
-
-
-class TestPoint:
-    def __init__(self, point, desc=None):
-        self.point = point
-        self.desc = desc
-
-
-class _unit_test:
-    def __init__(self, func, points, timeout, desc, required_files):
-        self.func = func
-        self.points = points
-        self.timeout = timeout
-        self.desc = desc
-        self.required_files = required_files
-
-    def run(self, ret):
-        points = 0
-
-        # check if required files exist
-        for file in self.required_files:
-            if not os.path.exists(file):
-                result = f"{file} not found"
-                ret.send((points, result))
-                return
-
-        try:
-            result = self.func()
-            if not result:
-                points = self.points
-                result = f"PASS ({self.points}/{self.points})"
-            if isinstance(result, TestPoint):
-                points = result.point
-                if points == self.points:
-                    verdict = "PASS"
-                elif points == 0:
-                    verdict = "FAIL"
-                else:
-                    verdict = "PARTIAL"
-
-                desc = result.desc
-                result = f"{verdict} ({points}/{self.points})"
-                if desc:
-                    result += f": {desc}"
-
-        except Exception as e:
-            result = traceback.format_exception(e)
-            print(f"Exception in {self.func.__name__}:\n")
-            print("\n".join(result) + "\n")
-
-        if VERBOSE:
-            if points == self.points:
-                print(f"🟢 PASS ({points}/{self.points})")
-            elif points == 0:
-                print(f"🔴 FAIL ({points}/{self.points})")
-            else:
-                print(f"🟡 PARTIAL ({points}/{self.points})")
-
-        ret.send((points, result))
-
-
-# init decorator
-def init(init_func):
-    global INIT
-    INIT = init_func
-    return init_func
-
-
-# test decorator
-def test(points, timeout=None, desc="", required_files=[]):
-    def wrapper(test_func):
-        TESTS[test_func.__name__] = _unit_test(
-            test_func, points, timeout, desc, required_files)
-
-    return wrapper
-
-# debug dir decorator
-
-
-def debug(debug_func):
-    global DEBUG
-    DEBUG = debug_func
-    return debug_func
-
-# cleanup decorator
-
-
-def cleanup(cleanup_func):
-    global CLEANUP
-    CLEANUP = cleanup_func
-    return cleanup_func
-
-
-# lists all tests
-def list_tests():
-    for test_name, test in TESTS.items():
-        print(f"{test_name}({test.points}): {test.desc}")
-
+import subprocess
+import time
 
-# run all tests
-def run_tests():
-    results = {
-        "score": 0,
-        "full_score": 0,
-        "tests": {},
-    }
-
-    for test_name, test in TESTS.items():
-        if VERBOSE:
-            print(f"===== Running {test_name} =====")
-
-        results["full_score"] += test.points
-
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
-
-        results["score"] += points
-        results["tests"][test_name] = result
-
-    assert results["score"] <= results["full_score"]
-    if VERBOSE:
-        print("===== Final Score =====")
-        print(json.dumps(results, indent=4))
-        print("=======================")
-    # and results['score'] != results["full_score"]
-    if DEBUG and GO_FOR_DEBUG:
-        DEBUG()
-    # cleanup code after all tests run
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
-    return results
-
-
-# save the result as json
-def save_results(results):
-    output_file = f"{TEST_DIR}/score.json"
-    print(f"Output written to: {output_file}")
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-
-def tester_main():
-    global VERBOSE, TEST_DIR, GO_FOR_DEBUG
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-d", "--dir", type=str, default=".", help="path to your repository"
-    )
-    parser.add_argument("-l", "--list", action="store_true",
-                        help="list all tests")
-    parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument("-g", "--debug", action="store_true",
-                        help="create a debug directory with the files used while testing")
-    args = parser.parse_args()
-
-    if args.list:
-        list_tests()
-        return
-
-    VERBOSE = args.verbose
-    GO_FOR_DEBUG = args.debug
-    test_dir = args.dir
-    if not os.path.isdir(test_dir):
-        print("invalid path")
-        return
-    TEST_DIR = os.path.abspath(test_dir)
-
-    # make a copy of the code
-    def ignore(_dir_name, _dir_content): return [
-        ".git", ".github", "__pycache__", ".gitignore", "*.pyc"]
-    shutil.copytree(src=TEST_DIR, dst=TMP_DIR,
-                    dirs_exist_ok=True, ignore=ignore)
-
-    if CLEANUP:
-        CLEANUP()
-
-    os.chdir(TMP_DIR)
-
-    # run init
-    if INIT:
-        INIT()
-
-    # run tests
-    results = run_tests()
-    save_results(results)
-
-    # run cleanup
-    if CLEANUP:
-        CLEANUP()
-
-
-# ============= end of legacy code =============
-# ============= autograder code =============
+from tester import (test, cleanup, tester_main, TestPoint, ensure_image, prune_images,
+                    slot_name, slot_labels, slot_filter, compose_command)
 
 
 AUTOGRADE_NETWORK = "autograde_default"
-COMPOSE_PROJECT = "wins"
+IMAGE = slot_name("p2")
+COMPOSE_PROJECT = slot_name("wins")
 COMPOSE_NETWORK = f"{COMPOSE_PROJECT}_default"
 
 
@@ -247,7 +26,7 @@ def stop_cluster():
 
 def stop_all_containers():
     container_ids = subprocess.run(
-        ["docker", "ps", "-aq"],
+        ["docker", "ps", "-aq", *slot_filter()],
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
@@ -262,7 +41,7 @@ def stop_all_containers():
 
 def stop_remove_all_containers():
     container_ids = subprocess.run(
-        ["docker", "ps", "-aq"],
+        ["docker", "ps", "-aq", *slot_filter()],
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
@@ -302,8 +81,12 @@ def create_network(network):
 
 
 def docker_prune():
-    subprocess.run(["docker", "system", "prune", "-af"], check=True,
+    # keep recently used images (and the build cache) for the next run
+    subprocess.run(["docker", "container", "prune", "-f", *slot_filter()], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run(["docker", "network", "prune", "-f", *slot_filter()], check=True,
                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    prune_images()
     print("Cleaned up docker system.")
 
 
@@ -326,13 +109,10 @@ def is_container_running(container_name):
         return False
 
 
-@test(10, required_files=["Dockerfile"])
+@test(10, required_files=["Dockerfile"], images=[IMAGE])
 def docker_build():
     # testing if the Dockerfile can be built
-    environment = os.environ.copy()
-    environment["DOCKER_CLI_HINTS"] = "false"
-    subprocess.check_output(
-        ["docker", "build", ".", "-t", "p2"], env=environment)
+    ensure_image(IMAGE)
 
 
 @test(10, required_files=["matchdb.proto"])
@@ -346,12 +126,12 @@ def proto_compile():
         return "Error compiling matchdb.proto"
 
 
-@test(5, required_files=["wins/docker-compose.yml", "Dockerfile", "server.py"])
+@test(5, required_files=["wins/docker-compose.yml", "Dockerfile", "server.py"], images=[IMAGE])
 def servers_run():
     # testing if the servers can be run
     os.chdir("wins")
     try:
-        subprocess.run(["docker", "compose", "up", "-d"], check=True)
+        subprocess.run(compose_command(images=["p2"]) + ["up", "-d"], check=True)
     except Exception as e:
         return "Error running docker-compose"
 
@@ -359,8 +139,8 @@ def servers_run():
     servers_running = False
     for _ in range(30):
         time.sleep(1)
-        if is_container_running("wins-server-1"):
-            if is_container_running("wins-server-2"):
+        if is_container_running(f"{COMPOSE_PROJECT}-server-1"):
+            if is_container_running(f"{COMPOSE_PROJECT}-server-2"):
                 servers_running = True
                 break
         print("Waiting for servers to start...")
@@ -378,15 +158,16 @@ def read_expected(expected_file):
     return inputs
 
 
-@test(5, required_files=["wins/docker-compose.yml", "Dockerfile", "client.py"])
+@test(5, required_files=["wins/docker-compose.yml", "Dockerfile", "client.py"], images=[IMAGE])
 def client_runs():
     # testing if client.py can be run
     # and it prints the correct number of outputs
     case_no = 0
     input_file = f"inputs/input_{case_no}.csv"
 
-    client = subprocess.run(["docker", "run", "--net=wins_default", "p2", "python3", "/client.py", "wins-server-1:5440",
-                            "wins-server-2:5440", f"/{input_file}"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    client = subprocess.run(["docker", "run", *slot_labels(), f"--net={COMPOSE_NETWORK}", IMAGE, "python3", "/client.py",
+                            f"{COMPOSE_PROJECT}-server-1:5440", f"{COMPOSE_PROJECT}-server-2:5440", f"/{input_file}"],
+                            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     client_outputs = client.stdout.decode("utf-8").strip()
     client_outputs = client_outputs.splitlines()
 
@@ -402,8 +183,9 @@ def test_input(case_no, full_point):
     # and it prints the correct result
     input_file = f"inputs/input_{case_no}.csv"
 
-    client = subprocess.run(["docker", "run", "--net=wins_default", "p2", "python3", "/client.py", "wins-server-1:5440",
-                            "wins-server-2:5440", f"/{input_file}"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    client = subprocess.run(["docker", "run", *slot_labels(), f"--net={COMPOSE_NETWORK}", IMAGE, "python3", "/client.py",
+                            f"{COMPOSE_PROJECT}-server-1:5440", f"{COMPOSE_PROJECT}-server-2:5440", f"/{input_file}"],
+                            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     client_outputs = client.stdout.decode("utf-8").strip()
     client_outputs = client_outputs.splitlines()
 
@@ -428,26 +210,26 @@ def test_input(case_no, full_point):
     return "Incorrect outputs"
 
 
-@test(10)
+@test(10, dependencies=["servers_run"], images=[IMAGE])
 def test_input_0():
     # test for single server
     return test_input(0, 10)
 
 
-@test(20)
+@test(20, dependencies=["servers_run"], images=[IMAGE])
 def test_input_1():
     return test_input(1, 20)
 
 
-@test(20)
+@test(20, dependencies=["servers_run"], images=[IMAGE])
 def test_input_2():
     return test_input(2, 20)
 
 
-@test(20)
+@test(20, dependencies=["servers_run"], images=[IMAGE])
 def test_input_3():
     return test_input(3, 20)
 
 
 if __name__ == "__main__":
-    tester_main()
+    tester_main(results_file="score.json", batch_cost=(2, 1.5))
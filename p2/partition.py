@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# Splits results.csv into N hash partitions of (winning_team, country):
+# rows whose simple_hash(country) % N == i go to part_i.csv, in the order
+# of results.csv. With N=2 this reproduces partitions/part_0.csv and
+# part_1.csv byte for byte.
+#
+#   python3 partition.py -n 4 -o partitions_4
+
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 1 << 20  # bytes of results.csv per task
+
+
+def simple_hash(country):
+    out = 0
+    for c in country:
+        out += (out << 2) - out + ord(c)
+    return out
+
+
+# simple_hash(s) % n without simple_hash's ever-growing integer: each step is
+# out = 4 * out + ord(c), so out can be reduced mod n after every character
+def simple_hash_mod(s, n):
+    out = 0
+    for c in s:
+        out = (4 * out + ord(c)) % n
+    return out
+
+
+# [simple_hash(s) % n for s in strings], hashing each distinct string once;
+# with numpy, all of them together, one character position at a time
+def simple_hash_mods(strings, n):
+    unique = list(dict.fromkeys(strings))
+    if np is None or n > 2**61 or not unique:
+        # out < n, so 4 * out + ord(c) must fit in 64 bits for numpy
+        table = {s: simple_hash_mod(s, n) for s in unique}
+        return [table[s] for s in strings]
+
+    # code points, padded with zeros after the end of each string
+    codes = np.array(unique, dtype=str)
+    codes = codes.view(np.uint32).reshape(len(unique), -1).astype(np.uint64)
+    lengths = np.fromiter(map(len, unique), dtype=np.int64, count=len(unique))
+    out = np.zeros(len(unique), dtype=np.uint64)
+    n = np.uint64(n)
+    for i in range(codes.shape[1]):
+        out = np.where(lengths > i, (out * np.uint64(4) + codes[:, i]) % n, out)
+    table = dict(zip(unique, out.tolist()))
+    return [table[s] for s in strings]
+
+
+# the team that won (the away team for a draw) and the country it was played in
+def winning_team(row):
+    home_score, away_score = int(row["home_score"]), int(row["away_score"])
+    if home_score > away_score:
+        return row["home_team"]
+    return row["away_team"]
+
+
+# byte ranges of path, each ending at the end of a line (no field of
+# results.csv spans lines)
+def chunks(path, header_end):
+    size = os.path.getsize(path)
+    start = header_end
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + CHUNK_SIZE, size))
+            f.readline()
+            end = min(f.tell(), size)
+            yield start, end
+            start = end
+
+
+# the csv text of every partition for one chunk
+def partition_chunk(task):
+    path, header, start, end, n = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+
+    rows = list(csv.DictReader(io.StringIO(text, newline=""), fieldnames=header))
+    shards = simple_hash_mods([row["country"] for row in rows], n)
+
+    outputs = [io.StringIO() for _ in range(n)]
+    writers = [csv.writer(out, lineterminator="\n") for out in outputs]
+    for row, shard in zip(rows, shards):
+        writers[shard].writerow([winning_team(row), row["country"]])
+    return [out.getvalue() for out in outputs]
+
+
+def partition(src, out_dir, n, jobs):
+    with open(src, "rb") as f:
+        header_line = f.readline()
+    header = next(csv.reader([header_line.decode("utf-8")]))
+    tasks = [(src, header, start, end, n) for start, end in chunks(src, len(header_line))]
+
+    os.makedirs(out_dir, exist_ok=True)
+    files = [open(os.path.join(out_dir, f"part_{i}.csv"), "w", newline="") for i in range(n)]
+    try:
+        for f in files:
+            f.write("winning_team,country\n")
+        # imap keeps the chunks, and so the rows, in their original order
+        with multiprocessing.Pool(jobs) as pool:
+            for parts in pool.imap(partition_chunk, tasks):
+                for f, text in zip(files, parts):
+                    f.write(text)
+    finally:
+        for f in files:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hash partition results.csv by country")
+    parser.add_argument("-n", "--partitions", type=int, default=2)
+    parser.add_argument("-i", "--input", default="results.csv")
+    parser.add_argument("-o", "--output", default="partitions")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    partition(args.input, args.output, args.partitions, args.jobs)
+    print(f"wrote {args.partitions} partitions of {args.input} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
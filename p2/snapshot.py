@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Converts partitions (part_N.csv) to binary snapshots (part_N.snap) that a
+# server can memory-map at startup instead of parsing the CSV: both columns
+# as little-endian int32 codes into one string table, rows in CSV order.
+#
+#   python3 snapshot.py partitions/part_0.csv partitions/part_1.csv
+#
+# Layout (offsets are multiples of 8):
+#   header       magic, rows, strings, string bytes (HEADER, padded to 64)
+#   teams        int32[rows], winning_team codes
+#   countries    int32[rows], country codes
+#   offsets      int64[strings + 1], where each string starts in the blob
+#   blob         the strings, UTF-8, one after the other
+#
+# Snapshot(path) maps a file and answers counts like a server's
+# GetMatchCount. With numpy, loading touches the columns only through
+# vectorised counts, so it allocates per distinct value, not per row.
+
+import argparse
+import csv
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"P2SNAP01"
+HEADER = struct.Struct("<8sQQQ")
+HEADER_SIZE = 64
+DTYPES = {"i": "<i4", "q": "<i8"}
+CHUNK_ROWS = 1 << 18  # rows counted per step; keeps temporary arrays small
+
+
+def _aligned(n):
+    return (n + 7) & ~7
+
+
+def convert(src, dst):
+    strings = {}
+    teams, countries = array("i"), array("i")
+    with open(src, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for team, country in reader:
+            teams.append(strings.setdefault(team, len(strings)))
+            countries.append(strings.setdefault(country, len(strings)))
+
+    blob = bytearray()
+    offsets = array("q", [0])
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    if sys.byteorder != "little":
+        for column in (teams, countries, offsets):
+            column.byteswap()
+
+    tmp = dst + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(teams), len(strings), len(blob)).ljust(HEADER_SIZE, b"\0"))
+        for column in (teams, countries):
+            data = column.tobytes()
+            f.write(data.ljust(_aligned(len(data)), b"\0"))
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp, dst)  # a server starting meanwhile never sees half a file
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rows, strings, blob_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a p2 snapshot")
+        column_size = _aligned(4 * rows)
+        teams_at = HEADER_SIZE
+        countries_at = teams_at + column_size
+        offsets_at = countries_at + column_size
+        blob_at = offsets_at + 8 * (strings + 1)
+
+        offsets = self._column(offsets_at, strings + 1, "q")
+        blob = self.map[blob_at:blob_at + blob_size]
+        self.strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(strings)]
+        self.codes = {s: i for i, s in enumerate(self.strings)}
+        self.rows = rows
+
+        self.teams = teams = self._column(teams_at, rows, "i")
+        self.countries = countries = self._column(countries_at, rows, "i")
+        if np is not None:
+            by_team = np.zeros(strings, dtype=np.int64)
+            by_country = np.zeros(strings, dtype=np.int64)
+            self.by_both = Counter()
+            for start in range(0, rows, CHUNK_ROWS):
+                team_chunk = teams[start:start + CHUNK_ROWS].astype(np.int64)
+                country_chunk = countries[start:start + CHUNK_ROWS].astype(np.int64)
+                by_team += np.bincount(team_chunk, minlength=strings)
+                by_country += np.bincount(country_chunk, minlength=strings)
+                pairs, counts = np.unique(team_chunk * strings + country_chunk, return_counts=True)
+                self.by_both.update(dict(zip(pairs.tolist(), counts.tolist())))
+            self.by_team, self.by_country = by_team.tolist(), by_country.tolist()
+        else:
+            self.by_team, self.by_country = [0] * strings, [0] * strings
+            self.by_both = {}
+            for (team, country), n in Counter(zip(teams, countries)).items():
+                self.by_team[team] += n
+                self.by_country[country] += n
+                self.by_both[team * strings + country] = n
+
+    # a read-only view of count values of the given type at offset
+    def _column(self, offset, count, typecode):
+        size = array(typecode).itemsize * count
+        if np is not None:
+            return np.frombuffer(self.map, dtype=DTYPES[typecode], count=count, offset=offset)
+        if sys.byteorder != "little":
+            column = array(typecode, self.map[offset:offset + size])
+            column.byteswap()
+            return column
+        return memoryview(self.map)[offset:offset + size].cast(typecode)
+
+    # (winning_team, country) of every row, in CSV order
+    def __iter__(self):
+        strings = self.strings
+        for team, country in zip(self.teams, self.countries):
+            yield strings[team], strings[country]
+
+    def count(self, country, winning_team):
+        team = self.codes.get(winning_team) if winning_team else None
+        code = self.codes.get(country) if country else None
+        if (winning_team and team is None) or (country and code is None):
+            return 0
+        if winning_team and country:
+            return self.by_both.get(team * len(self.strings) + code, 0)
+        if winning_team:
+            return self.by_team[team]
+        if country:
+            return self.by_country[code]
+        return self.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="convert p2 partitions to snapshots")
+    parser.add_argument("partitions", nargs="+", help="part_N.csv files")
+    parser.add_argument("-o", "--output", help="directory for the .snap files "
+                                               "(default: next to each partition)")
+    args = parser.parse_args()
+    for src in args.partitions:
+        name = os.path.splitext(os.path.basename(src))[0] + ".snap"
+        dst = os.path.join(args.output or os.path.dirname(src), name)
+        convert(src, dst)
+        print(f"wrote {dst} ({os.path.getsize(dst):,} bytes, from {os.path.getsize(src):,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,241 +1,12 @@
-# ============= legacy code: tester.py =============
-
-import time
-from pathlib import Path
-import subprocess
-from collections import OrderedDict
-import json
-import argparse
 import os
-import traceback
 import shutil
-import multiprocessing
-
-multiprocessing.set_start_method("fork")
-
-VERBOSE = True
-
-TMP_DIR = "/tmp/_cs544_tester_directory"
-TEST_DIR = None
-
-# full list of tests
-INIT = None
-TESTS = OrderedDict()
-PASSED_TESTS = set()
-CLEANUP = None
-DEBUG = None
-GO_FOR_DEBUG = None
-
-# dataclass for storing test object info
-
-
-class TestPoint:
-    def __init__(self, point, desc=None):
-        self.point = point
-        self.desc = desc
+import subprocess
+import time
 
+import tester
+from tester import (init, test, cleanup, tester_main, ensure_image, prune_images,
+                    slot_name, slot_port, slot_labels, slot_filter)
 
-class _unit_test:
-    def __init__(self, func, points, timeout, desc, required_files, dependencies):
-        self.func = func
-        self.points = points
-        self.timeout = timeout
-        self.desc = desc
-        self.required_files = required_files
-        self.dependencies = dependencies
-
-    def run(self, ret):
-        points = 0
-
-        # check if required tests passed
-        for test_name in self.dependencies:
-            if test_name not in PASSED_TESTS:
-                result = f"Dependency {test_name} did not pass"
-                ret.send((points, result))
-                return
-
-        # check if required files exist
-        for file in self.required_files:
-            if not os.path.exists(file):
-                result = f"{file} not found"
-                ret.send((points, result))
-                return
-
-        try:
-            result = self.func()
-            if not result:
-                points = self.points
-                result = f"PASS ({self.points}/{self.points})"
-            if isinstance(result, TestPoint):
-                points = result.point
-                if points == self.points:
-                    verdict = "PASS"
-                elif points == 0:
-                    verdict = "FAIL"
-                else:
-                    verdict = "PARTIAL"
-
-                desc = result.desc
-                result = f"{verdict} ({points}/{self.points})"
-                if desc:
-                    result += f": {desc}"
-
-        except Exception as e:
-            result = traceback.format_exception(e)
-            print(f"Exception in {self.func.__name__}:\n")
-            print("\n".join(result) + "\n")
-
-        if VERBOSE:
-            if points == self.points:
-                print(f"🟢 PASS ({points}/{self.points})")
-            elif points == 0:
-                print(f"🔴 FAIL ({points}/{self.points})")
-            else:
-                print(f"🟡 PARTIAL ({points}/{self.points})")
-        
-        ret.send((points, result))
-
-
-# init decorator
-def init(init_func):
-    global INIT
-    INIT = init_func
-    return init_func
-
-
-# test decorator
-def test(points, timeout=None, desc="", required_files=[], dependencies=[]):
-    def wrapper(test_func):
-        TESTS[test_func.__name__] = _unit_test(
-            test_func, points, timeout, desc, required_files, dependencies)
-
-    return wrapper
-
-# debug dir decorator
-
-
-def debug(debug_func):
-    global DEBUG
-    DEBUG = debug_func
-    return debug_func
-
-# cleanup decorator
-
-
-def cleanup(cleanup_func):
-    global CLEANUP
-    CLEANUP = cleanup_func
-    return cleanup_func
-
-
-# lists all tests
-def list_tests():
-    for test_name, test in TESTS.items():
-        print(f"{test_name}({test.points}): {test.desc}")
-
-
-# run all tests
-def run_tests():
-    results = {
-        "score": 0,
-        "full_score": 0,
-        "tests": {},
-    }
-
-    for test_name, test in TESTS.items():
-        if VERBOSE:
-            print(f"===== Running {test_name} =====")
-
-        results["full_score"] += test.points
-
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
-
-        results["score"] += points
-        results["tests"][test_name] = result
-
-        if points == test.points:
-            PASSED_TESTS.add(test_name)
-
-    assert results["score"] <= results["full_score"]
-    if VERBOSE:
-        print("===== Final Score =====")
-        print(json.dumps(results, indent=4))
-        print("=======================")
-    # and results['score'] != results["full_score"]
-    if DEBUG and GO_FOR_DEBUG:
-        DEBUG()
-    # cleanup code after all tests run
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
-    return results
-
-
-# save the result as json
-def save_results(results):
-    output_file = f"{TEST_DIR}/score.json"
-    print(f"Output written to: {output_file}")
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-
-def tester_main():
-    global VERBOSE, TEST_DIR, GO_FOR_DEBUG
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-d", "--dir", type=str, default=".", help="path to your repository"
-    )
-    parser.add_argument("-l", "--list", action="store_true",
-                        help="list all tests")
-    parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument("-g", "--debug", action="store_true",
-                        help="create a debug directory with the files used while testing")
-    args = parser.parse_args()
-
-    if args.list:
-        list_tests()
-        return
-
-    VERBOSE = args.verbose
-    GO_FOR_DEBUG = args.debug
-    test_dir = args.dir
-    if not os.path.isdir(test_dir):
-        print("invalid path")
-        return
-    TEST_DIR = os.path.abspath(test_dir)
-
-    # make a copy of the code
-    def ignore(_dir_name, _dir_content): return [
-        ".git", ".github", "__pycache__", ".gitignore", "*.pyc"]
-    shutil.copytree(src=TEST_DIR, dst=TMP_DIR, dirs_exist_ok=True, ignore=ignore)
-
-    if CLEANUP:
-        CLEANUP()
-
-    os.chdir(TMP_DIR)
-
-    # run init
-    if INIT:
-        INIT()
-
-    # run tests
-    results = run_tests()
-    save_results(results)
-
-    # run cleanup
-    if CLEANUP:
-        CLEANUP()
-
-
-# ============= end of legacy code =============
 # ============= docker code =============
 
 def stop_cluster():
@@ -246,7 +17,7 @@ def stop_cluster():
 
 def stop_all_containers():
     container_ids = subprocess.run(
-        ["docker", "ps", "-aq"],
+        ["docker", "ps", "-aq", *slot_filter()],
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
@@ -261,7 +32,7 @@ def stop_all_containers():
 
 def stop_remove_all_containers():
     container_ids = subprocess.run(
-        ["docker", "ps", "-aq"],
+        ["docker", "ps", "-aq", *slot_filter()],
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
@@ -301,8 +72,12 @@ def create_network(network):
 
 
 def docker_prune():
-    subprocess.run(["docker", "system", "prune", "-af"], check=True,
+    # keep recently used images (and the build cache) for the next run
+    subprocess.run(["docker", "container", "prune", "-f", *slot_filter()], check=True,
                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run(["docker", "network", "prune", "-f", *slot_filter()], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    prune_images()
     print("Cleaned up docker system.")
 
 
@@ -328,7 +103,9 @@ def is_container_running(container_name):
 # ============= start of autograde.py =============
 
 VENV = "venv_auto"
-CONTAINER = "p3_auto"
+IMAGE = slot_name("p3")
+CONTAINER = slot_name("p3_auto")
+SERVER_PORT = slot_port(5440)
 NUM_ROWS = 100
 COLUMNS = ['a', 'b', 'c', 'd']
 COLUMNS_SUM = dict()
@@ -344,6 +121,9 @@ def _cleanup(*args, **kwargs):
 
 @init
 def _init():
+    # read by the client programs
+    os.environ["P3_SERVER"] = f"localhost:{SERVER_PORT}"
+
     subprocess.run(["python3", "-m", "venv", VENV], check=True)
     # grpcio==1.66.1 grpcio-tools==1.66.1 numpy==2.1.1 protobuf==5.27.2 pyarrow==17.0.0 setuptools==75.1.0
     subprocess.run([
@@ -368,27 +148,25 @@ def _init():
             f.write(",".join(values) + "\n")
 
     # copy to main directory
-    shutil.copy(f'{CSV_FILE}', f'{TEST_DIR}/{CSV_FILE}')
+    shutil.copy(f'{CSV_FILE}', f'{tester.TEST_DIR}/{CSV_FILE}')
 
     for j, c in enumerate(COLUMNS):
         COLUMNS_SUM[c] = sum([i**j for i in range(NUM_ROWS)])
 
 
-@test(5, required_files=["Dockerfile"], timeout=600)
+@test(5, required_files=["Dockerfile"], timeout=600, images=[IMAGE])
 def docker_build():
     # testing if the Dockerfile can be built
     # docker build . -t p3
-    environment = os.environ.copy()
-    environment["DOCKER_CLI_HINTS"] = "false"
-    subprocess.check_output(
-        ["docker", "build", ".", "-t", "p3"], env=environment)
+    ensure_image(IMAGE, exclude=[VENV])
     
 
-@test(5, dependencies=["docker_build"])
+@test(5, dependencies=["docker_build"], images=[IMAGE])
 def docker_run():
     # testing if the Docker container can run
     # docker run -d -m 512m -p 127.0.0.1:5440:5440 p3
-    subprocess.run(["docker", "run", "-d", "-m", "512m", "-p", "127.0.0.1:5440:5440", "--name", CONTAINER, "p3"], check=True)
+    subprocess.run(["docker", "run", "-d", "-m", "512m", "-p", f"127.0.0.1:{SERVER_PORT}:5440",
+                    *slot_labels(), "--name", CONTAINER, IMAGE], check=True)
     time.sleep(5)
     for _ in range(10):
         if is_container_running(CONTAINER):
@@ -504,4 +282,4 @@ def big_sum():
         print('Ignore the warning if you have avoided that.')
 
 if __name__ == "__main__":
-    tester_main()
+    tester_main(results_file="score.json", batch_cost=(1, 1.5))
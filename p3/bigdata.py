@@ -1,21 +1,38 @@
-import grpc, sys
+import grpc, os, sys
 import table_pb2_grpc, table_pb2
 
-SERVER = "localhost:5440"
+SERVER = os.environ.get("P3_SERVER", "localhost:5440")
 BATCH_COUNT = 400
 BATCH_SIZE = 250_000
+STREAM_ROWS = 25_000 # rows per UploadReq with --stream
+
+def batch_rows(batch, start, end):
+    return "".join([f"1,{i},{batch*1000+i%1000}\n" for i in range(start, end)])
+
+def chunks(batch):
+    yield table_pb2.UploadReq(csv_data=b"x,y,z\n")
+    for start in range(0, BATCH_SIZE, STREAM_ROWS):
+        data = batch_rows(batch, start, min(start + STREAM_ROWS, BATCH_SIZE))
+        yield table_pb2.UploadReq(csv_data=bytes(data, "utf-8"))
 
 def main():
-    if len(sys.argv) != 1:
-        print("Usage: python3 bigdata.py")
+    args = sys.argv[1:]
+    stream = "--stream" in args
+    if stream:
+        args.remove("--stream")
+    if len(args) != 0:
+        print("Usage: python3 bigdata.py [--stream]")
         sys.exit(1)
     channel = grpc.insecure_channel(SERVER)
     stub = table_pb2_grpc.TableStub(channel)
 
     for batch in range(BATCH_COUNT):
         print(f"Batch {batch+1} of {BATCH_COUNT}: 0.25 million rows")
-        rows = "x,y,z\n" + "\n".join([f"1,{i},{batch*1000+i%1000}" for i in range(BATCH_SIZE)])
-        resp = stub.Upload(table_pb2.UploadReq(csv_data=bytes(rows, "utf-8")))
+        if stream:
+            resp = stub.UploadStream(chunks(batch))
+        else:
+            rows = "x,y,z\n" + "\n".join([f"1,{i},{batch*1000+i%1000}" for i in range(BATCH_SIZE)])
+            resp = stub.Upload(table_pb2.UploadReq(csv_data=bytes(rows, "utf-8")))
 
         if resp.error:
             print(resp.error)
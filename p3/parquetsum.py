@@ -1,7 +1,7 @@
-import grpc, sys, time
+import grpc, os, sys, time
 import table_pb2_grpc, table_pb2
 
-SERVER = "localhost:5440"
+SERVER = os.environ.get("P3_SERVER", "localhost:5440")
 
 def main():
     if len(sys.argv) != 2:
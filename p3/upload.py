@@ -1,18 +1,32 @@
-import grpc, sys
+import grpc, os, sys
 import table_pb2_grpc, table_pb2
 
-SERVER = "localhost:5440"
+SERVER = os.environ.get("P3_SERVER", "localhost:5440")
+CHUNK_SIZE = 1 << 20 # bytes per UploadReq with --stream
+
+def chunks(path):
+    with open(path, "rb") as f:
+        while data := f.read(CHUNK_SIZE):
+            yield table_pb2.UploadReq(csv_data=data)
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 upload.py <CSV_PATH>")
+    args = sys.argv[1:]
+    stream = "--stream" in args
+    if stream:
+        args.remove("--stream")
+    if len(args) != 1:
+        print("Usage: python3 upload.py [--stream] <CSV_PATH>")
         sys.exit(1)
-    path = sys.argv[1]
+    path = args[0]
     channel = grpc.insecure_channel(SERVER)
     stub = table_pb2_grpc.TableStub(channel)
-    with open(path, "rb") as f:
-        data = f.read() # binary "bytes" data
-    resp = stub.Upload(table_pb2.UploadReq(csv_data=data))
+    if stream:
+        # chunks may end anywhere, even mid-row; the server never gets the whole file at once
+        resp = stub.UploadStream(chunks(path))
+    else:
+        with open(path, "rb") as f:
+            data = f.read() # binary "bytes" data
+        resp = stub.Upload(table_pb2.UploadReq(csv_data=data))
 
     if resp.error:
         print(resp.error)
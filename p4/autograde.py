@@ -1,292 +1,3 @@
-# ============= legacy code: tester.py =============
-from collections import OrderedDict
-import json
-import os
-import traceback
-import shutil
-import multiprocessing
-import glob
-
-multiprocessing.set_start_method("fork")
-
-
-def warn(msg):
-    print(f"🟡 Warning: {msg}")
-
-
-def error(msg):
-    print(f"🔴 Error: {msg}")
-
-
-ARGS = None
-
-DEBUG = False
-VERBOSE = False
-
-TMP_DIR = "/tmp/_cs544_tester_directory"
-TEST_DIR = None
-DEBUG_DIR = "_autograder_results"
-AUTONB_DIR = "_autograder_nb"
-
-# full list of tests
-INIT = None
-TESTS = OrderedDict()
-CLEANUP = None
-
-
-def verbose(msg):
-    if VERBOSE:
-        print(msg)
-
-
-def run_with_timeout(func, timeout):
-    def wrapper(ret):
-        try:
-            func()
-            result = None
-        except Exception as e:
-            result = traceback.format_exception(e)
-        ret.send(result)
-
-    ret_send, ret_recv = multiprocessing.Pipe()
-    proc = multiprocessing.Process(target=wrapper, args=(ret_send,))
-    proc.start()
-    proc.join(timeout)
-    if proc.is_alive():
-        proc.terminate()
-        result = "Timeout"
-    else:
-        result = ret_recv.recv()
-    return result
-
-
-# dataclass for storing test object info
-class _unit_test:
-    def __init__(self, func, points, timeout, desc):
-        self.func = func
-        self.points = points
-        self.timeout = timeout
-        self.desc = desc
-
-    def run(self, ret):
-        points = 0
-
-        try:
-            result = self.func()
-            if not result:
-                points = self.points
-                result = f"PASS ({self.points}/{self.points})"
-            else:
-                print(f"Test {self.func.__name__} failed:\n")
-                if isinstance(result, str):
-                    result = result.split("\n")
-                if isinstance(result, list):
-                    print("\n".join(result) + "\n")
-                else:
-                    print(result + "\n")
-        except Exception as e:
-            result = traceback.format_exception(e)
-            print(f"Exception in {self.func.__name__}:\n")
-            print("\n".join(result) + "\n")
-
-        if VERBOSE:
-            if points == self.points:
-                print(f"🟢 PASS ({points}/{self.points})")
-            elif points == 0:
-                print(f"🔴 FAIL ({points}/{self.points})")
-            else:
-                print(f"🟡 PARTIAL ({points}/{self.points})")
-
-
-        ret.send((points, result))
-
-
-# init decorator
-def init(init_func):
-    global INIT
-    INIT = init_func
-    return init_func
-
-
-# test decorator
-def test(points, timeout=None, desc=""):
-    def wrapper(test_func):
-        TESTS[test_func.__name__] = _unit_test(test_func, points, timeout, desc)
-
-    return wrapper
-
-
-# debug dir decorator
-def debug(debug_func):
-    global DEBUG
-    DEBUG = debug_func
-    return debug_func
-
-
-# cleanup decorator
-def cleanup(cleanup_func):
-    global CLEANUP
-    CLEANUP = cleanup_func
-    return cleanup_func
-
-
-# get arguments
-def get_args():
-    return ARGS
-
-
-# lists all tests
-def list_tests():
-    for test_name, test in TESTS.items():
-        print(f"{test_name}({test.points}): {test.desc}")
-
-
-# run all tests
-def run_tests():
-    results = {
-        "score": 0,
-        "full_score": 0,
-        "tests": {},
-    }
-
-    for test_name, test in TESTS.items():
-        if VERBOSE:
-            print(f"===== Running Test {test_name} =====")
-
-        results["full_score"] += test.points
-
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
-
-        if VERBOSE:
-            print(result)
-        results["score"] += points
-        results["tests"][test_name] = result
-
-    assert results["score"] <= results["full_score"]
-    if VERBOSE:
-        print("===== Final Score =====")
-        print(json.dumps(results, indent=4))
-        print("=======================")
-
-    if DEBUG:
-        debug_abs_path = f"{TEST_DIR}/{DEBUG_DIR}"
-        shutil.rmtree(debug_abs_path, ignore_errors=True)
-        shutil.copytree(src=TMP_DIR, dst=debug_abs_path, dirs_exist_ok=True)
-        print(f"Run results are stored to {debug_abs_path}")
-
-    # copying the notebooks with autograder outputs
-    notebooks = glob.glob(f"{TMP_DIR}/nb/tester-*.ipynb")
-    # shutil.rmtree(f"{TEST_DIR}/{AUTONB_DIR}", ignore_errors=True)
-    os.makedirs(f"{TEST_DIR}/{AUTONB_DIR}", exist_ok=True)
-    for notebook in notebooks:
-        shutil.copy(notebook, f"{TEST_DIR}/{AUTONB_DIR}")
-
-    # cleanup code after all tests run
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
-    return results
-
-
-# save the result as json
-def save_results(results):
-    output_file = f"{TEST_DIR}/score.json"
-    print(f"Output written to: {output_file}")
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-
-def check_files(test_dir, required_files):
-    if not os.path.isdir(f"{test_dir}/.git"):
-        warn(f"{test_dir} is not a repository")
-
-    missing_files = []
-    for file in required_files:
-        if not os.path.exists(f"{test_dir}/{file}"):
-            missing_files.append(file)
-    if len(missing_files) > 0:
-        msg = ", ".join(missing_files)
-        warn(f"the following required files are missing: {msg}")
-
-
-def tester_main(parser, required_files=[]):
-    global ARGS, VERBOSE, TEST_DIR, DEBUG
-
-    parser.add_argument(
-        "-d", "--dir", type=str, default=".", help="path to your repository"
-    )
-    parser.add_argument("-l", "--list", action="store_true", help="list all tests")
-    parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument(
-        "-g",
-        "--debug",
-        action="store_true",
-        help="create a debug directory with the files used while testing",
-    )
-    args = parser.parse_args()
-
-    ARGS = args
-
-    if args.list:
-        list_tests()
-        return
-
-    VERBOSE = args.verbose
-    DEBUG = args.debug
-    test_dir = args.dir
-    if not os.path.isdir(test_dir):
-        error("invalid path")
-        return
-    TEST_DIR = os.path.abspath(test_dir)
-
-    # check if required files are present
-    check_files(test_dir, required_files)
-
-    # clean TMP directory
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
-
-    # make a copy of the code
-    def ignore(_dir_name, _dir_content):
-        return [".git", ".github", "__pycache__", ".gitignore", "*.pyc", DEBUG_DIR]
-
-    shutil.copytree(src=TEST_DIR, dst=TMP_DIR, dirs_exist_ok=True, ignore=ignore)
-    os.chdir(TMP_DIR)
-
-    # run init
-    if INIT:
-        ret = INIT()
-        if ret != None:
-            result = f"Init failed: {ret}"
-            error(result)
-            save_results(result)
-            exit(-1)
-
-    # run tests
-    results = run_tests()
-    save_results(results)
-
-    # run cleanup
-    if CLEANUP:
-        print('Cleaning...')
-        ret = CLEANUP()
-        if ret != None:
-            result = f"Cleanup failed: {ret}"
-            error(result)
-            exit(-1)
-
-
-# ============= end of legacy code =============
-
-# ============= start of autograde.py =============
-
-
 import os, json, time, re
 import subprocess
 from subprocess import check_output
@@ -295,6 +6,11 @@ from pathlib import Path
 import traceback
 from argparse import ArgumentParser
 
+from tester import (init, test, cleanup, tester_main, warn, wait_until, wait_for_event,
+                    notebook_answers, build_images, prune_images)
+
+AUTONB_DIR = "_autograder_nb"
+
 
 # key=num, val=answer (as string)
 ANSWERS = {}
@@ -344,10 +60,13 @@ def perform_startup(
     docker_reset()
 
     try:
-        check_output("docker build . -f hdfs.Dockerfile -t p4-hdfs", shell=True)
-        check_output("docker build . -f namenode.Dockerfile -t p4-nn", shell=True)
-        check_output("docker build . -f datanode.Dockerfile -t p4-dn", shell=True)
-        check_output("docker build . -f notebook.Dockerfile -t p4-nb", shell=True)
+        # the three role images only share p4-hdfs, so build them side by side
+        build_images({
+            "p4-hdfs": ("hdfs.Dockerfile", []),
+            "p4-nn": ("namenode.Dockerfile", ["p4-hdfs"]),
+            "p4-dn": ("datanode.Dockerfile", ["p4-hdfs"]),
+            "p4-nb": ("notebook.Dockerfile", ["p4-hdfs"]),
+        })
 
         # Start them using docker-compose up
         if debug:
@@ -376,13 +95,12 @@ def perform_startup(
         return "Error"
 
 
+@cleanup
 def docker_reset():
     try:
         subprocess.run(["docker compose kill; docker compose rm -f"], shell=True)
-        subprocess.run(["docker", "rmi", "-f", "p4-nb"], check=True, shell=False)
-        subprocess.run(["docker", "rmi", "-f", "p4-nn"], check=True, shell=False)
-        subprocess.run(["docker", "rmi", "-f", "p4-dn"], check=True, shell=False)
-        subprocess.run(["docker", "rmi", "-f", "p4-hdfs"], check=True, shell=False)
+        # unchanged p4 images are reused by perform_startup; only evict old ones
+        prune_images()
 
         result = subprocess.run(
             [
@@ -400,24 +118,6 @@ def docker_reset():
         pass
 
 
-def is_container_running(container_name):
-    try:
-        result = subprocess.run(
-            ["docker", "ps", "--filter",
-                f"name={container_name}", "--format", "{{.Names}}"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        running_containers = result.stdout.strip().splitlines()
-        if container_name in running_containers:
-            return True
-        else:
-            return False
-    except subprocess.CalledProcessError as e:
-        print(f"Error checking container status: {e.stderr}")
-        return False
-    
 def list_containers():
     try:
         result = subprocess.run(
@@ -458,6 +158,35 @@ def stop_container(container_name):
 #     return num_datanodes 
 
 
+def live_datanodes(nb_container_name):
+    cmd = f"docker exec {nb_container_name} hdfs dfsadmin -fs hdfs://boss:9000 -report"
+    try:
+        output = check_output(cmd, shell=True)
+    except subprocess.CalledProcessError as e:
+        print("couldn't get report from NameNode")
+        return None
+    m = re.search(r"Live datanodes \((\d+)\)", str(output, "utf-8"))
+    if not m:
+        print("report didn't describe live datanodes")
+        return None
+    return int(m.group(1))
+
+
+def is_single_parquet_corrupt(nb_container_name):
+    cmd = f"docker exec {nb_container_name} hdfs fsck hdfs://boss:9000/single.parquet -blocks -locations"
+    try:
+        result = subprocess.run(cmd, capture_output=True, shell=True)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return False
+    if result.returncode != 0:
+        m = re.search(r"\'/single.parquet\' is CORRUPT", str(result.stdout, "utf-8"))
+        if m:
+            return True
+    print("Blocks missing still not updated yet")
+    return False
+
+
 def run_student_code():
     nb_container_name = perform_startup(debug=True)
     file_dir = os.path.abspath(__file__)
@@ -469,23 +198,14 @@ def run_student_code():
     print("\n" + "=" * 70)
     print("Waiting for HDFS cluster to stabilize... this may take a while")
     print("=" * 70)
-    cmd = f"docker exec {nb_container_name} hdfs dfsadmin -fs hdfs://boss:9000 -report"
-    print(cmd)
-    for i in range(300):
-        try:
-            output = check_output(cmd, shell=True)
-            m = re.search(r"Live datanodes \((\d+)\)", str(output, "utf-8"))
-            if not m:
-                print("report didn't describe live datanodes")
-            else:
-                count = int(m.group(1))
-                print(f"found {count} live DataNodes")
-                if count >= 2:
-                    print("cluster is ready")
-                    break
-        except subprocess.CalledProcessError as e:
-            print("couldn't get report from NameNode")
-        time.sleep(1)
+    def cluster_ready():
+        count = live_datanodes(nb_container_name)
+        if count is not None:
+            print(f"found {count} live DataNodes")
+        return count is not None and count >= 2
+
+    if wait_until(cluster_ready, timeout=300):
+        print("cluster is ready")
 
     print("\n" + "=" * 70)
     print("Running p4a.ipynb notebook... this will take a while")
@@ -519,15 +239,17 @@ def run_student_code():
     # else:
     #     raise Exception("could not find worker to kill")
 
+    since = time.time()
     running_containers = list_containers()
     for container in running_containers:
         if "dn-1" in container:
             print(f"stop {container}")
             stop_container(container)
             break
-    
-    time.sleep(1)
-    if not is_container_running("dn-1"):
+    else:
+        container = "dn-1"
+
+    if wait_for_event([f"container={container}", "event=die"], "die", timeout=10, since=since):
         print("Worker 1 killed")
     else:
         raise Exception("could not kill worker 1")
@@ -535,53 +257,24 @@ def run_student_code():
     print("\n" + "=" * 70)
     print("Waiting for NameNode to detect DataNode is dead... this may take a while")
     print("=" * 70)
-    cmd = f"docker exec {nb_container_name} hdfs dfsadmin -fs hdfs://boss:9000 -report"
-    print(cmd)
-    for i in range(60):
-        try:
-            output = check_output(cmd, shell=True)
-            m = re.search(r"Live datanodes \((\d+)\)", str(output, "utf-8"))
-            if not m:
-                print("report didn't describe live datanodes")
-            else:
-                count = int(m.group(1))
-                print(f"NameNode thinks there are {count} live DataNodes")
-                if count < 2:
-                    print("DataNode death detected by NameNode")
-                    break
-        except subprocess.CalledProcessError as e:
-            print("Couldn't get report from NameNode")
-        time.sleep(5)
+    def datanode_dead():
+        count = live_datanodes(nb_container_name)
+        if count is not None:
+            print(f"NameNode thinks there are {count} live DataNodes")
+        return count is not None and count < 2
+
+    if wait_until(datanode_dead, timeout=300):
+        print("DataNode death detected by NameNode")
 
     
     print("\n" + "=" * 70)
     print("Waiting for NameNode to detect single.parquet has lost blocks... this may take a while")
     print("=" * 70)    
-    cmd = f"docker exec {nb_container_name} hdfs fsck hdfs://boss:9000/single.parquet -blocks -locations"
-    print(cmd)
-    for i in range(60):
-        try:    
-            result = subprocess.run(cmd, capture_output=True,shell=True)
-            if result.returncode != 0:
-                m = re.search(r"\'/single.parquet\' is CORRUPT", str(result.stdout, "utf-8"))
-                if m:
-                    print("Blocks missing updated")
-                    break
-
-            else:
-                print("Blocks missing still not updated yet")  
-                time.sleep(5)
-        except FileNotFoundError:
-            print("Command not found")
-        except Exception as e:
-            print(f"An error occurred: {e}")
-       
-    # waiting for a little bit more
-    time.sleep(5)
+    if wait_until(lambda: is_single_parquet_corrupt(nb_container_name), timeout=300):
+        print("Blocks missing updated")
 
     print("\n" + "=" * 70)
     print("Running p4b.ipynb notebook... this will take a while")
-    time.sleep(15)
     print("=" * 70)
     try:
         cmd = (
@@ -605,31 +298,19 @@ def run_student_code():
 def extract_notebook_answers(path):
     print(path)
     answers = {}
-    with open(path) as f:
-        nb = json.load(f)
-        cells = nb["cells"]
-
-        for cell in cells:
-            if cell["cell_type"] != "code":
-                continue
-            if not cell["source"]:
-                continue
-            m = re.match(r"#[qQ](\d+)(.*)", cell["source"][0].strip())
-            if not m:
-                continue
-
-            # found a answer cell, add its output to list
-            qnum = int(m.group(1))
-            notes = m.group(2).strip()
-            if qnum in answers:
-                warn(f"Warning: answer {qnum} repeated!")
-
-            for output in cell["outputs"]:
-                if output.get("output_type") == "execute_result":
-                    answers[qnum] = "\n".join(output["data"]["text/plain"])
-                if output.get("output_type") == "stream":
-                    if not qnum in answers:
-                        answers[qnum] = "\n".join(output["text"])
+    _, answer_cells = notebook_answers(path)
+
+    for qnum, notes, outputs in answer_cells:
+        # found a answer cell, add its output to list
+        if qnum in answers:
+            warn(f"Warning: answer {qnum} repeated!")
+
+        for output in outputs:
+            if output.get("output_type") == "execute_result":
+                answers[qnum] = "\n".join(output["data"]["text/plain"])
+            if output.get("output_type") == "stream":
+                if not qnum in answers:
+                    answers[qnum] = "\n".join(output["text"])
 
     return answers
 
@@ -679,6 +360,7 @@ def diagnostic_checks():
 
 @init
 def init(verbose=False, *args, **kwargs):
+    diagnostic_checks()
     run_student_code()
     extract_student_answers()
 
@@ -817,7 +499,6 @@ def q10():
 
 
 if __name__ == "__main__":
-    diagnostic_checks()
     parser = ArgumentParser()
     tester_main(
         parser,
@@ -830,5 +511,7 @@ if __name__ == "__main__":
             "docker-compose.yml",
             "namenode.Dockerfile",
         ],
+        results_file="score.json",
+        # the notebooks with autograder outputs
+        artifacts={"nb/tester-*.ipynb": AUTONB_DIR},
     )
-    docker_reset()
@@ -1,234 +1,12 @@
-import json
-import re  # parsing JSON and regular expressions
 import math
-from collections import OrderedDict
-import json
-import argparse
-import os
-import traceback
-import shutil
-import multiprocessing
-import subprocess
-
-multiprocessing.set_start_method("fork")
-
-VERBOSE = False
-TEST_DIR = None
-
-# full list of tests
-INIT = None
-TESTS = OrderedDict()
-CLEANUP = None
-DEBUG = None
-GO_FOR_DEBUG = None
+
+from tester import init, test, tester_main, notebook_answers
+
 PROJECT_REMOTE_URL = (
     "https://git.doit.wisc.edu/cdis/cs/courses/cs544/f24/main/-/raw/main/p5/"
 )
 
 
-########################################################
-### tester functions
-########################################################
-
-
-def warn(msg):
-    print(f"🟡 Warning: {msg}")
-
-
-def error(msg):
-    print(f"🔴 Error: {msg}")
-
-
-class _unit_test:
-    def __init__(self, func, points, timeout, desc):
-        self.func = func
-        self.points = points
-        self.timeout = timeout
-        self.desc = desc
-
-    def run(self, ret):
-        points = 0
-
-        try:
-            result = self.func()
-            if not result:
-                points = self.points
-                result = f"PASS ({self.points}/{self.points})"
-        except Exception as e:
-            result = traceback.format_exception(e)
-            print(f"Exception in {self.func.__name__}:\n")
-            print("\n".join(result) + "\n")
-
-        ret.send((points, result))
-
-
-# init decorator
-def init(init_func):
-    global INIT
-    INIT = init_func
-    return init_func
-
-
-# test decorator
-def test(points, timeout=None, desc=""):
-    def wrapper(test_func):
-        TESTS[test_func.__name__] = _unit_test(test_func, points, timeout, desc)
-
-    return wrapper
-
-
-# debug dir decorator
-
-
-def debug(debug_func):
-    global DEBUG
-    DEBUG = debug_func
-    return debug_func
-
-
-# cleanup decorator
-
-
-def cleanup(cleanup_func):
-    global CLEANUP
-    CLEANUP = cleanup_func
-    return cleanup_func
-
-
-# lists all tests
-def list_tests():
-    for test_name, test in TESTS.items():
-        print(f"{test_name}({test.points}): {test.desc}")
-
-
-# run all tests
-def run_tests():
-    results = {
-        "score": 0,
-        "full_score": 0,
-        "tests": {},
-    }
-
-    for test_name, test in TESTS.items():
-        if VERBOSE:
-            print(f"===== Running Test {test_name} =====")
-
-        results["full_score"] += test.points
-
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
-
-        if VERBOSE:
-            print(result)
-        results["score"] += points
-        results["tests"][test_name] = result
-
-    assert results["score"] <= results["full_score"]
-    if VERBOSE:
-        print("===== Final Score =====")
-        print(json.dumps(results, indent=4))
-        print("=======================")
-    # and results['score'] != results["full_score"]
-    if DEBUG and GO_FOR_DEBUG:
-        DEBUG()
-    return results
-
-
-# save the result as json
-def save_results(results):
-    output_file = f"{TEST_DIR}/score.json"
-    print(f"Output written to: {output_file}")
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-
-def check_for_updated_files():
-    files = ["autograde.py", "p5-base.Dockerfile"]
-    for file in files:
-        # get md5sum of the remote file
-        remote_md5sum, _ = subprocess.run(
-            f"wget {PROJECT_REMOTE_URL}{file} -O - | md5sum",
-            shell=True,
-            capture_output=True,
-            text=True,
-        ).stdout.split()
-        # get md5sum of the local file
-        local_md5sum, _ = subprocess.run(
-            f"md5sum {file}", shell=True, capture_output=True, text=True
-        ).stdout.split()
-
-        if remote_md5sum != local_md5sum:
-            print("=" * 40)
-            warn(f"{file} is not the same as the file in the repository.")
-            print(
-                "This could be: (1) You may have modified the file. (2) The file has been updated."
-            )
-            print("=" * 40)
-
-
-def tester_main():
-    global VERBOSE, TEST_DIR, GO_FOR_DEBUG
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-d", "--dir", type=str, default=".", help="path to your repository"
-    )
-    parser.add_argument("-l", "--list", action="store_true", help="list all tests")
-    parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument(
-        "-g",
-        "--debug",
-        action="store_true",
-        help="create a debug directory with the files used while testing",
-    )
-    parser.add_argument(
-        "-k",
-        "--skip-check",
-        action="store_true",
-        default=False,
-        help="skip checking for updated files",
-    )
-    args = parser.parse_args()
-
-    if not args.skip_check:
-        check_for_updated_files()
-
-    if args.list:
-        list_tests()
-        return
-
-    VERBOSE = args.verbose
-    GO_FOR_DEBUG = args.debug
-    test_dir = args.dir
-    if not os.path.isdir(test_dir):
-        print("invalid path")
-        return
-    TEST_DIR = os.path.abspath(test_dir)
-
-    if CLEANUP:
-        CLEANUP()
-
-    # run init
-    if INIT:
-        INIT()
-
-    # run tests
-    results = run_tests()
-    save_results(results)
-
-    # run cleanup
-    if CLEANUP:
-        CLEANUP()
-
-
 ########################################################
 ### nbutils functions
 ########################################################
@@ -416,44 +194,27 @@ ANSWERS = (
 
 @init
 def collect_cells():
-    with open("nb/p5.ipynb") as f:
-        nb = json.load(f)  # load the notebook as a json object
-        cells = nb["cells"]  # get the list of cells from the notebook
-        expected_exec_count = 1  # expected execution count of the next cell
-
-        for cell in cells:
-            if "execution_count" in cell and cell["execution_count"]:
-                exec_count = cell["execution_count"]
-                if exec_count != expected_exec_count:
-                    raise Exception(
-                        f"Expected execution count {expected_exec_count} but found {exec_count}. Please do Restart & Run all then save before running the tester."
-                    )
-                expected_exec_count = exec_count + 1
-
-            if cell["cell_type"] != "code":
-                continue
-
-            if not cell["source"]:
-                # if the cell is empty, skip it (empty = it has no source code)
-                continue
-
-            # pattern should be #q1 or #Q1 (#q2 or #Q2, etc.)
-            m = re.match(r"#[qQ](\d+)(.*)", cell["source"][0].strip())
-            if not m:
-                continue
-
-            # found a answer cell, add its output to list
-            qnum = int(m.group(1))
-            notes = m.group(2).strip()
-            if qnum in ANSWERS:
-                raise Exception(f"Answer {qnum} repeated!")
-            # expected qnum = 1 + (max key in ANSWERS dictionary if ANSWERS is not empty else 0)
-            expected = 1 + (max(ANSWERS.keys()) if ANSWERS else 0)
-            if qnum != expected:
-                print(f"Warning: Expected question {expected} next but found {qnum}!")
-
-            # add the output of the answer cell to the ANSWERS dictionary
-            ANSWERS[qnum] = cell["outputs"]
+    execution_counts, answer_cells = notebook_answers("nb/p5.ipynb")
+
+    expected_exec_count = 1  # expected execution count of the next cell
+    for exec_count in execution_counts:
+        if exec_count != expected_exec_count:
+            raise Exception(
+                f"Expected execution count {expected_exec_count} but found {exec_count}. Please do Restart & Run all then save before running the tester."
+            )
+        expected_exec_count = exec_count + 1
+
+    for qnum, notes, outputs in answer_cells:
+        # found a answer cell, add its output to list
+        if qnum in ANSWERS:
+            raise Exception(f"Answer {qnum} repeated!")
+        # expected qnum = 1 + (max key in ANSWERS dictionary if ANSWERS is not empty else 0)
+        expected = 1 + (max(ANSWERS.keys()) if ANSWERS else 0)
+        if qnum != expected:
+            print(f"Warning: Expected question {expected} next but found {qnum}!")
+
+        # add the output of the answer cell to the ANSWERS dictionary
+        ANSWERS[qnum] = outputs
 
 
 @test(points=10)
@@ -596,4 +357,8 @@ def q10():
 
 
 if __name__ == "__main__":
-    tester_main()
+    tester_main(
+        results_file="score.json",
+        remote_url=PROJECT_REMOTE_URL,
+        remote_files=["autograde.py", "p5-base.Dockerfile"],
+    )
@@ -1,333 +1,16 @@
-# == previous tester.py ==
-from collections import OrderedDict
-import json
 import os
-import traceback
-import shutil
-
-import multiprocessing
-
-multiprocessing.set_start_method("fork")
-
-
-def warn(msg):
-    print(f"🟡 Warning: {msg}")
-
-
-def error(msg):
-    print(f"🔴 Error: {msg}")
-
-
-def info(msg):
-    print(f"🔵 Info: {msg}")
+import subprocess
+import argparse
+import time
 
+from tester import (init, test, cleanup, tester_main, get_args, warn,
+                    wait_until, wait_for_output, wait_for_event, ensure_image, prune_images,
+                    file_digest)
 
-ARGS = None
-DEBUG = False
-VERBOSE = False
-TMP_DIR = "/tmp/_cs544_tester_directory"
-TEST_DIR = None
-DEBUG_DIR = "_autograder_results"
 PROJECT_REMOTE_URL = (
     "https://git.doit.wisc.edu/cdis/cs/courses/cs544/f24/main/-/raw/main/p6/"
 )
-
-# full list of tests
-INIT = None
-TESTS = OrderedDict()
-CLEANUP = None
-
-
-def verbose(msg):
-    if VERBOSE:
-        print(msg)
-
-
-def run_with_timeout(func, timeout):
-    def wrapper(ret):
-        try:
-            func()
-            result = None
-        except Exception as e:
-            result = traceback.format_exception(e)
-        ret.send(result)
-
-    ret_send, ret_recv = multiprocessing.Pipe()
-    proc = multiprocessing.Process(target=wrapper, args=(ret_send,))
-    proc.start()
-    proc.join(timeout)
-    if proc.is_alive():
-        proc.terminate()
-        result = "Timeout"
-    else:
-        result = ret_recv.recv()
-    return result
-
-
-# dataclass for storing test object info
-class _unit_test:
-    def __init__(self, func, points, timeout, desc):
-        self.func = func
-        self.points = points
-        self.timeout = timeout
-        self.desc = desc
-
-    def run(self, ret):
-        points = 0
-
-        try:
-            result = self.func()
-            if not result:
-                points = self.points
-                result = f"PASS ({self.points}/{self.points})"
-            else:
-                print(f"Test {self.func.__name__} failed:\n")
-                if isinstance(result, str):
-                    result = result.split("\n")
-                if isinstance(result, list):
-                    print("\n".join(result) + "\n")
-                else:
-                    print(result + "\n")
-        except Exception as e:
-            result = traceback.format_exception(e)
-            print(f"Exception in {self.func.__name__}:\n")
-            print("\n".join(result) + "\n")
-
-        ret.send((points, result))
-
-
-# init decorator
-def init(init_func):
-    global INIT
-    INIT = init_func
-    return init_func
-
-
-# test decorator
-def test(points, timeout=None, desc=""):
-    def wrapper(test_func):
-        TESTS[test_func.__name__] = _unit_test(test_func, points, timeout, desc)
-
-    return wrapper
-
-
-# debug dir decorator
-def debug(debug_func):
-    global DEBUG
-    DEBUG = debug_func
-    return debug_func
-
-
-# cleanup decorator
-def cleanup(cleanup_func):
-    global CLEANUP
-    CLEANUP = cleanup_func
-    return cleanup_func
-
-
-# get arguments
-def get_args():
-    return ARGS
-
-
-# lists all tests
-def list_tests():
-    for test_name, test in TESTS.items():
-        print(f"{test_name}({test.points}): {test.desc}")
-
-
-# run all tests
-def run_tests():
-    results = {
-        "score": 0,
-        "full_score": 0,
-        "tests": {},
-    }
-
-    for test_name, test in TESTS.items():
-        if VERBOSE:
-            print(f"===== Running Test {test_name} =====")
-
-        results["full_score"] += test.points
-
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
-
-        if VERBOSE:
-            print(result)
-        results["score"] += points
-        results["tests"][test_name] = result
-
-    assert results["score"] <= results["full_score"]
-    if VERBOSE:
-        print("===== Final Score =====")
-        print(json.dumps(results, indent=4))
-        print("=======================")
-
-    if DEBUG:
-        debug_abs_path = f"{TEST_DIR}/{DEBUG_DIR}"
-        shutil.rmtree(debug_abs_path, ignore_errors=True)
-        shutil.copytree(src=TMP_DIR, dst=debug_abs_path, dirs_exist_ok=True)
-        print(f"Run results are stored to {debug_abs_path}")
-
-    return results
-
-
-# save the result as json
-def save_results(results):
-    output_file = f"{TEST_DIR}/score.json"
-    print(f"Output written to: {output_file}")
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-
-def check_files(test_dir, required_files):
-    if not os.path.isdir(f"{test_dir}/.git"):
-        warn(f"{test_dir} is not a repository")
-
-    missing_files = []
-    for file in required_files:
-        if not os.path.exists(f"{test_dir}/{file}"):
-            missing_files.append(file)
-    if len(missing_files) > 0:
-        msg = ", ".join(missing_files)
-        warn(f"the following required files are missing: {msg}")
-
-
-def check_for_updated_files():
-    files = ["autograde.py", "Dockerfile"]
-    for file in files:
-        # check local existence
-        if not os.path.exists(file):
-            error(f"{file} is not found in the current directory.")
-            continue
-
-        # get md5sum of the remote file
-        remote_md5sum, _ = subprocess.run(
-            f"wget {PROJECT_REMOTE_URL}{file} -O - | md5sum",
-            shell=True,
-            capture_output=True,
-            text=True,
-        ).stdout.split()
-        # get md5sum of the local file
-        local_md5sum, _ = subprocess.run(
-            f"md5sum {file}", shell=True, capture_output=True, text=True
-        ).stdout.split()
-
-        if remote_md5sum != local_md5sum:
-            print("=" * 40)
-            warn(f"{file} is not the same as the file in the repository.")
-            print(
-                "This could be: (1) You may have modified the file. (2) The file has been updated."
-            )
-            print("=" * 40)
-
-
-def tester_main(required_files=[]):
-    global ARGS, VERBOSE, TEST_DIR, DEBUG
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-d", "--dir", type=str, default=".", help="path to your repository"
-    )
-    parser.add_argument("-l", "--list", action="store_true", help="list all tests")
-    parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument(
-        "-g",
-        "--debug",
-        action="store_true",
-        help="create a debug directory with the files used while testing",
-    )
-    parser.add_argument(
-        "-k",
-        "--skip-check",
-        action="store_true",
-        default=False,
-        help="skip checking for updated files",
-    )
-    parser.add_argument(
-        "-c",
-        "--clean-docker",
-        action="store_true",
-        default=False,
-        help="clean build docker image before running tests",
-    )
-    args = parser.parse_args()
-
-    if not args.skip_check:
-        check_for_updated_files()
-
-    ARGS = args
-
-    if args.list:
-        list_tests()
-        return
-
-    VERBOSE = args.verbose
-    DEBUG = args.debug
-    test_dir = args.dir
-    if not os.path.isdir(test_dir):
-        error("invalid path")
-        return
-    TEST_DIR = os.path.abspath(test_dir)
-
-    # check if required files are present
-    check_files(test_dir, required_files)
-
-    # make a copy of the code
-    def ignore(_dir_name, _dir_content):
-        return [".git", ".github", "__pycache__", ".gitignore", "*.pyc", DEBUG_DIR]
-
-    shutil.copytree(src=TEST_DIR, dst=TMP_DIR, dirs_exist_ok=True, ignore=ignore)
-    os.chdir(TMP_DIR)
-
-    # run init
-    if INIT:
-        ret = INIT()
-        if ret != None:
-            result = f"Init failed: {ret}"
-            error(result)
-            save_results(result)
-            exit(-1)
-
-    # run tests
-    results = run_tests()
-    save_results(results)
-
-    # move server.out to src
-    shutil.copy(f"{output_dir_wrt_vm}/server.out", f"{TEST_DIR}/server.out")
-    info("server stdout is saved to server.out")
-
-    # cleanup code after all tests run
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
-
-    # run cleanup
-    if CLEANUP:
-        ret = CLEANUP()
-        if ret != None:
-            result = f"Cleanup failed: {ret}"
-            error(result)
-            exit(-1)
-
-
-# == p6 autograder part ==
-
-import os
-import time
-import subprocess
-import concurrent.futures
-import json
-import threading
-import traceback
-import argparse
+BASE_IMAGE = "p6-base"  # what docker-compose.yml runs
 
 
 def get_environment():
@@ -366,95 +49,60 @@ def stop_remove_all_containers():
         print("[CLEANUP] Removing containers.")
 
 
-def docker_image_exists(image_name):
-    result = subprocess.run(
-        ["docker", "images", "-q", image_name],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    return bool(result.stdout.strip())
-
-
 @cleanup
 def _cleanup():
     print("Stopping all existing containers")
     stop_remove_all_containers()
 
-    args = ARGS
+    args = get_args()
     if args.clean_docker:
         # Clean up the docker images
         print("Cleaning up docker")
         cmd = "docker system prune -af"
         subprocess.run(cmd, shell=True, check=True, stdout=subprocess.DEVNULL)
     else:
-        # remove every image except p6-base
-        print("Removing all images except p6-base")
-        cmd = "docker images --format '{{.Repository}}:{{.Tag}}' |  grep -Ev '^<none>:|:<none>$' | grep -v 'p6-base' | xargs -r docker rmi"
-        subprocess.run(cmd, shell=True, check=True, stdout=subprocess.DEVNULL)
+        # keep recently used images, evicting the oldest past the budget
+        print("Pruning least recently used images")
+        prune_images()
 
     print("Cleanup done")
 
 
+def nodetool_status():
+    # Read the result of nodetool status
+    result = subprocess.run(
+        "docker exec -it p6-db-1 nodetool status",
+        capture_output=True,
+        text=True,
+        shell=True,
+        env=os.environ.copy(),
+    )
+    return result.stdout
+
+
 def wait_for_all_three_up():
-    up_loop = 0
-    while up_loop < 10:
-        count = 0
+    for _ in range(10):
         print(
             "Waiting for the cassandra cluster to start up - This is going to take a while!!"
         )
-        all_three_up = False
-        command_to_run = "docker exec -it p6-db-1 nodetool status"
-
-        while not all_three_up and count < 100:
-            time.sleep(1)  # Wait a little bit
-
-            # Read the result of nodetool status
-            result = subprocess.run(
-                command_to_run,
-                capture_output=True,
-                text=True,
-                shell=True,
-                env=os.environ.copy(),
-            )
-
-            all_three_up = result.stdout.count("UN") >= 3
-            count += 1
-
-        time.sleep(5)
-        if count >= 100:
-            _cleanup()
-            subprocess.check_output(
-                "docker compose up -d", shell=True, env=get_environment()
-            )
-            up_loop += 1
-            time.sleep(10)
-        else:
+        if wait_until(lambda: nodetool_status().count("UN") >= 3, timeout=100):
             break
 
+        # restart the cluster and try again
+        _cleanup()
+        subprocess.check_output(
+            "docker compose up -d", shell=True, env=get_environment()
+        )
+
     print("Cassandra cluster has started up")
 
 
 def wait_for_one_dead():
     print("Waiting for a cassandra node to be down")
-    one_node_dead = False
-    command_to_run = "docker exec -it p6-db-1 nodetool status"
-
-    while not one_node_dead:
-        time.sleep(1)  # Wait a little bit
-
-        # Read the result of nodetool status
-        result = subprocess.run(
-            command_to_run,
-            capture_output=True,
-            text=True,
-            shell=True,
-            env=os.environ.copy(),
-        )
-
-        one_node_dead = result.stdout.count("DN") >= 1
-
-    time.sleep(5)
-    print("Detected a down cassandra node")
+    if wait_until(lambda: nodetool_status().count("DN") >= 1, timeout=300):
+        print("Detected a down cassandra node")
+    else:
+        warn("no cassandra node was reported down after 300 seconds")
 
 
 output_dir_wrt_container = "autograder_result"
@@ -493,15 +141,10 @@ def init():
     os.makedirs(output_dir_wrt_vm, exist_ok=True)
 
     # Build the p6 base image
-    _cleanup()
-
-    if not docker_image_exists("p6-base"):
-        print("Building the p6 base image")
-        subprocess.check_output(
-            "docker build . -t p6-base", shell=True, env=environment
-        )
-    else:
-        print("p6-base image already exists. Skipping build")
+    # rebuilt only when the Dockerfile or cassandra.sh (all it COPYs) changed,
+    # not on edits to src/ or the student's code
+    print("Building the p6 base image")
+    ensure_image(BASE_IMAGE, ctx_hash=file_digest("cassandra.sh"))
 
     # Start up the docker container
     print("Running docker compose up")
@@ -510,13 +153,11 @@ def init():
     # Wait for the cluster to be initialized
     wait_for_all_three_up()
 
-    time.sleep(1)
-
     # build the proto file
     proto_compile()
 
 
-@test(10)
+@test(10, images=[BASE_IMAGE])
 def server_run():
     # Start up the server
     environment = get_environment()
@@ -524,13 +165,9 @@ def server_run():
         server_start_cmd = f'docker exec -d -w /src p6-db-1 sh -c "python3 -u server.py >> {output_dir_wrt_container}/server.out" '
         subprocess.run(server_start_cmd, shell=True, env=environment)
         # If the "Server started" appears in the output, then the server has started
-        for i in range(180):
-            if os.path.exists(f"{output_dir_wrt_vm}/server.out"):
-                with open(f"{output_dir_wrt_vm}/server.out", "r") as f:
-                    server_output = f.read()
-                    if "Server started" in server_output:
-                        return None
-            time.sleep(1)
+        server_out = f"{output_dir_wrt_vm}/server.out"
+        if wait_for_output(["tail", "-s", "0.1", "-n", "+1", "-F", server_out], "Server started", 180):
+            return None
         return "Server did not start successfully after 180 seconds - \
                 do you forgot to print server started in your init function in server.py"
 
@@ -538,7 +175,7 @@ def server_run():
         return "Error running server.py"
 
 
-@test(10)
+@test(10, images=[BASE_IMAGE])
 def station_schema():
     environment = get_environment()
     try:
@@ -585,7 +222,7 @@ def station_schema():
         return "Error running ClientStationSchema.py"
 
 
-@test(20)
+@test(20, images=[BASE_IMAGE])
 def station_name():
     environment = get_environment()
     try:
@@ -610,7 +247,7 @@ def station_name():
         return "Error running ClientStationName.py, expect 'amberg 1.3 sw'"
 
 
-@test(20)
+@test(20, images=[BASE_IMAGE])
 def record_temps():
     environment = get_environment()
     try:
@@ -636,7 +273,7 @@ def record_temps():
         return "Error running ClientRecordTemps.py"
 
 
-@test(10)
+@test(10, images=[BASE_IMAGE])
 def station_max():
     environment = get_environment()
     try:
@@ -663,12 +300,15 @@ def station_max():
         return "Error running ClientStationMax.py, expect 356"
 
 
-@test(10)
+@test(10, images=[BASE_IMAGE])
 def record_temps_after_disaster():
     # Kill one of the nodes
     environment = get_environment()
     print("Blocking testing execution to kill p6-db-2")
+    since = time.time()
     subprocess.run("docker kill p6-db-2", shell=True, env=environment)
+    if not wait_for_event(["container=p6-db-2", "event=die"], "die", 30, since):
+        warn("p6-db-2 did not die within 30 seconds of docker kill")
 
     # Waiting for node to be killed
     wait_for_one_dead()
@@ -697,7 +337,7 @@ def record_temps_after_disaster():
         return "Error running ClientRecordTemps.py"
 
 
-@test(10)
+@test(10, images=[BASE_IMAGE])
 def station_max_after_disaster():
     environment = get_environment()
     try:
@@ -724,7 +364,16 @@ def station_max_after_disaster():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c",
+        "--clean-docker",
+        action="store_true",
+        default=False,
+        help="clean build docker image before running tests",
+    )
     tester_main(
+        parser,
         required_files=[
             "src/server.py",
             "src/ClientRecordTemps.py",
@@ -738,4 +387,8 @@ if __name__ == "__main__":
             "cassandra.sh",
             "docker-compose.yml",
         ],
+        results_file="score.json",
+        remote_url=PROJECT_REMOTE_URL,
+        remote_files=["autograde.py", "Dockerfile"],
+        artifacts={f"{output_dir_wrt_vm}/server.out": "."},
     )
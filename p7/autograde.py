@@ -1,285 +1,18 @@
-# ================== tester.py ==================
-from collections import OrderedDict
-import json
-import argparse
 import os
-import traceback
-import shutil
-import multiprocessing
-
-multiprocessing.set_start_method("fork")
-
-def warn(msg):
-    print(f"🟡 Warning: {msg}")
-
-
-def error(msg):
-    print(f"🔴 Error: {msg}")
-
-
-def info(msg):
-    print(f"🔵 Info: {msg}")
-
+from datetime import datetime
+import re
+import subprocess
+import json
 
-VERBOSE = False
-TMP_DIR = "/tmp/_cs544_tester_directory"
-TEST_DIR = None
+from tester import init, test, cleanup, tester_main, wait_until, wait_for_output
 
-# full list of tests
-INIT = None
-TESTS = OrderedDict()
-CLEANUP = None
-DEBUG = None
-GO_FOR_DEBUG = None
 PROJECT_REMOTE_URL = (
     "https://git.doit.wisc.edu/cdis/cs/courses/cs544/f24/main/-/raw/main/p7/"
 )
 
-
-# dataclass for storing test object info
-
-
-class _unit_test:
-    def __init__(self, func, points, timeout, desc):
-        self.func = func
-        self.points = points
-        self.timeout = timeout
-        self.desc = desc
-
-    def run(self, ret):
-        points = 0
-
-        try:
-            result = self.func()
-            if not result:
-                points = self.points
-                result = f"PASS ({self.points}/{self.points})"
-        except Exception as e:
-            result = traceback.format_exception(e)
-            print(f"Exception in {self.func.__name__}:\n")
-            print("\n".join(result) + "\n")
-
-        ret.send((points, result))
-
-
-# init decorator
-def init(init_func):
-    global INIT
-    INIT = init_func
-    return init_func
-
-
-# test decorator
-def test(points, timeout=None, desc=""):
-    def wrapper(test_func):
-        TESTS[test_func.__name__] = _unit_test(
-            test_func, points, timeout, desc)
-
-    return wrapper
-
-# debug dir decorator
-
-
-def debug(debug_func):
-    global DEBUG
-    DEBUG = debug_func
-    return debug_func
-
-# cleanup decorator
-
-
-def cleanup(cleanup_func):
-    global CLEANUP
-    CLEANUP = cleanup_func
-    return cleanup_func
-
-
-# lists all tests
-def list_tests():
-    for test_name, test in TESTS.items():
-        print(f"{test_name}({test.points}): {test.desc}")
-
-
-# run all tests
-def run_tests():
-    results = {
-        "score": 0,
-        "full_score": 0,
-        "tests": {},
-    }
-
-    for test_name, test in TESTS.items():
-        if VERBOSE:
-            print(f"===== Running Test {test_name} =====")
-
-        results["full_score"] += test.points
-
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
-
-        if VERBOSE:
-            print(result)
-        results["score"] += points
-        results["tests"][test_name] = result
-
-    assert results["score"] <= results["full_score"]
-    if VERBOSE:
-        print("===== Final Score =====")
-        print(json.dumps(results, indent=4))
-        print("=======================")
-    # and results['score'] != results["full_score"]
-    if DEBUG and GO_FOR_DEBUG:
-        DEBUG()
-    # cleanup code after all tests run
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
-    return results
-
-
-# save the result as json
-def save_results(results):
-    output_file = f"{TEST_DIR}/test.json"
-    print(f"\rOutput written to: {output_file}")
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-
-def check_files(required_files):
-    if not os.path.isdir(f".git"):
-        warn(f"This is not a repository")
-
-    missing_files = []
-    for file in required_files:
-        if not os.path.exists(f"{file}"):
-            missing_files.append(file)
-    if len(missing_files) > 0:
-        msg = ", ".join(missing_files)
-        warn(f"the following required files are missing: {msg}")
-
-
-def check_for_updated_files():
-    files = ["autograde.py", "Dockerfile", "src/autograde-helper.py"]
-    for file in files:
-        # check local existence
-        if not os.path.exists(file):
-            error(f"{file} is not found in the current directory.")
-            continue
-
-        # get md5sum of the remote file
-        remote_md5sum, _ = subprocess.run(
-            f"wget {PROJECT_REMOTE_URL}{file} -O - | md5sum",
-            shell=True,
-            capture_output=True,
-            text=True,
-        ).stdout.split()
-        # get md5sum of the local file
-        local_md5sum, _ = subprocess.run(
-            f"md5sum {file}", shell=True, capture_output=True, text=True
-        ).stdout.split()
-
-        if remote_md5sum != local_md5sum:
-            print("=" * 40)
-            warn(f"{file} is not the same as the file in the repository.")
-            print(
-                "This could be: (1) You may have modified the file. (2) The file has been updated."
-            )
-            print("=" * 40)
-
-
-def download_helper():
-    helper = "src/autograde-helper.py"
-    if not os.path.exists(helper):
-        print(f"Downloading autograde-helper.py for the first time")
-        subprocess.run(
-            f"wget {PROJECT_REMOTE_URL}{helper} -O {helper}", shell=True
-        )
-
-
-def tester_main():
-    global VERBOSE, TEST_DIR, GO_FOR_DEBUG
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-d", "--dir", type=str, default=".", help="path to your repository"
-    )
-    parser.add_argument("-l", "--list", action="store_true",
-                        help="list all tests")
-    parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument("-g", "--debug", action="store_true",
-                        help="create a debug directory with the files used while testing")
-    parser.add_argument("-e", "--existing", default=None,
-                        help="run the autograder on an existing notebook")
-    args = parser.parse_args()
-
-    if args.list:
-        list_tests()
-        return
-
-    download_helper()
-    check_for_updated_files()
-    check_files([
-        "Dockerfile",
-        "src/weather.py",
-        "src/producer.py",
-        "src/consumer.py",
-        "src/debug.py",
-        "src/report.proto",
-        "src/report_pb2.py",
-    ])
-
-    VERBOSE = args.verbose
-    GO_FOR_DEBUG = args.debug
-    test_dir = args.dir
-    if not os.path.isdir(test_dir):
-        print("invalid path")
-        return
-    TEST_DIR = os.path.abspath(test_dir)
-
-    # make a copy of the code
-    def ignore(_dir_name, _dir_content): return [
-        ".git", ".github", "__pycache__", ".gitignore", "*.pyc"]
-    shutil.copytree(src=TEST_DIR, dst=TMP_DIR,
-                    dirs_exist_ok=True, ignore=ignore)
-
-    if args.existing is None and CLEANUP:
-        CLEANUP()
-
-    os.chdir(TMP_DIR)
-
-    # run init
-    if INIT:
-        INIT(existing_file=args.existing)
-
-    # run tests
-    results = run_tests()
-    save_results(results)
-
-    # run cleanup
-    if args.existing is None and CLEANUP:
-        CLEANUP()
-
-
-# ================== autograde.py ==================
-import os
-from datetime import datetime
-import time
-import re
-import subprocess
-import json
-import time
-import subprocess
-import time
-import json
-
 BROKER_URL = "localhost:9092"
 AUTOGRADE_CONTAINER = "p7-autograder-kafka"
+AUTOGRADE_IMAGE = "p7-autograder-build"
 Stations={'StationA',
           'StationB',
           'StationC',
@@ -316,7 +49,7 @@ def restart_kafka():
                 "-e",
                 "AUTOGRADER_DELAY_OVERRIDE_VAL=0.01",
                 "-d",
-                "p7-autograder-build",
+                AUTOGRADE_IMAGE,
             ],
             check=True,
         )
@@ -326,30 +59,30 @@ def restart_kafka():
         return "Failed to run Kafka container"
 
 
+def is_kafka_up():
+    result = subprocess.run(
+        [
+            "docker",
+            "exec",
+            AUTOGRADE_CONTAINER,
+            "python3",
+            "/src/autograde-helper.py",
+            "-u",
+            BROKER_URL,
+            "-f",
+            "is_kafka_up",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    output = result.stdout.decode("utf-8").strip()
+    print(output)
+    return "Kafka is up" in output
+
+
 def wait_for_kafka_to_be_up():
     log(f"Re-starting Kafka for new test (waits up to 45 sec)...")
-    for _ in range(45):
-        result = subprocess.run(
-            [
-                "docker",
-                "exec",
-                AUTOGRADE_CONTAINER,
-                "python3",
-                "/src/autograde-helper.py",
-                "-u",
-                BROKER_URL,
-                "-f",
-                "is_kafka_up",
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        output = result.stdout.decode("utf-8").strip()
-        print(output)
-        if "Kafka is up" in output:
-            break
-        time.sleep(1)
-    else:
+    if not wait_until(is_kafka_up, timeout=45):
         raise Exception("Failed to start Kafka")
 
 
@@ -405,17 +138,6 @@ def run_consumer(partition_nums):
 #     os.makedirs(TMP_DIR, exist_ok=True)
 
 
-def save_cmd_output(command, output_file, duration=5):
-    output_file = os.path.join(os.getcwd(), output_file)
-    with open(output_file, "w") as file:
-        process = subprocess.Popen(
-            command, shell=True, stdout=file, stderr=subprocess.STDOUT
-        )
-
-    time.sleep(duration)
-    process.terminate()
-
-
 def read_file_from_docker(container_name, file_path):
     command = f"docker exec {container_name} cat {file_path}"
     result = subprocess.run(
@@ -484,12 +206,12 @@ def test_all_files_present():
 
 
 # Test p7 image builds
-@test(5)
+@test(5, images=[AUTOGRADE_IMAGE])
 def test_p7_image_builds():
     log("Running Test: build P7 image...")
     try:
         result = subprocess.run(
-            ["docker", "build", ".", "-t", "p7-autograder-build"], check=True
+            ["docker", "build", ".", "-t", AUTOGRADE_IMAGE], check=True
         )
         return None if result.returncode == 0 else "Failed to build Dockerfile"
     except subprocess.CalledProcessError as e:
@@ -497,7 +219,7 @@ def test_p7_image_builds():
 
 
 # Check p7 container runs
-@test(5)
+@test(5, images=[AUTOGRADE_IMAGE])
 def test_p7_image_runs():
     log("Running Test: running P7 container...")
     restart_kafka()
@@ -518,7 +240,7 @@ def test_producer_configs():
             return "Have you set the producers 'acks' and 'retries'? Couldn't find: KafkaProducer(..., acks='all', retries=10) in producer.py"
 
 # Test producer: check all topics created
-@test(15)
+@test(15, images=[AUTOGRADE_IMAGE])
 def test_topics_created():
     log("Running Test: check producer creates all topics...")
     try:
@@ -551,7 +273,7 @@ def test_topics_created():
 
 
 # test producer as consumer
-@test(15)
+@test(15, images=[AUTOGRADE_IMAGE])
 def test_producer_messages():
     log("Running Test: checking 'temperatures' stream...")
     result = subprocess.run(
@@ -575,7 +297,7 @@ def test_producer_messages():
         return "Failed: " + output
 
 # test proto generation
-@test(5)
+@test(5, images=[AUTOGRADE_IMAGE])
 def test_proto_build():
     log("Running Test: testing proto file ...")
     try:
@@ -601,32 +323,31 @@ def test_proto_build():
         raise Exception("Failed to compile report.proto:" + str(e))
 
 
-@test(10)
+@test(10, images=[AUTOGRADE_IMAGE])
 def test_debug_consumer_output():
     log("Running Test: testing debug.py ...")
-    
-    time.sleep(10)
 
-    out_file = "q7.out"
-    save_cmd_output(
-        f"docker exec -it {AUTOGRADE_CONTAINER} python3 /src/debug.py", out_file, 10
+    # the first line debug.py prints, as soon as it prints it
+    m = wait_for_output(
+        ["docker", "exec", AUTOGRADE_CONTAINER, "python3", "-u", "/src/debug.py"],
+        r"\S", 20
     )
-
-    with open(out_file, "r") as file:
-        for line in file:
-            try:
-                data = json.loads(
-                    line.replace("'", '"')
-                )  # Convert single quotes to double quotes for valid JSON
-                if all(key in data for key in ["station_id","date", "degrees","partition", ]):
-                    return
-                else: return "Invalid keys in the output of debug.py. Keys must be: 'station_id','date','degrees','partition'"
-            except Exception as e:
-                return "Invalid line in debug.py output: " + str(line)
+    if not m:
         return "Couldn't find the expected ouput when running debug.py"
 
+    line = m.string
+    try:
+        data = json.loads(
+            line.replace("'", '"')
+        )  # Convert single quotes to double quotes for valid JSON
+        if all(key in data for key in ["station_id","date", "degrees","partition", ]):
+            return
+        else: return "Invalid keys in the output of debug.py. Keys must be: 'station_id','date','degrees','partition'"
+    except Exception as e:
+        return "Invalid line in debug.py output: " + str(line)
+
 
-@test(10)
+@test(10, images=[AUTOGRADE_IMAGE])
 def test_consumer_runs():
     log("Running Test: running consumer ...")
 
@@ -647,28 +368,22 @@ def test_consumer_runs():
         return "Failed to run consumer.py: " + str(e)
 
 
-@test(10)
+@test(10, images=[AUTOGRADE_IMAGE])
 def test_partition_json_creation():
     log("Running Test: testing partition files ...")
-    global Stations
 
     stations_seen = set()
     partition_offsets = dict()
-    
-    time.sleep(60)
+    error_msg = ""
 
-    for _ in range(15):
-        error_msg = ""
-        time.sleep(1)
+    # poll until every station and a moving offset show up (or time runs out)
+    def read_partitions():
+        nonlocal error_msg
         try:
             for i in range(4):
-                try:
-                    file_data = read_file_from_docker(
-                        AUTOGRADE_CONTAINER, f"/src/partition-{i}.json"
-                    )
-                except Exception as e:
-                    error_msg = str(e)
-                    break
+                file_data = read_file_from_docker(
+                    AUTOGRADE_CONTAINER, f"/src/partition-{i}.json"
+                )
                 partition_dict = json.loads(file_data)
                 for key in partition_dict:
                     if key not in ("offset"):
@@ -676,12 +391,15 @@ def test_partition_json_creation():
                 partition_offsets[str(i)] = partition_dict[
                     "offset"
                 ]
-            else:
-                break
         except Exception as e:
-            error_msg = str(e)
-            pass
-    else: return f"Failed to generate and read /src/partition-{i}.json from within the container: {error_msg}"
+            error_msg = f"Failed to generate and read /src/partition-{i}.json from within the container: {e}"
+            return False
+        error_msg = ""
+        return Stations <= stations_seen and all(partition_offsets.values())
+
+    wait_until(read_partitions, timeout=75)
+    if error_msg:
+        return error_msg
 
     #for station in Stations:
     for station in Stations:
@@ -694,43 +412,61 @@ def test_partition_json_creation():
 
 
 # Validate contents of partition files generated
-@test(15)
+@test(15, images=[AUTOGRADE_IMAGE])
 def test_partition_json_contents():
     log("Running Test: validating partition files ...")
-    
-    for _ in range(10):
-        time.sleep(1)
+
+    partitions = {}
+    unreadable = None
+
+    def read_partitions():
+        nonlocal unreadable
         for i in range(4):
             try:
                 file_data = read_file_from_docker(
                     AUTOGRADE_CONTAINER, f"/src/partition-{i}.json"
                 )
-                partition_dict = json.loads(file_data)
+                partitions[i] = json.loads(file_data)
             except Exception as e:
-                break
-            
-            found_a_station = False
-            for station in partition_dict:
-                if station in ("offset"):
-                    continue
-                found_a_station = True
-
-                if len(partition_dict[station].keys()) == 0:
-                    return f"No weather summary data generated for {station}: Make sure the partition JSON resembles the sample structure"
-
-                for key in {"count", "sum", "avg", "start", "end"}:
-                    if key not in partition_dict[station]:
-                        return f"{station} doesn't contain the key:{key}"
-                    if not is_day_count_valid(partition_dict[station]):
-                        return f"{station} has an invalid 'count' when compared to 'start' and 'end' dates"
-
-            if not found_a_station:
-                return f"No weather summary data found in partition-{i}.json"
-        else: 
-            return
-    return f"Failed to read /src/partition-{i}.json inside the container."
+                unreadable = i
+                return False
+        return True
+
+    if not wait_until(read_partitions, timeout=10, initial=0.1):
+        return f"Failed to read /src/partition-{unreadable}.json inside the container."
+
+    for i, partition_dict in partitions.items():
+        found_a_station = False
+        for station in partition_dict:
+            if station in ("offset"):
+                continue
+            found_a_station = True
+
+            if len(partition_dict[station].keys()) == 0:
+                return f"No weather summary data generated for {station}: Make sure the partition JSON resembles the sample structure"
+
+            for key in {"count", "sum", "avg", "start", "end"}:
+                if key not in partition_dict[station]:
+                    return f"{station} doesn't contain the key:{key}"
+                if not is_day_count_valid(partition_dict[station]):
+                    return f"{station} has an invalid 'count' when compared to 'start' and 'end' dates"
+
+        if not found_a_station:
+            return f"No weather summary data found in partition-{i}.json"
 
 
 if __name__ == "__main__":
-    tester_main()
+    tester_main(
+        required_files=[
+            "Dockerfile",
+            "src/weather.py",
+            "src/producer.py",
+            "src/consumer.py",
+            "src/debug.py",
+            "src/report.proto",
+            "src/report_pb2.py",
+        ],
+        remote_url=PROJECT_REMOTE_URL,
+        remote_files=["autograde.py", "Dockerfile", "src/autograde-helper.py"],
+    )
 
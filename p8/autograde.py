@@ -1,311 +1,9 @@
 import ast
-import re
-from collections import OrderedDict
-import json
 import os
-import traceback
-import shutil
-import subprocess
 import argparse
 import math
 
-import multiprocessing
-
-multiprocessing.set_start_method("fork")
-
-
-def warn(msg):
-    print(f"🟡 Warning: {msg}")
-
-
-def error(msg):
-    print(f"🔴 Error: {msg}")
-
-
-def info(msg):
-    print(f"🔵 Info: {msg}")
-
-
-ARGS = None
-DEBUG = False
-VERBOSE = False
-TMP_DIR = "/tmp/_cs544_tester_directory"
-TEST_DIR = None
-DEBUG_DIR = "_autograder_results"
-PROJECT_REMOTE_URL = (
-    "https://git.doit.wisc.edu/cdis/cs/courses/cs544/f24/main/-/tree/main/p8"
-)
-
-# full list of tests
-INIT = None
-TESTS = OrderedDict()
-CLEANUP = None
-
-
-def verbose(msg):
-    if VERBOSE:
-        print(msg)
-
-
-def run_with_timeout(func, timeout):
-    def wrapper(ret):
-        try:
-            func()
-            result = None
-        except Exception as e:
-            result = traceback.format_exception(e)
-        ret.send(result)
-
-    ret_send, ret_recv = multiprocessing.Pipe()
-    proc = multiprocessing.Process(target=wrapper, args=(ret_send,))
-    proc.start()
-    proc.join(timeout)
-    if proc.is_alive():
-        proc.terminate()
-        result = "Timeout"
-    else:
-        result = ret_recv.recv()
-    return result
-
-
-# dataclass for storing test object info
-class _unit_test:
-    def __init__(self, func, points, timeout, desc):
-        self.func = func
-        self.points = points
-        self.timeout = timeout
-        self.desc = desc
-
-    def run(self, ret):
-        points = 0
-
-        try:
-            result = self.func()
-            if not result:
-                points = self.points
-                result = f"PASS ({self.points}/{self.points})"
-            else:
-                print(f"Test {self.func.__name__} failed:\n")
-                if isinstance(result, str):
-                    result = result.split("\n")
-                if isinstance(result, list):
-                    print("\n".join(result) + "\n")
-                else:
-                    print(result + "\n")
-        except Exception as e:
-            result = traceback.format_exception(e)
-            print(f"Exception in {self.func.__name__}:\n")
-            print("\n".join(result) + "\n")
-        ret.send((points, result))
-
-
-# init decorator
-def init(init_func):
-    global INIT
-    INIT = init_func
-    return init_func
-
-
-# test decorator
-def test(points, timeout=None, desc=""):
-    def wrapper(test_func):
-        TESTS[test_func.__name__] = _unit_test(test_func, points, timeout, desc)
-
-    return wrapper
-
-
-# debug dir decorator
-def debug(debug_func):
-    global DEBUG
-    DEBUG = debug_func
-    return debug_func
-
-
-# cleanup decorator
-def cleanup(cleanup_func):
-    global CLEANUP
-    CLEANUP = cleanup_func
-    return cleanup_func
-
-
-# get arguments
-def get_args():
-    return ARGS
-
-
-# lists all tests
-def list_tests():
-    for test_name, test in TESTS.items():
-        print(f"{test_name}({test.points}): {test.desc}")
-
-
-# run all tests
-def run_tests():
-    results = {
-        "score": 0,
-        "full_score": 0,
-        "tests": {},
-    }
-
-    for test_name, test in TESTS.items():
-        if VERBOSE:
-            print(f"===== Running Test {test_name} =====")
-
-        results["full_score"] += test.points
-
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
-
-        if VERBOSE:
-            print(result)
-        results["score"] += points
-        results["tests"][test_name] = result
-
-    assert results["score"] <= results["full_score"]
-    if VERBOSE:
-        print("===== Final Score =====")
-        print(json.dumps(results, indent=4))
-        print("=======================")
-
-    if DEBUG:
-        debug_abs_path = f"{TEST_DIR}/{DEBUG_DIR}"
-        shutil.rmtree(debug_abs_path, ignore_errors=True)
-        shutil.copytree(src=TMP_DIR, dst=debug_abs_path, dirs_exist_ok=True)
-        print(f"Run results are stored to {debug_abs_path}")
-
-    return results
-
-
-# save the result as json
-def save_results(results):
-    output_file = f"{TEST_DIR}/score.json"
-    print(f"Output written to: {output_file}")
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-
-def check_files(test_dir, required_files):
-    if not os.path.isdir(f"{test_dir}/.git"):
-        warn(f"{test_dir} is not a repository")
-
-    missing_files = []
-    for file in required_files:
-        if not os.path.exists(f"{test_dir}/{file}"):
-            missing_files.append(file)
-    if len(missing_files) > 0:
-        msg = ", ".join(missing_files)
-        warn(f"the following required files are missing: {msg}")
-
-
-def check_for_updated_files():
-    files = ["autograde.py"]
-    for file in files:
-        # check local existence
-        if not os.path.exists(file):
-            error(f"{file} is not found in the current directory.")
-            continue
-
-        # get md5sum of the remote file
-        remote_md5sum, _ = subprocess.run(
-            f"wget {PROJECT_REMOTE_URL}{file} -O - | md5sum",
-            shell=True,
-            capture_output=True,
-            text=True,
-        ).stdout.split()
-        # get md5sum of the local file
-        local_md5sum, _ = subprocess.run(
-            f"md5sum {file}", shell=True, capture_output=True, text=True
-        ).stdout.split()
-
-        if remote_md5sum != local_md5sum:
-            print("=" * 40)
-            warn(f"{file} is not the same as the file in the repository.")
-            print(
-                "This could be: (1) You may have modified the file. (2) The file has been updated."
-            )
-            print("=" * 40)
-
-
-def tester_main(parser, required_files=None):
-    if required_files is None:
-        required_files = []
-
-    global ARGS, VERBOSE, TEST_DIR, DEBUG
-
-    parser.add_argument(
-        "-d", "--dir", type=str, default=".", help="path to your repository"
-    )
-    parser.add_argument("-l", "--list", action="store_true", help="list all tests")
-    parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument(
-        "-g",
-        "--debug",
-        action="store_true",
-        help="create a debug directory with the files used while testing",
-    )
-    args = parser.parse_args()
-
-    ARGS = args
-
-    if args.list:
-        list_tests()
-        return
-
-    VERBOSE = args.verbose
-    DEBUG = args.debug
-    test_dir = args.dir
-    if not os.path.isdir(test_dir):
-        error("invalid path")
-        return
-    TEST_DIR = os.path.abspath(test_dir)
-
-    # check if required files are present
-    check_files(test_dir, required_files)
-
-    # clean TMP directory
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
-
-    # make a copy of the code
-    def ignore(_dir_name, _dir_content):
-        return [".git", ".github", "__pycache__", ".gitignore", "*.pyc", DEBUG_DIR]
-
-    shutil.copytree(src=TEST_DIR, dst=TMP_DIR, dirs_exist_ok=True, ignore=ignore)
-    os.chdir(TMP_DIR)
-
-    # run init
-    if INIT:
-        ret = INIT()
-        if ret != None:
-            result = f"Init failed: {ret}"
-            error(result)
-            save_results(result)
-            exit(-1)
-
-    # run tests
-    results = run_tests()
-    save_results(results)
-
-    # run cleanup
-    if CLEANUP:
-        print("Cleaning...")
-        ret = CLEANUP()
-        if ret != None:
-            result = f"Cleanup failed: {ret}"
-            error(result)
-            exit(-1)
-
-
-# ============= end of legacy code =============
-
-# ============= start of autograde.py =============
+from tester import init, test, tester_main, notebook_answers
 
 
 ANSWERS = {}  # global variable to store answers { key = question number, value = output of the answer cell }
@@ -497,42 +195,26 @@ def collect_cells(*args, **kwargs):
         FILE_NOT_FOUND = True
         return
 
-    with open("src/p8.ipynb") as f:
-        nb = json.load(f)  # load the notebook as a json object
-        cells = nb["cells"]  # get the list of cells from the notebook
-        expected_exec_count = 1  # expected execution count of the next cell
-
-        for cell in cells:
-            if "execution_count" in cell and cell["execution_count"]:
-                exec_count = cell["execution_count"]
-                if exec_count != expected_exec_count:
-                    raise Exception(
-                        f"""
-                        Expected execution count {expected_exec_count} but found {exec_count}. 
-                        Please do Restart & Run all then save before running the tester.
-                        """
-                    )
-                expected_exec_count = exec_count + 1
-
-            if cell["cell_type"] != "code":
-                continue
-
-            if not cell["source"]:
-                # if the cell is empty, skip it (empty = it has no source code)
-                continue
-
-            # pattern should be #q1 or #Q1 (#q2 or #Q2, etc.)
-            m = re.match(r"#[qQ](\d+)(.*)", cell["source"][0].strip())
-            if not m:
-                continue
-
-            qnum = int(m.group(1))
-            if qnum in ANSWERS:
-                raise Exception(f"Answer {qnum} repeated!")
-            expected = 1 + (max(ANSWERS.keys()) if ANSWERS else 0)
-            if qnum != expected:
-                print(f"Warning: Expected question {expected} next but found {qnum}!")
-            ANSWERS[qnum] = cell["outputs"]
+    execution_counts, answer_cells = notebook_answers("src/p8.ipynb")
+
+    expected_exec_count = 1  # expected execution count of the next cell
+    for exec_count in execution_counts:
+        if exec_count != expected_exec_count:
+            raise Exception(
+                f"""
+                Expected execution count {expected_exec_count} but found {exec_count}. 
+                Please do Restart & Run all then save before running the tester.
+                """
+            )
+        expected_exec_count = exec_count + 1
+
+    for qnum, notes, outputs in answer_cells:
+        if qnum in ANSWERS:
+            raise Exception(f"Answer {qnum} repeated!")
+        expected = 1 + (max(ANSWERS.keys()) if ANSWERS else 0)
+        if qnum != expected:
+            print(f"Warning: Expected question {expected} next but found {qnum}!")
+        ANSWERS[qnum] = outputs
 
 
 @test(points=10)
@@ -745,4 +427,5 @@ if __name__ == "__main__":
     tester_main(
         parser=argparse.ArgumentParser(),
         required_files=["src/p8.ipynb"],
+        results_file="score.json",
     )
@@ -1,50 +1,208 @@
 from collections import OrderedDict
-import json
-import argparse
 import os
-import traceback
-import shutil
+import time
 
-import multiprocessing
+# everything else is imported where it is used, so that listing the tests
+# (autograde.py -l) doesn't pay for multiprocessing, subprocess, json, ...
 
-multiprocessing.set_start_method("fork")
 
+def warn(msg):
+    print(f"🟡 Warning: {msg}")
+
+
+def error(msg):
+    print(f"🔴 Error: {msg}")
+
+
+def info(msg):
+    print(f"🔵 Info: {msg}")
+
+
+ARGS = None
 VERBOSE = False
+JOBS = 1
+POOL = False
+INCREMENTAL = False
+FORCE = False
+PROFILE = False
 
-TMP_DIR = "/tmp/_cs544_tester_directory"
+# --batch grades every submission in a child process with its own slot
+# number, so test directories, docker names and host ports of submissions
+# graded side by side don't collide (see slot_name and friends)
+SLOT_ENV = "CS544_TESTER_SLOT"
+SLOT = os.environ.get(SLOT_ENV)
+SLOT_LABEL = "cs544.tester-slot"  # on the containers and networks of a slot
+SLOT_PORT_STRIDE = 100  # host ports of slot k are offset by k * stride
+BATCH_REPORT = "batch.json"
+
+TMP_DIR = "/tmp/_cs544_tester_directory" + (f"-{SLOT}" if SLOT else "")
 TEST_DIR = None
+RESULTS_FILE = "test.json"
+DEBUG_DIR = "_autograder_results"
+PROFILE_DIR = "profile"  # in DEBUG_DIR, with --profile
+
+# sync states of the test directories and content-addressed copies of
+# large files, kept across runs
+SYNC_DIR = "/tmp/_cs544_tester_sync"
+CLONE_THRESHOLD = 1 << 20  # files at least this big are cloned (or linked) from SYNC_DIR
+FICLONE = 0x40049409  # linux ioctl for copy-on-write file clones
+WORKSPACE_DIGEST = None
+
+# results of earlier runs, keyed by test fingerprint (--incremental)
+CACHE_FILE = f"{SYNC_DIR}/results.json"
+CACHE_MAX_AGE = 7 * 24 * 60 * 60  # seconds since an entry was last used
+CACHE_MAX_ENTRIES = 10000
+HARNESS_DIGEST = None  # of tester.py and the autograder apart from its tests
+
+# parsed answer cells of notebooks, keyed by notebook digest
+NOTEBOOK_CACHE_DIR = f"{SYNC_DIR}/notebooks"
+NOTEBOOK_CHUNK = 1 << 16  # chars read at a time while streaming a notebook
+
+# images built through ensure_image carry a hash of their Dockerfile and context
+IMAGE_LABEL = "cs544.context-hash"
+IMAGE_LRU_FILE = f"{SYNC_DIR}/images.json"
+IMAGE_BUDGET = 20 * 2**30  # bytes of autograder images kept between runs
 
 # full list of tests
 INIT = None
 TESTS = OrderedDict()
+PASSED_TESTS = set()
 CLEANUP = None
 DEBUG = None
 GO_FOR_DEBUG = None
 
-# dataclass for storing test object info
+
+def verbose(msg):
+    if VERBOSE:
+        print(msg)
+
+
+# tests return one of these for partial credit
+class TestPoint:
+    def __init__(self, point, desc=None):
+        self.point = point
+        self.desc = desc
 
 
+# dataclass for storing test object info
 class _unit_test:
-    def __init__(self, func, points, timeout, desc):
+    def __init__(self, func, points, timeout, desc, required_files, dependencies, images):
         self.func = func
         self.points = points
         self.timeout = timeout
         self.desc = desc
+        self.required_files = required_files
+        self.dependencies = dependencies
+        self.images = images
 
     def run(self, ret):
+        import cProfile
+        import resource
+        import subprocess
+
+        subprocesses = 0
+
+        def count_subprocess(*args, **kwargs):
+            nonlocal subprocesses
+            subprocesses += 1
+            return popen_init(*args, **kwargs)
+
+        def count_system(command):
+            nonlocal subprocesses
+            subprocesses += 1
+            return system(command)
+
+        # subprocess.run, check_output, os.popen, etc. all go through Popen;
+        # os.system (which p1 uses) doesn't
+        popen_init = subprocess.Popen.__init__
+        subprocess.Popen.__init__ = count_subprocess
+        system = os.system
+        os.system = count_system
+        try:
+            # reset the peak RSS a reused worker carries from earlier tests
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+        self_before = resource.getrusage(resource.RUSAGE_SELF)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        profiler = None
+        if PROFILE:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            points, result = self.evaluate()
+        finally:
+            if profiler:
+                profiler.disable()
+            subprocess.Popen.__init__ = popen_init
+            os.system = system
+
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time = (self_after.ru_utime - self_before.ru_utime
+                    + self_after.ru_stime - self_before.ru_stime
+                    + children_after.ru_utime - children_before.ru_utime
+                    + children_after.ru_stime - children_before.ru_stime)
+        metrics = {
+            "cpu_time": round(cpu_time, 3),
+            "peak_rss_kb": self_after.ru_maxrss,
+            "children_peak_rss_kb": children_after.ru_maxrss,
+            "subprocesses": subprocesses,
+        }
+
+        if profiler:
+            profile_dir = f"{TEST_DIR}/{DEBUG_DIR}/{PROFILE_DIR}"
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(f"{profile_dir}/{self.func.__name__}.pstats")
+
+        ret.send((points, result, metrics))
+
+    def evaluate(self):
+        import traceback
+
         points = 0
 
+        # check if required tests passed
+        for test_name in self.dependencies:
+            if test_name not in PASSED_TESTS:
+                result = f"Dependency {test_name} did not pass"
+                return points, result
+
+        # check if required files exist
+        for file in self.required_files:
+            if not os.path.exists(file):
+                result = f"{file} not found"
+                return points, result
+
         try:
             result = self.func()
             if not result:
                 points = self.points
                 result = f"PASS ({self.points}/{self.points})"
+            elif isinstance(result, TestPoint):
+                points = result.point
+                if points == self.points:
+                    verdict = "PASS"
+                elif points == 0:
+                    verdict = "FAIL"
+                else:
+                    verdict = "PARTIAL"
+
+                desc = result.desc
+                result = f"{verdict} ({points}/{self.points})"
+                if desc:
+                    result += f": {desc}"
+            else:
+                print(f"Test {self.func.__name__} failed:\n")
+                print(f"{result}\n")
         except Exception as e:
             result = traceback.format_exception(e)
             print(f"Exception in {self.func.__name__}:\n")
             print("\n".join(result) + "\n")
 
-        ret.send((points, result))
+        return points, result
 
 
 # init decorator
@@ -55,10 +213,10 @@ def init(init_func):
 
 
 # test decorator
-def test(points, timeout=None, desc=""):
+def test(points, timeout=None, desc="", required_files=[], dependencies=[], images=[]):
     def wrapper(test_func):
         TESTS[test_func.__name__] = _unit_test(
-            test_func, points, timeout, desc)
+            test_func, points, timeout, desc, required_files, dependencies, images)
 
     return wrapper
 
@@ -79,67 +237,1269 @@ def cleanup(cleanup_func):
     return cleanup_func
 
 
+# get arguments
+def get_args():
+    return ARGS
+
+
 # lists all tests
 def list_tests():
     for test_name, test in TESTS.items():
         print(f"{test_name}({test.points}): {test.desc}")
 
 
-# run all tests
+# build the test DAG: test name -> names of tests that must finish first
+def build_test_graph():
+    graph = OrderedDict((test_name, set()) for test_name in TESTS)
+    earlier = []
+    for test_name, test in TESTS.items():
+        # explicit dependencies
+        for dep in test.dependencies:
+            if dep in TESTS and dep != test_name:
+                graph[test_name].add(dep)
+        # tests sharing a required file touch the same artifacts,
+        # so they keep their declaration order
+        for prev_name in earlier:
+            if set(TESTS[prev_name].required_files) & set(test.required_files):
+                graph[test_name].add(prev_name)
+        # a test that declares neither may rely on what the tests before it
+        # set up (an image, a server or cluster they start, use and kill),
+        # so it runs after the one declared before it
+        if earlier and not (test.dependencies or test.required_files):
+            graph[test_name].add(earlier[-1])
+        earlier.append(test_name)
+    return graph
+
+
+# a process that runs tests and sends back (points, result); a reused
+# worker stays alive and serves one test name after another over its pipe
+class _worker:
+    def __init__(self, reuse, test_name=None):
+        import multiprocessing
+
+        ctx = multiprocessing.get_context("fork")
+        self.reuse = reuse
+        self.conn, child_conn = ctx.Pipe()
+        if reuse:
+            target = self.serve
+        else:
+            target = TESTS[test_name].run
+        self.proc = ctx.Process(target=target, args=(child_conn,))
+        self.proc.start()
+        child_conn.close()
+
+    def serve(self, conn):
+        self.conn.close()
+        cwd = os.getcwd()
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                return
+            test_name, passed_tests = msg
+            PASSED_TESTS.clear()
+            PASSED_TESTS.update(passed_tests)
+            TESTS[test_name].run(conn)
+            # tests may chdir (e.g. into a compose directory)
+            os.chdir(cwd)
+
+    def stop(self):
+        if self.reuse and self.proc.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.proc.join(1)
+        self.terminate()
+
+    def terminate(self):
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.proc.join()
+
+
+def start_test(test_name, idle_workers):
+    test = TESTS[test_name]
+    if VERBOSE:
+        print(f"===== Running Test {test_name} =====")
+
+    if POOL:
+        worker = idle_workers.pop() if idle_workers else _worker(reuse=True)
+        worker.conn.send((test_name, PASSED_TESTS))
+    else:
+        worker = _worker(reuse=False, test_name=test_name)
+
+    deadline = None
+    if test.timeout is not None:
+        deadline = time.monotonic() + test.timeout
+    return worker, deadline
+
+
+def collect_test(worker, idle_workers):
+    try:
+        (points, result, metrics) = worker.conn.recv()
+    except EOFError:
+        worker.proc.join()
+        return 0, f"Crashed (exit code {worker.proc.exitcode})", {}
+    if worker.reuse:
+        idle_workers.append(worker)
+    else:
+        worker.proc.join()
+    return points, result, metrics
+
+
+# source of func and of the functions in its module that it calls
+def source_digest(func):
+    import hashlib
+    import inspect
+
+    digest = hashlib.sha256()
+    seen = set()
+    todo = [func]
+    while todo:
+        func = todo.pop()
+        if func in seen:
+            continue
+        seen.add(func)
+        try:
+            digest.update(inspect.getsource(func).encode("utf-8"))
+        except (OSError, TypeError):
+            digest.update(func.__qualname__.encode("utf-8"))
+
+        codes = [func.__code__]
+        while codes:
+            code = codes.pop()
+            codes.extend(c for c in code.co_consts if inspect.iscode(c))
+            for name in code.co_names:
+                value = func.__globals__.get(name)
+                if inspect.isfunction(value) and value.__module__ == func.__module__:
+                    todo.append(value)
+    return digest.hexdigest()
+
+
+# what every test runs with: tester.py, and the autograder module apart
+# from its @test functions (those are in each test's source_digest), i.e.
+# its init, cleanup and helpers, constants and imports
+def harness_digest():
+    import ast
+    import hashlib
+    import sys
+
+    global HARNESS_DIGEST
+    if HARNESS_DIGEST is not None:
+        return HARNESS_DIGEST
+
+    digest = hashlib.sha256(file_digest(__file__).encode("utf-8"))
+    modules = sorted({test.func.__module__ for test in TESTS.values()})
+    for module in modules:
+        path = getattr(sys.modules.get(module), "__file__", None)
+        if not path:
+            continue
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and any(
+                    isinstance(d, ast.Call) and getattr(d.func, "id", None) == "test"
+                    for d in node.decorator_list):
+                continue
+            digest.update(ast.dump(node).encode("utf-8"))
+    HARNESS_DIGEST = digest.hexdigest()
+    return HARNESS_DIGEST
+
+
+def image_id(image):
+    import subprocess
+
+    try:
+        return subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{.Id}}", image],
+            capture_output=True, text=True,
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+# everything a test's result depends on: its code and the harness around
+# it, its declared inputs (or the whole submission if it declares none),
+# images and dependencies (whether each is in passed, PASSED_TESTS by default)
+def test_fingerprint(test_name, passed=None):
+    import hashlib
+
+    if passed is None:
+        passed = PASSED_TESTS
+    test = TESTS[test_name]
+    parts = [TEST_DIR, test_name, str(test.points), source_digest(test.func), harness_digest()]
+    if test.required_files:
+        for file in test.required_files:
+            if os.path.isfile(file):
+                parts.append(f"{file}:{file_digest(file)}")
+            else:
+                parts.append(f"{file}:missing")
+    else:
+        parts.append(f"workspace:{WORKSPACE_DIGEST}")
+    for image in test.images:
+        parts.append(f"{image}:{image_id(image)}")
+    for dep in test.dependencies:
+        parts.append(f"{dep}:{dep in passed}")
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+# {test name: (fingerprint, cache entry)} of the tests whose cached results
+# can be reused. Tests connected in the graph share side effects (a built
+# image, a started server), so a connected group is reused only as a whole:
+# if any of its tests must run, all of them run.
+def cached_results(graph, cache):
+    # fingerprints in dependency order, as if the hits before had been replayed
+    waiting = {name: set(deps) for name, deps in graph.items()}
+    passed = set()
+    hits = {}
+    ready = [name for name, deps in waiting.items() if not deps]
+    while ready:
+        test_name = ready.pop(0)
+        del waiting[test_name]
+        fingerprint = test_fingerprint(test_name, passed)
+        entry = cache.get(fingerprint)
+        if entry:
+            hits[test_name] = (fingerprint, entry)
+            if entry["points"] == TESTS[test_name].points:
+                passed.add(test_name)
+        for name, deps in waiting.items():
+            if test_name in deps:
+                deps.discard(test_name)
+                if not deps:
+                    ready.append(name)
+
+    # connected groups, by union-find over the edges
+    parent = {name: name for name in graph}
+
+    def root(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for test_name, deps in graph.items():
+        for dep in deps:
+            parent[root(dep)] = root(test_name)
+    missed = {root(name) for name in graph if name not in hits}
+    return {name: hit for name, hit in hits.items() if root(name) not in missed}
+
+
+def load_cache():
+    import json
+
+    try:
+        with open(CACHE_FILE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    oldest = time.time() - CACHE_MAX_AGE
+    return {fp: entry for fp, entry in cache.items() if entry["used"] >= oldest}
+
+
+def save_cache(cache):
+    import json
+
+    # merge with entries other runs saved meanwhile, keep the most recently used
+    cache = {**load_cache(), **cache}
+    entries = sorted(cache.items(), key=lambda item: item[1]["used"])
+    cache = dict(entries[-CACHE_MAX_ENTRIES:])
+    os.makedirs(SYNC_DIR, exist_ok=True)
+    tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, CACHE_FILE)
+
+
+# run all tests, independent ones concurrently on up to JOBS processes
 def run_tests():
+    import json
+    import multiprocessing.connection
+    # imported before forking, so test processes don't each load them
+    import cProfile
+    import resource
+    import subprocess
+    import traceback
+
     results = {
         "score": 0,
         "full_score": 0,
         "tests": {},
+        "metrics": {},
     }
 
-    for test_name, test in TESTS.items():
+    outcomes = {}
+    started = {}
+    waiting = build_test_graph()
+    running = {}
+    fingerprints = {}
+    cache = load_cache() if INCREMENTAL else {}
+    reuse = cached_results(waiting, cache) if INCREMENTAL and not FORCE else {}
+    idle_workers = []
+    if POOL:
+        # pre-fork the workers so tests don't pay for process startup
+        idle_workers = [_worker(reuse=True) for _ in range(max(JOBS, 1))]
+
+    def finish(test_name, points, result, metrics={}):
         if VERBOSE:
-            print(f"===== Running Test {test_name} =====")
+            print(f"===== Finished Test {test_name} =====")
+            print(result)
+            full = TESTS[test_name].points
+            if points == full:
+                print(f"🟢 PASS ({points}/{full})")
+            elif points == 0:
+                print(f"🔴 FAIL ({points}/{full})")
+            else:
+                print(f"🟡 PARTIAL ({points}/{full})")
+        if test_name in started:
+            wall_time = time.monotonic() - started[test_name]
+            metrics = {"wall_time": round(wall_time, 3), **metrics}
+        outcomes[test_name] = (points, result, metrics)
+        if test_name in fingerprints and result not in ("Timeout", "Dependency cycle") \
+                and not str(result).startswith("Crashed"):
+            cache[fingerprints[test_name]] = {
+                "points": points,
+                "result": result,
+                "used": time.time(),
+            }
+        if points == TESTS[test_name].points:
+            PASSED_TESTS.add(test_name)
+        for deps in waiting.values():
+            deps.discard(test_name)
 
-        results["full_score"] += test.points
+    while waiting or running:
+        # start ready tests in declaration order; a reused result may make
+        # more tests ready, so look again until nothing changes
+        progressed = True
+        while progressed and len(running) < max(JOBS, 1):
+            progressed = False
+            for test_name in [name for name, deps in waiting.items() if not deps]:
+                if len(running) >= max(JOBS, 1):
+                    break
+                del waiting[test_name]
+                progressed = True
+                if test_name in reuse:
+                    fingerprints[test_name], entry = reuse[test_name]
+                    if VERBOSE:
+                        print(f"===== Reusing cached result of {test_name} =====")
+                    finish(test_name, entry["points"], entry["result"], {"cached": True})
+                    continue
+                if INCREMENTAL:
+                    fingerprints[test_name] = test_fingerprint(test_name)
+                started[test_name] = time.monotonic()
+                running[test_name] = start_test(test_name, idle_workers)
 
-        ret_send, ret_recv = multiprocessing.Pipe()
-        proc = multiprocessing.Process(target=test.run, args=(ret_send,))
-        proc.start()
-        proc.join(test.timeout)
-        if proc.is_alive():
-            proc.terminate()
-            points = 0
-            result = "Timeout"
-        else:
-            (points, result) = ret_recv.recv()
+        if not running:
+            # nothing can make progress: the remaining tests wait on a cycle
+            for test_name in list(waiting):
+                del waiting[test_name]
+                finish(test_name, 0, "Dependency cycle")
+            break
 
-        if VERBOSE:
-            print(result)
+        # sleep until some test sends its result, dies, or times out
+        now = time.monotonic()
+        deadlines = [d for (_, d) in running.values() if d is not None]
+        timeout = max(min(deadlines) - now, 0) if deadlines else None
+        ready = multiprocessing.connection.wait(
+            [obj for (worker, _) in running.values()
+             for obj in (worker.conn, worker.proc.sentinel)],
+            timeout)
+
+        now = time.monotonic()
+        for test_name, (worker, deadline) in list(running.items()):
+            if worker.conn in ready or worker.proc.sentinel in ready:
+                del running[test_name]
+                finish(test_name, *collect_test(worker, idle_workers))
+            elif deadline is not None and now >= deadline:
+                # a timed out worker is never reused
+                del running[test_name]
+                worker.terminate()
+                finish(test_name, 0, "Timeout")
+
+    for worker in idle_workers:
+        worker.stop()
+    if INCREMENTAL:
+        save_cache(cache)
+
+    for test_name, test in TESTS.items():
+        points, result, metrics = outcomes[test_name]
+        results["full_score"] += test.points
         results["score"] += points
         results["tests"][test_name] = result
+        results["metrics"][test_name] = metrics
 
     assert results["score"] <= results["full_score"]
     if VERBOSE:
         print("===== Final Score =====")
         print(json.dumps(results, indent=4))
         print("=======================")
-    # and results['score'] != results["full_score"]
-    if DEBUG and GO_FOR_DEBUG:
-        DEBUG()
-    # cleanup code after all tests run
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
     return results
 
 
 # save the result as json
 def save_results(results):
-    output_file = f"{TEST_DIR}/test.json"
+    import json
+
+    output_file = f"{TEST_DIR}/{RESULTS_FILE}"
     print(f"Output written to: {output_file}")
     with open(output_file, "w") as f:
         json.dump(results, f, indent=2)
 
 
-def tester_main():
-    global VERBOSE, TEST_DIR, GO_FOR_DEBUG
+# exponentially growing delays with +/- jitter, capped at maximum
+def backoff_delays(initial=0.5, maximum=2, factor=2, jitter=0.1):
+    import random
+
+    delay = initial
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, maximum)
+
+
+# call check() until it returns something truthy, backing off between calls;
+# returns that value, or None once timeout seconds have passed
+def wait_until(check, timeout, initial=0.5, maximum=2):
+    deadline = time.monotonic() + timeout
+    for delay in backoff_delays(initial, maximum):
+        value = check()
+        if value:
+            return value
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+
+
+# run a streaming command (docker logs -f, docker events, tail -F, ...) and
+# return the first re.Match of pattern in its output, or None on timeout
+def wait_for_output(command, pattern, timeout):
+    import re
+    import subprocess
+    import threading
+
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+    timer = threading.Timer(timeout, proc.kill)
+    timer.start()
+    try:
+        for line in proc.stdout:
+            m = re.search(pattern, line)
+            if m:
+                return m
+        return None
+    finally:
+        timer.cancel()
+        proc.kill()
+        proc.wait()
+
+
+# e.g. wait_for_event(["container=p6-db-2", "event=die"], "die", 60, since);
+# events from since (a time.time() taken before acting) on are seen
+def wait_for_event(filters, pattern, timeout, since):
+    command = ["docker", "events", "--since", f"{since:.3f}",
+               "--format", "{{.Action}} {{.Actor.Attributes.name}}"]
+    for f in filters:
+        command += ["--filter", f]
+    return wait_for_output(command, pattern, timeout)
+
+
+# pull parser over a JSON file: the caller walks the document with
+# members()/items() and takes (value) or skips (skip) each value, so large
+# values that are skipped (embedded images, HTML tables) are never built
+class _json_stream:
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+
+    # drop the buffer before keep_from and read more; returns how many
+    # chars were dropped
+    def more(self, keep_from):
+        chunk = self.f.read(NOTEBOOK_CHUNK)
+        if not chunk:
+            raise ValueError("unexpected end of JSON")
+        self.buf = self.buf[keep_from:] + chunk
+        self.pos -= keep_from
+        return keep_from
+
+    # next non-whitespace char, not consumed
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self.more(self.pos)
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} in JSON")
+        self.pos += 1
+
+    # yields the keys of the object at the cursor; each value must be
+    # taken or skipped before the next key
+    def members(self):
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError("expected ',' or '}' in JSON")
+
+    # yields once per element of the array at the cursor
+    def items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError("expected ',' or ']' in JSON")
+
+    def value(self):
+        import json
+
+        return json.loads(self.scan(keep=True))
+
+    def skip(self):
+        self.scan(keep=False)
+
+    # move past one value, returning its text if keep; only a value that is
+    # kept has to fit in the buffer
+    def scan(self, keep):
+        import re
+
+        self.peek()
+        start = i = self.pos
+        if self.buf[i] not in '"[{':
+            # number, true, false or null
+            while True:
+                m = re.compile(r"[^\s,:\]}]*").match(self.buf, i)
+                if m.end() < len(self.buf):
+                    break
+                dropped = self.more(start)
+                start -= dropped
+                i -= dropped
+            self.pos = m.end()
+            return self.buf[start:self.pos]
+
+        depth = 0
+        in_string = False
+        string_stop = re.compile(r'["\\]')
+        value_stop = re.compile(r'["\[\]{}]')
+        while True:
+            m = (string_stop if in_string else value_stop).search(self.buf, i)
+            if m is None or (m.group() == "\\" and m.end() == len(self.buf)):
+                resume = m.start() if m else len(self.buf)
+                dropped = self.more(start if keep else resume)
+                start -= dropped
+                i = resume - dropped
+                continue
+            char = m.group()
+            i = m.end()
+            if char == "\\":
+                i += 1  # escaped char
+            elif char == '"':
+                in_string = not in_string
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+            if depth == 0 and not in_string:
+                self.pos = i
+                return self.buf[start:i] if keep else None
+
+
+# an output of a notebook cell, without its rich (image, html, ...) data
+def _notebook_output(stream):
+    output = {}
+    for key in stream.members():
+        if key in ("output_type", "name", "text"):
+            output[key] = stream.value()
+        elif key == "data":
+            output["data"] = {}
+            for mime_type in stream.members():
+                if mime_type == "text/plain":
+                    output["data"][mime_type] = stream.value()
+                else:
+                    stream.skip()
+        else:
+            stream.skip()
+    return output
+
 
-    parser = argparse.ArgumentParser()
+# the cells of a notebook, read one at a time, with just the cell_type,
+# execution_count, source and execute_result/stream outputs
+def notebook_cells(path):
+    with open(path) as f:
+        stream = _json_stream(f)
+        for key in stream.members():
+            if key != "cells":
+                stream.skip()
+                continue
+            for _ in stream.items():
+                cell = {"outputs": []}
+                for key in stream.members():
+                    if key in ("cell_type", "execution_count", "source"):
+                        cell[key] = stream.value()
+                    elif key == "outputs":
+                        for _ in stream.items():
+                            output = _notebook_output(stream)
+                            if output.get("output_type") in ("execute_result", "stream"):
+                                cell["outputs"].append(output)
+                    else:
+                        stream.skip()
+                yield cell
+            return
+
+
+# (execution counts of the cells in order, [qnum, notes, outputs] of each
+# #qN answer cell) of a notebook, cached by the notebook's digest
+def notebook_answers(path):
+    import json
+    import re
+
+    os.makedirs(NOTEBOOK_CACHE_DIR, exist_ok=True)
+    cache_path = f"{NOTEBOOK_CACHE_DIR}/{file_digest(path)}.json"
+    try:
+        with open(cache_path) as f:
+            counts, answers = json.load(f)
+        os.utime(cache_path)
+        return counts, answers
+    except (OSError, ValueError):
+        pass
+
+    counts = []
+    answers = []
+    for cell in notebook_cells(path):
+        if cell.get("execution_count"):
+            counts.append(cell["execution_count"])
+        if cell.get("cell_type") != "code" or not cell.get("source"):
+            continue
+        # pattern should be #q1 or #Q1 (#q2 or #Q2, etc.)
+        m = re.match(r"#[qQ](\d+)(.*)", cell["source"][0].strip())
+        if m:
+            answers.append([int(m.group(1)), m.group(2).strip(), cell["outputs"]])
+
+    # entries not used for CACHE_MAX_AGE are dropped
+    oldest = time.time() - CACHE_MAX_AGE
+    for entry in os.scandir(NOTEBOOK_CACHE_DIR):
+        if entry.stat().st_mtime < oldest:
+            os.remove(entry.path)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump([counts, answers], f)
+    os.replace(tmp_path, cache_path)
+    return counts, answers
+
+
+# name (image tag, container, compose project) that is unique to this slot
+def slot_name(name):
+    return name if SLOT is None else f"{name}-{SLOT}"
+
+
+def slot_port(port):
+    return port if SLOT is None else port + int(SLOT) * SLOT_PORT_STRIDE
+
+
+# extra `docker run` arguments marking the container as this slot's
+def slot_labels():
+    return [] if SLOT is None else ["--label", f"{SLOT_LABEL}={SLOT}"]
+
+
+# `docker ps`, `docker container prune` and `docker network prune` filter
+# selecting this slot's containers and networks; outside a batch, all of them
+def slot_filter():
+    return [] if SLOT is None else ["--filter", f"label={SLOT_LABEL}={SLOT}"]
+
+
+# `docker compose` command for the compose file in the current directory. In a
+# slot it runs a copy of it with a per-slot project name, container names and
+# (for the given locally built images) image tags, slot labels, and no
+# published host ports; tests reach the services over the compose network.
+def compose_command(images=()):
+    import json
+    import subprocess
+
+    if SLOT is None:
+        return ["docker", "compose"]
+
+    config = json.loads(subprocess.check_output(
+        ["docker", "compose", "config", "--format", "json"]))
+    config["name"] = slot_name(config["name"])
+    for service in config.get("services", {}).values():
+        if service.get("image", "").removesuffix(":latest") in images:
+            service["image"] = slot_name(service["image"].removesuffix(":latest"))
+        if "container_name" in service:
+            service["container_name"] = slot_name(service["container_name"])
+        service.pop("ports", None)
+        service.setdefault("labels", {})[SLOT_LABEL] = SLOT
+    for kind in ("networks", "volumes"):
+        for resource in config.get(kind, {}).values():
+            if not resource.get("external"):
+                # named after the (renamed) project again
+                resource.pop("name", None)
+                resource.setdefault("labels", {})[SLOT_LABEL] = SLOT
+
+    path = f"docker-compose.slot-{SLOT}.json"
+    with open(path, "w") as f:
+        json.dump(config, f)
+    return ["docker", "compose", "-f", path, "-p", config["name"]]
+
+
+# hash of the files in a build context, skipping .dockerignore'd and excluded paths
+def context_hash(context=".", exclude=()):
+    import fnmatch
+    import hashlib
+
+    patterns = [p.strip("/") for p in exclude]
+    try:
+        with open(os.path.join(context, ".dockerignore")) as f:
+            patterns += [line.strip().strip("/") for line in f
+                         if line.strip() and not line.startswith("#")]
+    except FileNotFoundError:
+        pass
+
+    def ignored(rel_path):
+        return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(rel_path, p + "/*")
+                   for p in patterns)
+
+    digest = hashlib.sha256()
+    for dir_path, dir_names, file_names in os.walk(context):
+        dir_names[:] = sorted(
+            name for name in dir_names
+            if not ignored(os.path.relpath(os.path.join(dir_path, name), context)))
+        for name in sorted(file_names):
+            path = os.path.join(dir_path, name)
+            rel_path = os.path.relpath(path, context)
+            if ignored(rel_path) or not os.path.isfile(path):
+                continue
+            digest.update(rel_path.encode("utf-8") + b"\0")
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_hash(tag):
+    import subprocess
+
+    result = subprocess.run(
+        ["docker", "image", "inspect", "--format",
+         f'{{{{index .Config.Labels "{IMAGE_LABEL}"}}}}', tag],
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+# remember when images were last used, for LRU pruning
+def touch_images(tags):
+    import fcntl
+    import json
+
+    os.makedirs(os.path.dirname(IMAGE_LRU_FILE), exist_ok=True)
+    # the slots of a batch update it concurrently
+    with open(f"{IMAGE_LRU_FILE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(IMAGE_LRU_FILE) as f:
+                last_used = json.load(f)
+        except (OSError, ValueError):
+            last_used = {}
+        for tag in tags:
+            last_used[tag] = time.time()
+        tmp_path = f"{IMAGE_LRU_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(last_used, f)
+        os.replace(tmp_path, IMAGE_LRU_FILE)
+
+
+# build tag from dockerfile, unless the existing image was built from the
+# same Dockerfile, context and parent images
+def ensure_image(tag, dockerfile="Dockerfile", context=".", parents=(), exclude=(), ctx_hash=None):
+    import hashlib
+    import subprocess
+
+    digest = hashlib.sha256()
+    with open(dockerfile, "rb") as f:
+        digest.update(f.read())
+    digest.update((ctx_hash or context_hash(context, exclude)).encode("utf-8"))
+    for parent in parents:
+        digest.update((image_hash(parent) or "").encode("utf-8"))
+    build_hash = digest.hexdigest()
+
+    if image_hash(tag) == build_hash:
+        print(f"Image {tag} is up to date")
+    else:
+        environment = os.environ.copy()
+        environment["DOCKER_CLI_HINTS"] = "false"
+        subprocess.check_output(
+            ["docker", "build", context, "-f", dockerfile, "-t", tag,
+             "--label", f"{IMAGE_LABEL}={build_hash}"],
+            env=environment)
+    touch_images([tag])
+    return build_hash
+
+
+# images: tag -> (dockerfile, [parent tags]); images whose parents are
+# ready build in parallel
+def build_images(images, context=".", exclude=(), jobs=4):
+    import concurrent.futures
+
+    ctx_hash = context_hash(context, exclude)
+    futures = {}
+    with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+        def submit(tag):
+            if tag not in futures:
+                dockerfile, parents = images[tag]
+                parent_futures = [submit(p) for p in parents if p in images]
+
+                def build():
+                    for future in parent_futures:
+                        future.result()
+                    return ensure_image(tag, dockerfile, context, parents, ctx_hash=ctx_hash)
+                futures[tag] = pool.submit(build)
+            return futures[tag]
+
+        for tag in images:
+            submit(tag)
+        for future in futures.values():
+            future.result()
+
+
+# remove untagged autograder images, then least recently used ones until
+# the labelled images fit in budget bytes
+def prune_images(budget=IMAGE_BUDGET):
+    import json
+    import subprocess
+
+    if SLOT is not None:
+        # other slots may be about to use an image; run_batch prunes at the end
+        return
+
+    ids = subprocess.run(
+        ["docker", "images", "-q", "--no-trunc", "--filter", f"label={IMAGE_LABEL}"],
+        capture_output=True, text=True).stdout.split()
+    if not ids:
+        return
+    inspected = subprocess.run(
+        ["docker", "image", "inspect"] + sorted(set(ids)),
+        capture_output=True, text=True).stdout
+    try:
+        with open(IMAGE_LRU_FILE) as f:
+            last_used = json.load(f)
+    except (OSError, ValueError):
+        last_used = {}
+
+    images = []
+    for image in json.loads(inspected or "[]"):
+        tags = [t.removesuffix(":latest") for t in image.get("RepoTags") or []]
+        used = max([last_used.get(t, 0) for t in tags], default=-1)
+        images.append((used, image["Id"], image["Size"], tags))
+    images.sort()
+
+    total = sum(size for (_, _, size, _) in images)
+    for used, image_id, size, tags in images:
+        if tags and total <= budget:
+            break
+        result = subprocess.run(["docker", "rmi"] + (tags or [image_id]),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode == 0:
+            total -= size
+            print(f"[CLEANUP] Removed image {' '.join(tags) or image_id}.")
+
+
+def file_digest(path):
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# copy path into the object store, hashing it in a thread meanwhile (both
+# release the GIL); returns the digest it is stored under. Objects are
+# read-only, as they may be hardlinked into test directories.
+def store_object(path):
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+
+    tmp_path = f"{SYNC_DIR}/objects/.{os.getpid()}.tmp"
+    with ThreadPoolExecutor(1) as hasher:
+        digest = hasher.submit(file_digest, path)
+        shutil.copyfile(path, tmp_path)
+        digest = digest.result()
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, f"{SYNC_DIR}/objects/{digest}")
+    return digest
+
+
+# reflink src to dst where the filesystem supports it (btrfs, xfs),
+# otherwise hardlink it, otherwise copy it; returns whether dst is a
+# hardlink, i.e. shares src's inode
+def clone_file(src, dst):
+    import fcntl
+    import shutil
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return False
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        shutil.copyfile(src, dst)
+        return False
+
+
+def remove_path(path):
+    import shutil
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # e.g. written by a container as root; rmtree left these too
+
+
+# like shutil.copytree (symlinks followed, stats copied) into a dst kept
+# between runs: a state file records each file's source (size, mtime, mode)
+# and what was put in dst, so files unchanged on both sides are left alone,
+# and entries dst has that src doesn't (what tests wrote) are removed.
+# Large files are stored once under SYNC_DIR by digest and cloned into dst,
+# or hardlinked read-only where the filesystem can't clone.
+# Returns a digest of the whole tree.
+def sync_tree(src, dst, ignore):
+    import hashlib
+    import json
+    import shutil
+
+    os.makedirs(f"{SYNC_DIR}/objects", exist_ok=True)
+    os.makedirs(f"{SYNC_DIR}/manifests", exist_ok=True)
+    dst_key = hashlib.sha256(dst.encode("utf-8")).hexdigest()[:16]
+    state_path = f"{SYNC_DIR}/manifests/{dst_key}.json"
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    synced = state["files"] if state.get("src") == src and os.path.isdir(dst) else {}
+    if not synced:
+        shutil.rmtree(dst, ignore_errors=True)
+
+    files = {}
+    tree_digest = hashlib.sha256()
+    for dir_path, dir_names, file_names in os.walk(src, followlinks=True):
+        ignored = ignore(dir_path, dir_names + file_names)
+        dir_names[:] = sorted(name for name in dir_names if name not in ignored)
+        file_names = sorted(name for name in file_names if name not in ignored)
+        dst_dir = os.path.join(dst, os.path.relpath(dir_path, src))
+        os.makedirs(dst_dir, exist_ok=True)
+        for name in os.listdir(dst_dir):
+            path = os.path.join(dst_dir, name)
+            is_dir = os.path.isdir(path) and not os.path.islink(path)
+            if not (name in dir_names and is_dir or name in file_names and not is_dir):
+                remove_path(path)
+
+        for name in file_names:
+            src_path = os.path.join(dir_path, name)
+            dst_path = os.path.join(dst_dir, name)
+            rel_path = os.path.relpath(src_path, src)
+            st = os.stat(src_path)
+            source = [st.st_size, st.st_mtime_ns, st.st_mode]
+            old = synced.get(rel_path)
+            try:
+                dst_st = os.lstat(dst_path)
+                target = [dst_st.st_size, dst_st.st_mtime_ns, dst_st.st_ino]
+            except FileNotFoundError:
+                target = None
+
+            if old and old["source"] == source and old["target"] == target:
+                entry = old  # unchanged since the last sync, on both sides
+            else:
+                if old and old.get("linked") and target:
+                    # written to in place through a hardlink: the object is too
+                    obj_path = f"{SYNC_DIR}/objects/{old['digest']}"
+                    if os.path.exists(obj_path) and os.stat(obj_path).st_ino == target[2]:
+                        os.remove(obj_path)
+                if target:
+                    os.remove(dst_path)
+                entry = {"source": source}
+                if st.st_size < CLONE_THRESHOLD:
+                    shutil.copy2(src_path, dst_path)
+                else:
+                    # a source that didn't change keeps its digest
+                    if old and old["source"] == source and "digest" in old and \
+                            os.path.exists(f"{SYNC_DIR}/objects/{old['digest']}"):
+                        entry["digest"] = old["digest"]
+                    else:
+                        entry["digest"] = store_object(src_path)
+                    obj_path = f"{SYNC_DIR}/objects/{entry['digest']}"
+                    entry["linked"] = clone_file(obj_path, dst_path)
+                    if entry["linked"]:
+                        # shared with every other link to the object: copy the
+                        # stats, but never make it writable
+                        os.chmod(obj_path, st.st_mode & 0o7555)
+                        os.utime(obj_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                    else:
+                        shutil.copystat(src_path, dst_path)
+                dst_st = os.lstat(dst_path)
+                entry["target"] = [dst_st.st_size, dst_st.st_mtime_ns, dst_st.st_ino]
+            files[rel_path] = entry
+
+            if "digest" in entry:
+                tree_digest.update(f"{rel_path}\0{entry['digest']}\n".encode("utf-8"))
+            else:
+                tree_digest.update(
+                    f"{rel_path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"src": src, "files": files}, f)
+    os.replace(tmp_path, state_path)
+    prune_objects()
+    return tree_digest.hexdigest()
+
+
+# remove store objects no sync state lists: files since changed or
+# deleted, and those of submissions graded earlier
+def prune_objects():
+    import glob
+    import json
+
+    if SLOT is not None:
+        # other slots may be about to link an object; run_batch prunes at the end
+        return
+    listed = set()
+    for path in glob.glob(f"{SYNC_DIR}/manifests/*.json"):
+        try:
+            with open(path) as f:
+                files = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            continue
+        listed.update(entry["digest"] for entry in files.values() if "digest" in entry)
+    for name in os.listdir(f"{SYNC_DIR}/objects"):
+        if name not in listed:
+            try:
+                os.remove(f"{SYNC_DIR}/objects/{name}")
+            except OSError:
+                pass
+
+
+# run func in a separate process; returns None, the traceback of an
+# exception it raised, or "Timeout"
+def run_with_timeout(func, timeout):
+    import multiprocessing
+    import traceback
+
+    def wrapper(ret):
+        try:
+            func()
+            result = None
+        except Exception as e:
+            result = traceback.format_exception(e)
+        ret.send(result)
+
+    ctx = multiprocessing.get_context("fork")
+    ret_recv, ret_send = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=wrapper, args=(ret_send,))
+    proc.start()
+    proc.join(timeout)
+    if proc.is_alive():
+        proc.terminate()
+        result = "Timeout"
+    else:
+        result = ret_recv.recv()
+    return result
+
+
+def check_files(test_dir, required_files):
+    if not os.path.isdir(f"{test_dir}/.git"):
+        warn(f"{test_dir} is not a repository")
+
+    missing_files = []
+    for file in required_files:
+        if not os.path.exists(f"{test_dir}/{file}"):
+            missing_files.append(file)
+    if len(missing_files) > 0:
+        msg = ", ".join(missing_files)
+        warn(f"the following required files are missing: {msg}")
+
+
+# compare files we publish (autograde.py, Dockerfiles, helpers) against
+# remote_url, downloading the ones that are missing
+def check_for_updated_files(remote_url, files):
+    import subprocess
+
+    for file in files:
+        # check local existence
+        if not os.path.exists(file):
+            print(f"Downloading {file} for the first time")
+            subprocess.run(f"wget {remote_url}{file} -O {file} || rm -f {file}",
+                           shell=True)
+            continue
+
+        # get md5sum of the remote file
+        remote_md5sum, _ = subprocess.run(
+            f"wget {remote_url}{file} -O - | md5sum",
+            shell=True,
+            capture_output=True,
+            text=True,
+        ).stdout.split()
+        # get md5sum of the local file
+        local_md5sum, _ = subprocess.run(
+            f"md5sum {file}", shell=True, capture_output=True, text=True
+        ).stdout.split()
+
+        if remote_md5sum != local_md5sum:
+            print("=" * 40)
+            warn(f"{file} is not the same as the file in the repository.")
+            print(
+                "This could be: (1) You may have modified the file. (2) The file has been updated."
+            )
+            print("=" * 40)
+
+
+# GB of memory that can be used without swapping
+def available_memory():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 2**20
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**30
+
+
+# grade each submission in a child process (this autograder with -d and its
+# own slot), as many at once as fit in cpus and memory (GB) given that one
+# needs cost = (cpus, memory), or one at a time if cost is None. The results
+# of all submissions are written to report, their output next to it.
+def run_batch(submissions, cost, cpus, memory, report, results_file, extra_args=()):
+    import json
+    import shutil
+    import subprocess
+    import sys
+
+    if cost is None:
+        cost = (cpus, memory)
+    if cost[0] > cpus or cost[1] > memory:
+        warn(f"a submission needs {cost[0]} CPUs and {cost[1]} GB of memory, "
+             f"more than the budget of {cpus} CPUs and {memory:.1f} GB")
+    log_dir = f"{os.path.splitext(report)[0]}_logs"
+    shutil.rmtree(log_dir, ignore_errors=True)
+    os.makedirs(log_dir)
+
+    entries = {}
+    pending = list(enumerate(submissions, 1))
+    running = {}  # pid -> (slot, index, submission, log path, start time)
+    used_cpus = used_memory = 0
+    batch_start = time.time()
+    while pending or running:
+        # an oversized submission still runs, on its own
+        while pending and (not running or (used_cpus + cost[0] <= cpus and
+                                           used_memory + cost[1] <= memory)):
+            index, submission = pending.pop(0)
+            slots = {slot for (slot, *_) in running.values()}
+            slot = min(set(range(1, len(slots) + 2)) - slots)
+            name = os.path.basename(os.path.abspath(submission))
+            log_path = f"{log_dir}/{index:03d}-{name}.log"
+            with open(log_path, "w") as log:
+                proc = subprocess.Popen(
+                    [sys.executable, sys.argv[0], *sys.argv[1:], "-d", submission, *extra_args],
+                    stdout=log, stderr=subprocess.STDOUT,
+                    env={**os.environ, SLOT_ENV: str(slot)})
+            running[proc.pid] = (slot, index, submission, log_path, time.time())
+            used_cpus += cost[0]
+            used_memory += cost[1]
+            info(f"grading {submission} in slot {slot}")
+
+        pid, status = os.wait()
+        if pid not in running:
+            continue
+        slot, index, submission, log_path, start = running.pop(pid)
+        used_cpus -= cost[0]
+        used_memory -= cost[1]
+
+        entry = {
+            "exit_code": os.waitstatus_to_exitcode(status),
+            "wall_time": round(time.time() - start, 3),
+            "log": log_path,
+        }
+        results = None
+        results_path = os.path.join(submission, results_file)
+        try:
+            if os.path.getmtime(results_path) >= start:
+                with open(results_path) as f:
+                    results = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if isinstance(results, dict):
+            entry["score"] = results["score"]
+            entry["full_score"] = results["full_score"]
+            info(f"[{len(entries) + 1}/{len(submissions)}] {submission}: "
+                 f"{results['score']}/{results['full_score']}")
+        else:
+            error(f"[{len(entries) + 1}/{len(submissions)}] {submission}: "
+                  f"{results or 'no results'}, see {log_path}")
+        entry["results"] = results
+        entries[submission] = (index, entry)
+
+    if shutil.which("docker"):
+        prune_images()
+    if os.path.isdir(f"{SYNC_DIR}/objects"):
+        prune_objects()
+
+    summary = {
+        "wall_time": round(time.time() - batch_start, 3),
+        "cpus": cpus,
+        "memory": round(memory, 1),
+        "submission_cost": list(cost),
+        "submissions": {s: e for s, (_, e) in sorted(entries.items(), key=lambda item: item[1][0])},
+    }
+    with open(report, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Batch report written to: {os.path.abspath(report)}")
+
+
+# parser: an argparse.ArgumentParser with project specific arguments (see get_args)
+# required_files: warn if these are missing from the repository
+# results_file: where the scores are written, relative to the repository
+# remote_url, remote_files: files we publish, checked for updates unless -k
+# artifacts: glob pattern -> directory in the repository; matching files
+#   (relative to the test directory) are copied there after the tests ran
+# batch_cost: (cpus, GB of memory) grading one submission takes, for --batch;
+#   None if two submissions can't be graded at once (fixed ports or names)
+def tester_main(parser=None, required_files=[], results_file=RESULTS_FILE,
+                remote_url=None, remote_files=[], artifacts={}, batch_cost=None):
+    global ARGS, VERBOSE, JOBS, POOL, INCREMENTAL, FORCE, PROFILE, TEST_DIR, RESULTS_FILE, \
+        WORKSPACE_DIGEST, GO_FOR_DEBUG
+
+    if parser is None:
+        import argparse
+        parser = argparse.ArgumentParser()
     parser.add_argument(
         "-d", "--dir", type=str, default=".", help="path to your repository"
     )
@@ -150,25 +1510,81 @@ def tester_main():
                         help="create a debug directory with the files used while testing")
     parser.add_argument("-e", "--existing", default=None,
                         help="run the autograder on an existing notebook")
+    if remote_files:
+        parser.add_argument("-k", "--skip-check", action="store_true",
+                            help="skip checking for updated files")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="max number of independent tests to run at once (a test that "
+                             "declares no dependencies runs after the one before it)")
+    parser.add_argument("--pool", action="store_true",
+                        help="reuse pre-forked worker processes across tests")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse cached results of tests whose inputs have not changed")
+    parser.add_argument("--force", action="store_true",
+                        help="with --incremental, rerun every test and refresh the cache")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"write a cProfile stats file per test to {DEBUG_DIR}/{PROFILE_DIR}")
+    parser.add_argument("--batch", nargs="+", metavar="DIR",
+                        help="grade several repositories, concurrently where the project allows")
+    parser.add_argument("--batch-cpus", type=float, default=os.cpu_count(),
+                        help="CPUs the submissions of a batch may use together")
+    parser.add_argument("--batch-memory", type=float, default=None,
+                        help="GB of memory the submissions of a batch may use together "
+                             "(default: what is available)")
+    parser.add_argument("--batch-report", default=BATCH_REPORT,
+                        help="where the results of a batch are written")
     args = parser.parse_args()
+    if args.force and not args.incremental:
+        parser.error("--force only applies with --incremental")
+
+    ARGS = args
 
     if args.list:
         list_tests()
         return
 
+    import glob
+    import shutil
+
+    if remote_files and not args.skip_check:
+        check_for_updated_files(remote_url, remote_files)
+
+    # the children of a batch run grade with -d (SLOT is set)
+    if args.batch and SLOT is None:
+        run_batch(args.batch, batch_cost, args.batch_cpus,
+                  args.batch_memory or available_memory(), args.batch_report,
+                  results_file, ["-k"] if remote_files else [])
+        return
+
     VERBOSE = args.verbose
+    JOBS = args.jobs
+    POOL = args.pool
+    INCREMENTAL = args.incremental
+    FORCE = args.force
+    PROFILE = args.profile
     GO_FOR_DEBUG = args.debug
+    RESULTS_FILE = results_file
     test_dir = args.dir
     if not os.path.isdir(test_dir):
-        print("invalid path")
+        error("invalid path")
         return
     TEST_DIR = os.path.abspath(test_dir)
 
-    # make a copy of the code
-    def ignore(_dir_name, _dir_content): return [
-        ".git", ".github", "__pycache__", ".gitignore", "*.pyc"]
-    shutil.copytree(src=TEST_DIR, dst=TMP_DIR,
-                    dirs_exist_ok=True, ignore=ignore)
+    # check if required files are present
+    if required_files:
+        check_files(test_dir, required_files)
+
+    # make a copy of the code, without what earlier runs wrote into it
+    outputs = []
+    for pattern, dest in artifacts.items():
+        if os.path.normpath(dest) == ".":
+            outputs.append(os.path.basename(pattern))
+        else:
+            outputs.append(os.path.normpath(dest).split(os.sep)[0])
+    ignore = shutil.ignore_patterns(
+        ".git", ".github", "__pycache__", ".gitignore", "*.pyc", RESULTS_FILE,
+        DEBUG_DIR, *outputs)
+    WORKSPACE_DIGEST = sync_tree(src=TEST_DIR, dst=TMP_DIR, ignore=ignore)
 
     if args.existing is None and CLEANUP:
         CLEANUP()
@@ -177,12 +1593,50 @@ def tester_main():
 
     # run init
     if INIT:
-        INIT(existing_file=args.existing)
+        if args.existing is None:
+            ret = INIT()
+        else:
+            ret = INIT(existing_file=args.existing)
+        if ret is not None:
+            result = f"Init failed: {ret}"
+            error(result)
+            save_results(result)
+            exit(-1)
 
     # run tests
     results = run_tests()
     save_results(results)
 
+    if GO_FOR_DEBUG:
+        if DEBUG:
+            DEBUG()
+        else:
+            debug_abs_path = f"{TEST_DIR}/{DEBUG_DIR}"
+            # replace what an earlier run left, but keep this run's --profile output
+            if os.path.isdir(debug_abs_path):
+                for name in os.listdir(debug_abs_path):
+                    path = os.path.join(debug_abs_path, name)
+                    if PROFILE and name == PROFILE_DIR:
+                        continue
+                    if os.path.isdir(path) and not os.path.islink(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+            shutil.copytree(src=TMP_DIR, dst=debug_abs_path, dirs_exist_ok=True)
+            print(f"Run results are stored to {debug_abs_path}")
+
+    # copy what the tests produced (executed notebooks, logs) to the repository
+    for pattern, dest in artifacts.items():
+        os.makedirs(f"{TEST_DIR}/{dest}", exist_ok=True)
+        for path in glob.glob(os.path.join(TMP_DIR, pattern)):
+            shutil.copy(path, f"{TEST_DIR}/{dest}")
+            info(f"{os.path.basename(path)} is saved to "
+                 f"{os.path.normpath(os.path.join(dest, os.path.basename(path)))}")
+
     # run cleanup
     if args.existing is None and CLEANUP:
-        CLEANUP()
+        ret = CLEANUP()
+        if ret is not None:
+            result = f"Cleanup failed: {ret}"
+            error(result)
+            exit(-1)